@@ -3,69 +3,313 @@
 Module for parsing Amateur Data Interchange Format (ADIF) files
 """
 
+import os
 import re
-from datetime import datetime
 from settings import Settings
+from filters import record_filter_for
+from records import Contact
+from band_plan import adif_band
+from time_index import TimeIndexBuilder, date_window, load_index
+from compression import is_compressed, open_log
+import instrumentation
+
+# Number of bytes read from the file per chunk while tokenizing
+CHUNK_SIZE = 1024 * 1024
+
+# One tag and the text after it up to the next '<': the tag's name and
+# length, its closing '>' (empty when a '<' comes first) and the text.
+# Chunks are decoded as Latin-1, one character per byte, so the lengths
+# still count bytes.
+FIELD = re.compile(r'<([^<>]*)(>?)([^<]*)')
+
+EOR_TAG = re.compile(r'<eor>', re.IGNORECASE)
+EOH_TAG = re.compile(r'<\s*eoh\s*(?::[^<>]*)?>', re.IGNORECASE)
+
+def iter_adif_records(filename, chunk_size=CHUNK_SIZE, record_filter=None, start=0, end=None,
+                      index_builder=None):
+    """
+    Stream the records of an ADIF file one at a time
+
+    Each chunk is split at its <eor> tags and the tags of each record are
+    read with one regular expression call.  Values are sliced using the
+    declared <field:len> lengths, so records may span any number of lines.
+    A value holding a '<' leaves less text after its tag than its length
+    says; from such a record on the file is read by scan_adif_records,
+    which follows the lengths tag by tag.  Fields seen before <eoh> belong
+    to the header and are discarded.  When a field fails the record filter
+    the rest of the record is not decoded.
+
+    Args:
+        filename (str): Path to the ADIF file
+        chunk_size (int): Number of bytes to read from the file at a time
+        record_filter (RecordFilter): Optional filter checked field by field
+        start (int): Byte offset to start reading at, must be a record boundary
+        end (int): Byte offset to stop reading at, or None for the end of the file
+        index_builder (TimeIndexBuilder): Optional builder given each record's QSO_DATE and offset
+
+    Yields:
+        dict: Field name (upper case) to stripped field value
+    """
+    checked = record_filter.ADIF_FIELDS if record_filter is not None and record_filter.is_active() else ()
+    # Tags as written in the file -> (field name, length), decoded once each
+    tags = {}
+    with open_log(filename) as file:
+        if start:
+            file.seek(start)
+        remaining = None if end is None else max(0, end - start)
+        buffer = b''
+        record_start = start
+        header_end = None
+
+        while True:
+            if remaining is None:
+                chunk = file.read(chunk_size)
+            else:
+                chunk = file.read(min(chunk_size, remaining))
+                remaining -= len(chunk)
+            buffer += chunk
+
+            # Only records closed by an <eor> are read until the file ends
+            if chunk:
+                cut = buffer.lower().rfind(b'<eor>')
+                if cut < 0:
+                    continue
+                cut += len(b'<eor>')
+            else:
+                cut = len(buffer)
+            # Values are decoded from UTF-8 one by one only when the chunk is not all ASCII
+            region = buffer[:cut]
+            ascii_only = region.isascii()
+            pieces = EOR_TAG.split(region.decode('latin-1'))
+            buffer = buffer[cut:]
+            if chunk:
+                pieces.pop()
+
+            for piece in pieces:
+                record = {}
+                skip = False
+                for tag, closed, text in FIELD.findall(piece):
+                    spec = tags.get(tag)
+                    if spec is None:
+                        spec = tags[tag] = read_tag(tag.encode('latin-1'))
+                    field, size = spec
+
+                    # A '<' inside a value or tag, or an <eor> spelled differently
+                    if not closed or len(text) < size or field == 'EOR':
+                        yield from scan_adif_records(filename, chunk_size, record_filter, record_start, end,
+                                                     index_builder)
+                        return
+
+                    if field == 'EOH':
+                        record = {}
+                        skip = False
+                        header = EOH_TAG.search(piece)
+                        if header is not None:
+                            header_end = record_start + header.end()
+                        continue
+                    if skip or not field:
+                        continue
+                    value = text[:size] if size else text
+                    if not ascii_only:
+                        value = value.encode('latin-1').decode('utf-8', errors='replace')
+                    value = value.strip()
+                    if index_builder is not None and field == 'QSO_DATE':
+                        index_builder.add(value, header_end if header_end is not None else record_start)
+                    if field in checked and record_filter.rejects_adif_field(field, value):
+                        skip = True
+                    else:
+                        record[field] = value
+
+                if record and not skip:
+                    yield record
+                record_start += len(piece) + len('<eor>')
+                header_end = None
+
+            if not chunk:
+                break
+
+def read_tag(tag):
+    """Return the upper case field name and the length, 0 if missing, of a tag's text"""
+    spec = tag.split(b':')
+    length = spec[1].strip() if len(spec) > 1 else b''
+    return spec[0].strip().decode('ascii', errors='replace').upper(), int(length) if length.isdigit() else 0
+
+def scan_adif_records(filename, chunk_size=CHUNK_SIZE, record_filter=None, start=0, end=None,
+                      index_builder=None):
+    """
+    Stream the records of an ADIF file one tag at a time
+
+    This is the exact tokenizer behind iter_adif_records, used from the
+    first record whose tags the faster record by record scan cannot read.
+    Values are sliced using the declared <field:len> lengths, so records may
+    span any number of lines and values may contain '<' characters.  Fields
+    seen before <eoh> belong to the header and are discarded.  When a field
+    fails the record filter the rest of the record is skipped undecoded.
+
+    Args:
+        filename (str): Path to the ADIF file
+        chunk_size (int): Number of bytes to read from the file at a time
+        record_filter (RecordFilter): Optional filter checked field by field
+        start (int): Byte offset to start reading at, must be a record boundary
+        end (int): Byte offset to stop reading at, or None for the end of the file
+        index_builder (TimeIndexBuilder): Optional builder given each record's QSO_DATE and offset
+
+    Yields:
+        dict: Field name (upper case) to stripped field value
+    """
+    with open_log(filename) as file:
+        if start:
+            file.seek(start)
+        remaining = None if end is None else max(0, end - start)
+        buffer = b''
+        buffer_offset = start
+        pos = 0
+        record = {}
+        record_start = start
+        skip = False
+        eof = False
+
+        while True:
+            tag_start = buffer.find(b'<', pos)
+            tag_end = buffer.find(b'>', tag_start + 1) if tag_start >= 0 else -1
+
+            value_end = -1
+            if tag_end >= 0:
+                field_name, length = read_tag(buffer[tag_start + 1:tag_end])
+                if length:
+                    value_end = tag_end + 1 + length
+                else:
+                    # Some loggers write a zero or missing length in front of
+                    # a real value, so fall back to reading up to the next tag
+                    value_end = buffer.find(b'<', tag_end + 1)
+                    if value_end < 0:
+                        value_end = len(buffer) if eof else len(buffer) + 1
+
+            # Tag or value is cut off by the end of the buffer, read more
+            if tag_start < 0 or tag_end < 0 or value_end > len(buffer):
+                if eof:
+                    break
+                if tag_start >= 0:
+                    buffer_offset += tag_start
+                    buffer = buffer[tag_start:]
+                else:
+                    buffer_offset += len(buffer)
+                    buffer = b''
+                pos = 0
+                if remaining is None:
+                    chunk = file.read(chunk_size)
+                else:
+                    chunk = file.read(min(chunk_size, remaining))
+                    remaining -= len(chunk)
+                if not chunk:
+                    eof = True
+                buffer += chunk
+                continue
+
+            pos = value_end
+
+            if field_name == 'EOH' or field_name == 'EOR':
+                if field_name == 'EOR' and record and not skip:
+                    yield record
+                record = {}
+                skip = False
+                record_start = buffer_offset + pos
+            elif field_name and not skip:
+                value = buffer[tag_end + 1:value_end].decode('utf-8', errors='replace').strip()
+                if index_builder is not None and field_name == 'QSO_DATE':
+                    index_builder.add(value, record_start)
+                if record_filter is not None and record_filter.rejects_adif_field(field_name, value):
+                    skip = True
+                else:
+                    record[field_name] = value
+
+        # Yield the last record if it wasn't terminated with EOR
+        if record and not skip:
+            yield record
 
 def parse_adif_file(filename, settings : Settings):
     """
     Parse an ADIF file and return a list of contacts
-    
+
     Args:
         filename (str): Path to the ADIF file
-    
+        settings (Settings): Settings holding the date, band, mode and call filters
+
     Returns:
-        list: List of dictionaries containing contact information
+        list: List of Contact records
     """
     try:
-        with open(filename, 'r', encoding='utf-8', errors='replace') as file:
-            content = file.read()
-        
-        rows = content.splitlines()
-        contacts = []
-        pattern = r"<call:"
-        qso_date_format_string = "%Y%m%d"
-        for row in rows:
-            add_row = True
-            if re.search(pattern, row, re.IGNORECASE) :
-
-                # Find all field entries
-                field_pattern = r'<([^:]+)(?::(\d+))?>(.*?)(?=<\w+(?::\d+)?>|$)'
-                qso_date = None
-                current_contact = {}
-
-                for match in re.finditer(field_pattern, row):
-                    field_name = match.group(1).upper()
-                    field_length = match.group(2)  # This is optional
-                    field_value = match.group(3)
-
-                    # Strip whitespace from field value
-                    field_value = field_value.strip()
-                    if field_name == 'QSO_DATE':
-                        qso_date = datetime.strptime(field_value, qso_date_format_string)
-                        if settings.start_date and qso_date.date() < settings.start_date :
-                            add_row = False
-                            break
-
-                        if settings.end_date and qso_date.date() > settings.end_date:
-                            add_row = False
-                            break
-
-                    # If we hit an EOR (End Of Record), save the contact and start a new one
-                    if field_name == 'EOR':
-                        if current_contact:  # Only append if we have data
-                            contacts.append(current_contact.copy())  # Make a copy to avoid reference issues
-                        current_contact = {}
-                    else:
-                        current_contact[field_name] = field_value
-
-                # Add the last contact if it exists and wasn't terminated with EOR
-                if current_contact and add_row:
-                    contacts.append(current_contact.copy())
-        
-        print(f"Successfully parsed {len(contacts)} contacts from ADIF file")
-        return contacts
-    
+        with instrumentation.stage('parse_adif') as timed:
+            record_filter = record_filter_for(settings)
+
+            # Only read the part of the file that can hold the requested dates
+            start, end = date_window(filename, 'adif', record_filter)
+            index_builder = None
+            size = os.path.getsize(filename)
+            if not record_filter.is_active() and not is_compressed(filename):
+                # A full pass, so build the time index on the way if it is missing or stale
+                index = load_index(filename, 'adif')
+                if index is None or index['size'] != size:
+                    index_builder = TimeIndexBuilder()
+
+            contacts = parse_adif_range(filename, settings, start, end, index_builder)
+            timed.add_records(len(contacts))
+            if index_builder is not None:
+                index_builder.save(filename, 'adif', size)
+
+            print(f"Successfully parsed {len(contacts)} contacts from ADIF file")
+            return contacts
+
     except Exception as e:
         print(f"Error parsing ADIF file: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def parse_adif_range(filename, settings : Settings, start=0, end=None, index_builder=None):
+    """
+    Parse the contacts of an ADIF file between two byte offsets
+
+    Args:
+        filename (str): Path to the ADIF file
+        settings (Settings): Settings holding the date, band, mode and call filters
+        start (int): Byte offset to start at, 0 or just after an <eor>
+        end (int): Byte offset to stop at, or None for the end of the file
+        index_builder (TimeIndexBuilder): Optional builder for the file's time index
+
+    Returns:
+        list: List of Contact records
+    """
+    return list(iter_adif_contacts(filename, settings, start, end, index_builder))
+
+def iter_adif_file(filename, settings : Settings):
+    """
+    Stream the contacts of an ADIF file that pass the filters, one at a time
+
+    Like parse_adif_file, only the part of the file that can hold the
+    requested dates is read, but no list of contacts is built.
+    """
+    start, end = date_window(filename, 'adif', record_filter_for(settings))
+    return iter_adif_contacts(filename, settings, start, end)
+
+def iter_adif_contacts(filename, settings : Settings, start=0, end=None, index_builder=None):
+    """
+    Yield the Contact records of an ADIF file between two byte offsets
+
+    Takes the same arguments as parse_adif_range.
+    """
+    record_filter = record_filter_for(settings)
+    for record in iter_adif_records(filename, record_filter=record_filter, start=start, end=end,
+                                    index_builder=index_builder):
+        if 'CALL' not in record:
+            instrumentation.count('malformed_records')
+            continue
+
+        # Derive a missing BAND from FREQ so every contact has its band
+        if not record.get('BAND'):
+            band = adif_band(record)
+            if band:
+                record['BAND'] = band
+
+        if not record_filter.accepts_adif_record(record):
+            continue
+
+        yield Contact(record)
@@ -0,0 +1,127 @@
+# aggregation.py
+"""
+Module for aggregating contact locations by Maidenhead field, square and subsquare
+
+The map shows the coarse levels when zoomed out and the finer ones as the
+user zooms in, so it never has to draw every location at once.
+"""
+
+from grid_converter import grid_to_coordinates
+from wspr_columnar import WsprGroup
+
+# Number of grid characters at each aggregation level, coarse to fine
+LEVELS = (2, 4, 6)
+
+class GridGroup:
+    """Contacts aggregated under one grid prefix at one level"""
+
+    __slots__ = ('grid', 'latitude', 'longitude', 'count', 'bands', 'best_snr', 'locations')
+
+    def __init__(self, grid, latitude, longitude):
+        self.grid = grid
+        self.latitude = latitude
+        self.longitude = longitude
+        self.count = 0
+        self.bands = {}
+        self.best_snr = None
+        self.locations = []
+
+    def add_location(self, location_index, location_contacts):
+        """Add the contacts of one map location to the group"""
+        self.locations.append(location_index)
+        self.add_contacts(location_contacts)
+
+    def add_contacts(self, contacts):
+        """Add contacts at a location already in the group"""
+        self.count += len(contacts)
+        if isinstance(contacts, WsprGroup):
+            # Columnar spots are counted on their columns instead of row by row
+            for band, count in contacts.band_counts().items():
+                self.bands[band] = self.bands.get(band, 0) + count
+            snr = contacts.best_snr()
+            if snr is not None and (self.best_snr is None or snr > self.best_snr):
+                self.best_snr = snr
+            return
+        for contact in contacts:
+            band = contact.get('BAND') or ''
+            self.bands[band] = self.bands.get(band, 0) + 1
+            snr = contact.get('snr')
+            if snr is not None and snr != '' and (self.best_snr is None or snr > self.best_snr):
+                self.best_snr = snr
+
+    def main_band(self):
+        """Return the band with the most contacts in the group"""
+        return max(self.bands, key=self.bands.get) if self.bands else ''
+
+class LevelAggregator:
+    """
+    Aggregation of map locations at every level, grown as locations are added
+
+    The groups of each level keep the order in which they were created, so
+    a group's position in its level's list never changes.
+    """
+
+    def __init__(self):
+        self.groups = {level: {} for level in LEVELS}
+        # Position of each group in its level's list, by key
+        self.positions = {level: {} for level in LEVELS}
+
+    def add(self, location_index, coord_key, location_contacts, added=None):
+        """
+        Add a location, or contacts arriving at a location added before
+
+        Args:
+            location_index (int): Index of the location on the map
+            coord_key (str): "lat,lon" of the location
+            location_contacts (list): Every contact at the location, the
+                first one's grid decides its groups
+            added (list): The contacts new at a known location, or None
+                for a new location
+
+        Returns:
+            list: (level, position, GridGroup) of each group that changed
+        """
+        grid = (location_contacts[0].get('GRIDSQUARE') or '').strip().upper()
+        changed = []
+        for level in LEVELS:
+            groups = self.groups[level]
+            positions = self.positions[level]
+            prefix = grid[:level]
+            key = prefix or coord_key
+            group = groups.get(key)
+            if group is None:
+                latitude, longitude = grid_to_coordinates(prefix) if prefix else (None, None)
+                if latitude is None:
+                    # Fall back to the location itself when the grid is missing
+                    latitude, longitude = (float(value) for value in coord_key.split(','))
+                group = GridGroup(prefix, latitude, longitude)
+                positions[key] = len(groups)
+                groups[key] = group
+            position = positions[key]
+            if added is None:
+                group.add_location(location_index, location_contacts)
+            else:
+                group.add_contacts(added)
+            changed.append((level, position, group))
+        return changed
+
+    def levels(self):
+        """Return level -> list of GridGroup in the order they were created"""
+        return {level: list(groups.values()) for level, groups in self.groups.items()}
+
+def aggregate_locations(grouped_contacts):
+    """
+    Aggregate map locations at field, square and subsquare level
+
+    Args:
+        grouped_contacts (dict): "lat,lon" -> contacts at that location, as
+            built by create_map; the location index is its position in the dict
+
+    Returns:
+        dict: level (2, 4 or 6) -> list of GridGroup.  A location whose grid
+        is shorter than a level stays in its own, coarser, group at that level.
+    """
+    aggregator = LevelAggregator()
+    for location_index, (coord_key, location_contacts) in enumerate(grouped_contacts.items()):
+        aggregator.add(location_index, coord_key, location_contacts)
+    return aggregator.levels()
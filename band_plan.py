@@ -0,0 +1,123 @@
+# band_plan.py
+"""
+Table driven band plan covering the ADIF Band enumeration
+
+Frequencies are classified by bisecting a sorted table of band edges, one
+value at a time with frequency_to_band or a whole NumPy array at a time
+with band_codes.
+"""
+
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ADIF bands as (name, lower edge, upper edge) in MHz, edges inclusive, sorted by frequency
+BANDS = (
+    ('2190m', 0.1357, 0.1378),
+    ('630m', 0.472, 0.479),
+    ('560m', 0.501, 0.504),
+    ('160m', 1.8, 2.0),
+    ('80m', 3.5, 4.0),
+    ('60m', 5.06, 5.45),
+    ('40m', 7.0, 7.3),
+    ('30m', 10.1, 10.15),
+    ('20m', 14.0, 14.35),
+    ('17m', 18.068, 18.168),
+    ('15m', 21.0, 21.45),
+    ('12m', 24.89, 24.99),
+    ('10m', 28.0, 29.7),
+    ('8m', 40.0, 45.0),
+    ('6m', 50.0, 54.0),
+    ('5m', 54.000001, 69.9),
+    ('4m', 70.0, 71.0),
+    ('2m', 144.0, 148.0),
+    ('1.25m', 222.0, 225.0),
+    ('70cm', 420.0, 450.0),
+    ('33cm', 902.0, 928.0),
+    ('23cm', 1240.0, 1300.0),
+    ('13cm', 2300.0, 2450.0),
+    ('9cm', 3300.0, 3500.0),
+    ('6cm', 5650.0, 5925.0),
+    ('3cm', 10000.0, 10500.0),
+    ('1.25cm', 24000.0, 24250.0),
+    ('6mm', 47000.0, 47200.0),
+    ('4mm', 75500.0, 81000.0),
+    ('2.5mm', 119980.0, 123000.0),
+    ('2mm', 134000.0, 149000.0),
+    ('1mm', 241000.0, 250000.0),
+    ('submm', 300000.0, 7500000.0),
+)
+
+BAND_NAMES = tuple(name for name, _, _ in BANDS)
+LOWER_EDGES = tuple(low for _, low, _ in BANDS)
+UPPER_EDGES = tuple(high for _, _, high in BANDS)
+
+# Band names indexed by the codes returned from band_codes, code 0 is outside every band
+BAND_CODE_NAMES = ('',) + BAND_NAMES
+
+_RANGES = {name: (low, high) for name, low, high in BANDS}
+
+def band_range(band):
+    """
+    Return the edges of a band
+
+    Args:
+        band (str): ADIF band name, in any case
+
+    Returns:
+        tuple: (lower edge, upper edge) in MHz, or None for an unknown band
+    """
+    return _RANGES.get(band.strip().lower())
+
+def frequency_to_band(frequency):
+    """
+    Classify one frequency
+
+    Args:
+        frequency (float): Frequency in MHz
+
+    Returns:
+        str: ADIF band name, or '' if the frequency is outside every band
+    """
+    index = bisect_right(LOWER_EDGES, frequency) - 1
+    if index >= 0 and frequency <= UPPER_EDGES[index]:
+        return BAND_NAMES[index]
+    return ''
+
+def band_codes(frequencies):
+    """
+    Classify an array of frequencies in one vectorized pass
+
+    Args:
+        frequencies (numpy.ndarray): Frequencies in MHz
+
+    Returns:
+        numpy.ndarray: int8 codes indexing BAND_CODE_NAMES
+    """
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    lows = np.array(LOWER_EDGES)
+    highs = np.array(UPPER_EDGES)
+    index = np.searchsorted(lows, frequencies, side='right') - 1
+    in_band = (index >= 0) & (frequencies <= highs[np.maximum(index, 0)])
+    return np.where(in_band, index + 1, 0).astype(np.int8)
+
+def adif_band(record):
+    """
+    Return the BAND of an ADIF record, derived from FREQ when it is missing
+
+    Args:
+        record (dict): ADIF field name -> value
+
+    Returns:
+        str: The band, or '' when neither field gives one
+    """
+    band = record.get('BAND')
+    if band:
+        return band
+    try:
+        return frequency_to_band(float(record.get('FREQ', '')))
+    except ValueError:
+        return ''
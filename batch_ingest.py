@@ -0,0 +1,112 @@
+# batch_ingest.py
+"""
+Module for reading several WSPR and ADIF files in one run
+
+Command line paths may be globs, so years of rotated logs from several
+stations can be named at once.  The files are parsed concurrently, one per
+worker process, and since each log is already in time order their records
+are joined with a k-way heap merge instead of being sorted again.  When
+more than one file is read, each record is tagged with the name of the
+file it came from so the map can tell the stations apart.
+"""
+
+import glob
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from grid_converter import add_invalid_grids, invalid_grid_count
+import instrumentation
+
+def expand_paths(patterns):
+    """
+    Expand command line paths and globs into a list of files
+
+    Args:
+        patterns (list): File names or glob patterns such as logs/ALL_WSPR*.TXT
+
+    Returns:
+        list: The matching paths, each pattern's matches sorted by name and
+        every path listed once
+    """
+    paths = []
+    for pattern in patterns:
+        if any(character in pattern for character in '*?['):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                print(f"Warning: No files match {pattern}")
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def source_tag(path):
+    """Return the tag used for the records of a file, its name without the directory"""
+    return os.path.basename(path)
+
+def tag_records(records, source):
+    """Set the source tag on each record"""
+    for record in records:
+        record['source'] = source
+    return records
+
+def time_key(record):
+    """Return a (YYYYMMDD, HHMMSS) key ordering spots and contacts by time"""
+    time_on = record.get('TIME_ON') or ''
+    return record.get('QSO_DATE') or '', (time_on + '000000')[:6]
+
+def merge_by_time(streams):
+    """
+    Merge record streams that are each in time order
+
+    Args:
+        streams (list): Iterables of records, each in time order
+
+    Returns:
+        iterator: All records in time order, records with the same time in
+        the order of the streams
+    """
+    streams = list(streams)
+    if len(streams) == 1:
+        return iter(streams[0])
+    return heapq.merge(*streams, key=time_key)
+
+def _parse_file_counted(task):
+    """
+    Parse one file in a worker process, with the problems counted there
+
+    The counters of a worker process are lost when it ends, so they are
+    returned with the records for the parent to add to its own.
+    """
+    counting, parse_file, path = task
+    if counting:
+        instrumentation.start()
+    grids = invalid_grid_count()
+    result = parse_file(path)
+    return result, instrumentation.counters(), instrumentation.uncounted_files(), invalid_grid_count() - grids
+
+def parse_files(paths, parse_file, workers):
+    """
+    Parse several files, concurrently when workers is larger than 1
+
+    Args:
+        paths (list): The files to parse
+        parse_file: Function taking a path and returning its records, it must
+            be picklable (a module level function or functools.partial of one)
+        workers (int): Number of worker processes
+
+    Returns:
+        list: The result of parse_file for each path, in the order of paths
+    """
+    if workers > 1 and len(paths) > 1:
+        counting = instrumentation.is_enabled()
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            results = list(executor.map(_parse_file_counted, [(counting, parse_file, path) for path in paths]))
+        for _, counters, uncounted, grids in results:
+            instrumentation.add_counters(counters)
+            for source in uncounted:
+                instrumentation.count_unavailable(source)
+            add_invalid_grids(grids)
+        return [result for result, _, _, _ in results]
+    return [parse_file(path) for path in paths]
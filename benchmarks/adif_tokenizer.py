@@ -0,0 +1,107 @@
+# adif_tokenizer.py
+"""
+Benchmark of the ADIF tokenizers against the per-line regex scan they replaced
+
+A synthetic log with one contact per line, which the line based scan can
+read too, is parsed three ways: the regular expressions run on every line
+as parse_adif_file did before the tokenizer, scan_adif_records reading the
+file tag by tag, and iter_adif_records reading it record by record.  The
+tokenizers' records are made into Contact records, as parse_adif_file does.
+
+Usage:
+    python benchmarks/adif_tokenizer.py
+    python benchmarks/adif_tokenizer.py --count 2e5 --repeat 5
+    python benchmarks/adif_tokenizer.py --log wsjtx_log.adi
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from adif_parser import iter_adif_records, scan_adif_records
+from records import Contact
+import synthetic_logs
+from synthetic_logs import parse_count
+
+FIELD_PATTERN = re.compile(r'<([^:]+)(?::(\d+))?>(.*?)(?=<\w+(?::\d+)?>|$)')
+
+def regex_lines(path):
+    """Return the contacts found by the per-line regex scan, as dictionaries"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        rows = file.read().splitlines()
+    contacts = []
+    for row in rows:
+        if not re.search(r"<call:", row, re.IGNORECASE):
+            continue
+        contact = {}
+        for match in FIELD_PATTERN.finditer(row):
+            field_name = match.group(1).upper()
+            if field_name == 'EOR':
+                if contact:
+                    contacts.append(contact)
+                contact = {}
+            else:
+                contact[field_name] = match.group(3).strip()
+    return contacts
+
+def tag_by_tag(path):
+    """Return the contacts read by scan_adif_records"""
+    return [Contact(record) for record in scan_adif_records(path)]
+
+def record_by_record(path):
+    """Return the contacts read by iter_adif_records"""
+    return [Contact(record) for record in iter_adif_records(path)]
+
+PARSERS = (
+    ('regex lines', regex_lines),
+    ('tag by tag', tag_by_tag),
+    ('record by record', record_by_record),
+)
+
+def time_parse(parse, path, repeat):
+    """
+    Parse a file repeat times
+
+    Returns:
+        tuple: (best time in seconds, number of records)
+    """
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(parse(path))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ADIF tokenizers with the per-line regex scan")
+    parser.add_argument("--log", help="an ADIF file with one contact per line, instead of a synthetic log")
+    parser.add_argument("--count", type=parse_count, default=100000, help="contacts in the synthetic log")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of runs, the best one is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.log
+        if path is None:
+            # Multi-line records would be lost by the line based scan
+            synthetic_logs.MULTILINE_SHARE = 0
+            path = os.path.join(directory, "synthetic.adi")
+            synthetic_logs.write_adif(path, args.count)
+
+        print(f"{'parser':<18}{'seconds':>10}{'records':>10}{'records/s':>12}{'vs regex':>10}")
+        regex_time = None
+        for name, parse in PARSERS:
+            seconds, count = time_parse(parse, path, args.repeat)
+            if regex_time is None:
+                regex_time = seconds
+            print(f"{name:<18}{seconds:>10.3f}{count:>10}{count / seconds:>12.0f}{seconds / regex_time:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# compression_throughput.py
+"""
+Benchmark of parsing compressed logs against the plain text file
+
+The log is compressed with gzip, bzip2 and xz into a temporary directory
+and every copy is parsed by the same streaming parser the program uses,
+so the difference in time is the cost of decompressing on the fly.
+
+Usage:
+    python benchmarks/compression_throughput.py ALL_WSPR.TXT
+    python benchmarks/compression_throughput.py wsjtx_log.adi --repeat 5
+"""
+
+import argparse
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settings import Settings
+from filters import record_filter_for
+from wspr_parser import iter_wspr_records
+from adif_parser import iter_adif_contacts
+
+COMPRESSORS = (
+    ('gzip', '.gz', gzip.open),
+    ('bz2', '.bz2', bz2.open),
+    ('xz', '.xz', lzma.open),
+)
+
+def compress_copies(log_file, directory):
+    """
+    Write a compressed copy of the log in each format
+
+    Returns:
+        list: (format name, path) tuples, the plain file first
+    """
+    copies = [('plain', log_file)]
+    for name, suffix, opener in COMPRESSORS:
+        path = os.path.join(directory, os.path.basename(log_file) + suffix)
+        with open(log_file, 'rb') as source, opener(path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        copies.append((name, path))
+    return copies
+
+def time_parse(path, kind, settings, repeat):
+    """
+    Parse a file repeat times
+
+    Returns:
+        tuple: (best time in seconds, number of records)
+    """
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if kind == 'wspr':
+            records = iter_wspr_records(path, settings)
+        else:
+            records = iter_adif_contacts(path, settings)
+        count = sum(1 for _ in records)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare parsing throughput of plain and compressed logs")
+    parser.add_argument("log", help="the ALL_WSPR.TXT or ADIF file to benchmark")
+    parser.add_argument("--kind", choices=["wspr", "adif"], help="the log format, by default from the file extension")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of runs, the best one is reported")
+    args = parser.parse_args()
+
+    kind = args.kind or ('adif' if args.log.lower().endswith(('.adi', '.adif')) else 'wspr')
+    settings = Settings()
+    settings.record_filter = record_filter_for(settings)
+    plain_bytes = os.path.getsize(args.log)
+
+    with tempfile.TemporaryDirectory() as directory:
+        copies = compress_copies(args.log, directory)
+        print(f"{'format':<8}{'file MB':>10}{'seconds':>10}{'MB/s':>10}{'records/s':>12}{'vs plain':>10}")
+        plain_time = None
+        for name, path in copies:
+            seconds, count = time_parse(path, kind, settings, args.repeat)
+            if plain_time is None:
+                plain_time = seconds
+            print(f"{name:<8}{os.path.getsize(path) / 1e6:>10.2f}{seconds:>10.3f}"
+                  f"{plain_bytes / 1e6 / seconds:>10.1f}{count / seconds:>12.0f}{seconds / plain_time:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# pipeline_benchmark.py
+"""
+Benchmark of each stage of the mapping pipeline on synthetic logs
+
+Synthetic ADIF and ALL_WSPR.TXT logs are written for every requested
+scale, then each stage is timed on its own: parse_adif_file,
+parse_wspr_file, grid_to_coordinates, the contact loop of main.py
+(locate_contacts) and create_map.  Every stage runs in a fresh process, so
+its peak resident memory is not hidden by an earlier, larger stage.  The
+peak includes the input the stage is given, such as the parsed contacts.
+
+The results are compared with a baseline saved on the same machine with
+--save-baseline.  A stage whose throughput dropped, or whose peak memory
+grew, by more than the baseline's threshold is reported as a regression
+and the exit status is 1.  Timings depend on the machine, so the baseline
+is not kept in the repository and nothing is compared until one is saved.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py
+    python benchmarks/pipeline_benchmark.py --scales 1e3,1e4,1e5,1e6,1e7 --data-dir /tmp/bench
+    python benchmarks/pipeline_benchmark.py --save-baseline
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from settings import Settings
+from filters import record_filter_for
+from adif_parser import parse_adif_file
+from wspr_parser import parse_wspr_file
+from grid_converter import grid_to_coordinates, clear_grid_cache
+from maps_interface import create_map
+from main import locate_contacts
+from synthetic_logs import OPERATOR_GRID, parse_count, write_adif, write_wspr
+
+STAGES = ('parse_adif', 'parse_wspr', 'grid_to_coordinates', 'process_contacts', 'create_map')
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Shortest time one timing sample runs for
+MIN_SAMPLE_SECONDS = 0.2
+
+# Allowed drop in throughput and growth in peak memory before a stage counts as a regression
+DEFAULT_THRESHOLDS = {"throughput": 0.25, "peak_rss": 0.25}
+
+def peak_rss_mb():
+    """Return the peak resident memory of this process in MB, or None where it is unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def log_files(directory, count, seed):
+    """
+    Return the synthetic logs for a scale, writing them if they are missing
+
+    Returns:
+        dict: 'adif' and 'wspr' to the path of each log
+    """
+    paths = {
+        'adif': os.path.join(directory, f"synthetic_{count}_{seed}.adi"),
+        'wspr': os.path.join(directory, f"ALL_WSPR_synthetic_{count}_{seed}.TXT"),
+    }
+    if not os.path.exists(paths['adif']):
+        write_adif(paths['adif'], count, seed)
+    if not os.path.exists(paths['wspr']):
+        write_wspr(paths['wspr'], count, seed)
+    return paths
+
+def stage_settings(output_dir):
+    """Return settings with no filters that write maps to output_dir and never open them"""
+    settings = Settings()
+    settings.OUTPUT_DIRECTORY = output_dir
+    settings.AUTO_OPEN_MAP = False
+    settings.OPERATOR_GRIDSQUARE = OPERATOR_GRID
+    settings.record_filter = record_filter_for(settings)
+    return settings
+
+def fresh_parse(parse_file, path, settings):
+    """Parse a file as on its first run, without the time index a previous run wrote"""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path + ".idx")
+    return parse_file(path, settings)
+
+def stage_pass(stage, paths, settings):
+    """
+    Prepare the input of a stage
+
+    Returns:
+        function: Runs one pass of the stage and returns the number of records it handled
+    """
+    if stage == 'parse_adif':
+        return lambda: len(fresh_parse(parse_adif_file, paths['adif'], settings))
+    if stage == 'parse_wspr':
+        return lambda: len(fresh_parse(parse_wspr_file, paths['wspr'], settings))
+
+    contacts = parse_adif_file(paths['adif'], settings)
+    if stage == 'grid_to_coordinates':
+        grids = [contact['GRIDSQUARE'] for contact in contacts if 'GRIDSQUARE' in contact]
+        def convert():
+            clear_grid_cache()
+            return len([grid_to_coordinates(grid) for grid in grids])
+        return convert
+    if stage == 'process_contacts':
+        def process():
+            clear_grid_cache()
+            return len(locate_contacts(contacts, False))
+        return process
+
+    contacts = locate_contacts(contacts, False)
+    def render():
+        create_map(contacts, settings)
+        return len(contacts)
+    return render
+
+def run_stage(stage, paths, output_dir, repeat):
+    """
+    Prepare the input of a stage and time it, in a worker process
+
+    Returns:
+        dict: Best time in seconds, number of records and peak memory in MB
+    """
+    best = None
+    # The parsers and the contact loop print progress and warnings, which are not timed here
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        settings = stage_settings(output_dir)
+        run_pass = stage_pass(stage, paths, settings)
+        for _ in range(repeat):
+            # Short passes are repeated until the sample is long enough to time reliably
+            passes = 0
+            start = time.perf_counter()
+            while True:
+                records = run_pass()
+                passes += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= MIN_SAMPLE_SECONDS:
+                    break
+            best = elapsed / passes if best is None else min(best, elapsed / passes)
+
+    peak = peak_rss_mb()
+    return {
+        "seconds": round(best, 6),
+        "records": records,
+        "records_per_second": round(records / best, 1) if best else 0,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+    }
+
+def run_isolated(stage, paths, output_dir, repeat):
+    """Run a stage in a new process so its peak memory is its own"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_stage, stage, paths, output_dir, repeat).result()
+
+def compare(result, baseline, thresholds):
+    """
+    Compare a stage result with its baseline
+
+    Returns:
+        tuple: (throughput relative to the baseline or None, list of regression messages)
+    """
+    if not baseline:
+        return None, []
+    regressions = []
+    ratio = result["records_per_second"] / baseline["records_per_second"]
+    if ratio < 1 - thresholds["throughput"]:
+        regressions.append(f"throughput {ratio:.2f}x of baseline")
+    if result["peak_rss_mb"] and baseline.get("peak_rss_mb"):
+        growth = result["peak_rss_mb"] / baseline["peak_rss_mb"]
+        if growth > 1 + thresholds["peak_rss"]:
+            regressions.append(f"peak memory {growth:.2f}x of baseline")
+    return ratio, regressions
+
+def load_baseline(path):
+    """Return the stored baseline, or an empty one if there is none"""
+    if not os.path.exists(path):
+        return {"thresholds": dict(DEFAULT_THRESHOLDS), "results": {}}
+    with open(path) as file:
+        baseline = json.load(file)
+    baseline.setdefault("thresholds", dict(DEFAULT_THRESHOLDS))
+    baseline.setdefault("results", {})
+    return baseline
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each pipeline stage on synthetic logs")
+    parser.add_argument("--scales", default=",".join(str(scale) for scale in DEFAULT_SCALES),
+                        help="comma separated record counts, such as 1e3,1e4,1e5,1e6,1e7")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma separated stages: {','.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=5, help="the number of runs, the best one is reported")
+    parser.add_argument("--seed", type=int, default=1, help="the seed of the synthetic logs")
+    parser.add_argument("--data-dir", help="keep the synthetic logs here and reuse them in later runs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="the baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    scales = [parse_count(scale) for scale in args.scales.split(",")]
+    stages = [stage.strip() for stage in args.stages.split(",")]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    baseline = load_baseline(args.baseline)
+    if not os.path.exists(args.baseline) and not args.save_baseline:
+        print(f"No baseline at {args.baseline}, results are not compared; run with --save-baseline to store one")
+    thresholds = baseline["thresholds"]
+    results = {}
+    regressions = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        output_dir = os.path.join(temp_dir, "maps")
+
+        print(f"{'records':>9} {'stage':<20}{'seconds':>10}{'records/s':>13}{'peak MB':>10}{'vs base':>9}")
+        for count in scales:
+            paths = log_files(data_dir, count, args.seed)
+            for stage in stages:
+                result = run_isolated(stage, paths, output_dir, args.repeat)
+                results.setdefault(str(count), {})[stage] = result
+
+                ratio, stage_regressions = compare(result, baseline["results"].get(str(count), {}).get(stage), thresholds)
+                peak = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+                versus = f"{ratio:.2f}x" if ratio is not None else "-"
+                print(f"{count:>9} {stage:<20}{result['seconds']:>10.3f}{result['records_per_second']:>13.0f}"
+                      f"{peak:>10}{versus:>9}")
+                regressions += [f"{stage} at {count} records: {message}" for message in stage_regressions]
+
+    if args.save_baseline:
+        # Scales that were not run keep their stored results
+        for count, stage_results in results.items():
+            baseline["results"].setdefault(count, {}).update(stage_results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if regressions:
+        print("Regressions:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# synthetic_logs.py
+"""
+Deterministic generators of synthetic ADIF and ALL_WSPR.TXT logs
+
+The same count and seed always write the same file, so benchmark runs on
+different days or machines parse identical input.  The logs look like the
+real ones: a pool of stations with fixed home grids worked again and again
+on mixed bands and modes, grids given as 2, 4, 6 or 8 characters in mixed
+case, ADIF records written on one line or one field per line, and WSPR
+spots arriving in bursts every two minute cycle.
+
+Usage:
+    python benchmarks/synthetic_logs.py --adif synthetic.adi --count 1e6
+    python benchmarks/synthetic_logs.py --wspr ALL_WSPR_synthetic.TXT --count 1e5 --seed 7
+"""
+
+import argparse
+import datetime
+import random
+
+# Grid square of the station whose log is generated
+OPERATOR_GRID = "EM73VU"
+OPERATOR_CALL = "X5XX"
+
+# Call sign prefixes the stations are drawn from
+PREFIXES = ("K", "N", "W", "AA", "KD", "VE", "XE", "PY", "LU", "G", "M", "EA", "F", "DL", "I",
+            "OH", "SM", "LA", "UA", "JA", "VK", "ZL", "ZS", "5B", "9A")
+
+# ADIF band, frequency in MHz and share of the contacts
+ADIF_BANDS = (
+    ("160m", 1.840, 2), ("80m", 3.573, 6), ("40m", 7.074, 18), ("30m", 10.136, 10),
+    ("20m", 14.074, 30), ("17m", 18.100, 10), ("15m", 21.074, 12), ("12m", 24.915, 4),
+    ("10m", 28.074, 8),
+)
+
+# ADIF mode, submode and share of the contacts
+ADIF_MODES = (("FT8", "", 70), ("MFSK", "FT4", 15), ("CW", "", 10), ("SSB", "", 5))
+
+# WSPR dial frequencies in MHz, the audio offset is added to them
+WSPR_DIALS = (1.8366, 3.5686, 5.2872, 7.0386, 10.1387, 14.0956, 18.1046, 21.0946, 24.9246, 28.1246)
+
+# Share of the stations giving their grid with 2, 4, 6 and 8 characters
+GRID_PRECISIONS = ((2, 2), (4, 60), (6, 33), (8, 5))
+
+# Share of the ADIF records written with one field per line
+MULTILINE_SHARE = 0.3
+
+START_TIME = datetime.datetime(2024, 1, 1)
+
+def parse_count(text):
+    """Read a record count given as 1000 or 1e3"""
+    return int(float(text))
+
+def random_call(rng):
+    """Return a random call sign"""
+    suffix = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rng.randint(1, 3)))
+    return f"{rng.choice(PREFIXES)}{rng.randint(0, 9)}{suffix}"
+
+def random_locator(rng):
+    """Return a random 8 character Maidenhead locator"""
+    return (chr(ord('A') + rng.randrange(18)) + chr(ord('A') + rng.randrange(18))
+            + str(rng.randrange(10)) + str(rng.randrange(10))
+            + chr(ord('a') + rng.randrange(24)) + chr(ord('a') + rng.randrange(24))
+            + str(rng.randrange(10)) + str(rng.randrange(10)))
+
+def make_stations(rng, count):
+    """
+    Make the pool of stations for a log of count records
+
+    Returns:
+        list: (call sign, grid) tuples, each grid cut to the station's precision
+    """
+    weights = [weight for _, weight in GRID_PRECISIONS]
+    precisions = [precision for precision, _ in GRID_PRECISIONS]
+    stations = []
+    for _ in range(max(100, min(count // 5, 200000))):
+        grid = random_locator(rng)[:rng.choices(precisions, weights)[0]]
+        # Some loggers write the whole locator in upper case
+        if rng.random() < 0.2:
+            grid = grid.upper()
+        stations.append((random_call(rng), grid))
+    return stations
+
+def adif_field(name, value):
+    """Return one <name:length>value field"""
+    return f"<{name}:{len(value)}>{value}"
+
+def write_adif(path, count, seed=1):
+    """
+    Write a synthetic ADIF log
+
+    Args:
+        path (str): Path of the file to write
+        count (int): Number of contacts
+        seed (int): Seed of the random generator
+    """
+    rng = random.Random(seed)
+    stations = make_stations(rng, count)
+    bands = [band[:2] for band in ADIF_BANDS]
+    band_weights = [band[2] for band in ADIF_BANDS]
+    modes = [mode[:2] for mode in ADIF_MODES]
+    mode_weights = [mode[2] for mode in ADIF_MODES]
+    moment = START_TIME
+
+    with open(path, 'w', newline='\n') as file:
+        file.write("ADIF Export\n")
+        file.write(adif_field("adif_ver", "3.1.1") + "\n")
+        file.write(adif_field("programid", "synthetic_logs") + "\n")
+        file.write("<eoh>\n\n")
+
+        for _ in range(count):
+            moment += datetime.timedelta(seconds=rng.randint(15, 60))
+            call, grid = rng.choice(stations)
+            band, frequency = rng.choices(bands, band_weights)[0]
+            mode, submode = rng.choices(modes, mode_weights)[0]
+            if mode == "CW" or mode == "SSB":
+                rst_sent, rst_rcvd = ("599", "579") if mode == "CW" else ("59", "57")
+            else:
+                rst_sent, rst_rcvd = f"{rng.randint(-24, 15):+03d}", f"{rng.randint(-24, 15):+03d}"
+            ended = moment + datetime.timedelta(seconds=rng.choice((15, 30, 60, 90)))
+
+            fields = [adif_field("call", call)]
+            if grid:
+                fields.append(adif_field("gridsquare", grid))
+            fields.append(adif_field("mode", mode))
+            if submode:
+                fields.append(adif_field("submode", submode))
+            fields += [
+                adif_field("rst_sent", rst_sent),
+                adif_field("rst_rcvd", rst_rcvd),
+                adif_field("qso_date", moment.strftime("%Y%m%d")),
+                adif_field("time_on", moment.strftime("%H%M%S")),
+                adif_field("qso_date_off", ended.strftime("%Y%m%d")),
+                adif_field("time_off", ended.strftime("%H%M%S")),
+                adif_field("band", band),
+                adif_field("freq", f"{frequency + rng.randrange(3000) / 1e6:.6f}"),
+                adif_field("station_callsign", OPERATOR_CALL),
+                adif_field("my_gridsquare", OPERATOR_GRID),
+                adif_field("tx_pwr", str(rng.choice((5, 10, 40, 100)))),
+                "<eor>",
+            ]
+            separator = "\n" if rng.random() < MULTILINE_SHARE else " "
+            file.write(separator.join(fields) + "\n")
+
+def write_wspr(path, count, seed=1):
+    """
+    Write a synthetic ALL_WSPR.TXT log in the WSJT-X layout
+
+    Args:
+        path (str): Path of the file to write
+        count (int): Number of spots
+        seed (int): Seed of the random generator
+    """
+    rng = random.Random(seed)
+    # WSPR messages carry a 4 character grid, or 6 with a hashed call sign
+    stations = [(call, grid[:4].upper() if len(grid) >= 4 else grid.upper() + "55")
+                for call, grid in make_stations(rng, count)]
+    moment = START_TIME
+    written = 0
+
+    with open(path, 'w', newline='\n') as file:
+        while written < count:
+            moment += datetime.timedelta(minutes=2)
+            date = moment.strftime("%y%m%d")
+            time = moment.strftime("%H%M")
+            dial = rng.choice(WSPR_DIALS)
+            for _ in range(min(rng.randint(5, 40), count - written)):
+                call, grid = rng.choice(stations)
+                if rng.random() < 0.05:
+                    call, grid = "<...>", grid + random_locator(rng)[4:6].upper()
+                message = f"{call} {grid} {rng.choice((23, 30, 33, 37))}"
+                frequency = dial + rng.randint(1400, 1600) / 1e6
+                file.write(f"{date} {time} {rng.randint(-30, 5):3d} {rng.uniform(-2, 2):5.2f} "
+                           f"{frequency:11.7f}  {message:<22}{rng.randint(-1, 1):2d}  "
+                           f"{rng.uniform(0, 1):4.2f}  1  1 {rng.randint(-30, 0):4d}  0 "
+                           f"{rng.randint(1, 50):3d} {rng.randint(1, 500):5d} {rng.randint(-200, 600):5d}\n")
+                written += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic ADIF and ALL_WSPR.TXT logs")
+    parser.add_argument("--adif", help="the ADIF file to write")
+    parser.add_argument("--wspr", help="the ALL_WSPR.TXT file to write")
+    parser.add_argument("--count", type=parse_count, default=1000, help="the number of records, such as 1e6")
+    parser.add_argument("--seed", type=int, default=1, help="the seed of the random generator")
+    args = parser.parse_args()
+
+    if not args.adif and not args.wspr:
+        parser.error("give --adif, --wspr or both")
+    if args.adif:
+        write_adif(args.adif, args.count, args.seed)
+        print(f"Wrote {args.count} contacts to {args.adif}")
+    if args.wspr:
+        write_wspr(args.wspr, args.count, args.seed)
+        print(f"Wrote {args.count} spots to {args.wspr}")
+
+if __name__ == "__main__":
+    main()
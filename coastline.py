@@ -0,0 +1,129 @@
+# coastline.py
+"""
+Low resolution world coastline bundled for the offline static map renderer
+
+Each outline is a closed list of (longitude, latitude) points in degrees,
+accurate to roughly a degree, which is enough for a whole-world map.
+"""
+
+COASTLINE = [
+    # North America
+    [(-168, 66), (-162, 70), (-156, 71), (-141, 70), (-128, 70), (-115, 68), (-95, 68), (-85, 70),
+     (-80, 63), (-94, 59), (-92, 57), (-82, 55), (-79, 52), (-78, 58), (-75, 62), (-64, 60),
+     (-61, 56), (-56, 52), (-60, 48), (-64, 48), (-66, 44), (-70, 42), (-70, 41), (-74, 40),
+     (-76, 37), (-76, 35), (-81, 31), (-80, 26), (-82, 26), (-83, 29), (-85, 30), (-89, 30),
+     (-94, 29), (-97, 26), (-97, 22), (-95, 19), (-91, 19), (-90, 21), (-87, 21), (-88, 16),
+     (-84, 15), (-83, 11), (-80, 9), (-78, 9), (-80, 7), (-83, 8), (-86, 11), (-88, 13),
+     (-92, 14), (-96, 16), (-105, 20), (-106, 23), (-109, 26), (-112, 29), (-114, 31),
+     (-113, 29), (-110, 24), (-112, 24), (-114, 27), (-117, 32), (-121, 35), (-123, 38),
+     (-124, 42), (-124, 47), (-123, 49), (-127, 51), (-130, 55), (-135, 58), (-140, 60),
+     (-147, 61), (-152, 59), (-158, 57), (-163, 55), (-158, 58), (-162, 60), (-165, 62),
+     (-168, 66)],
+    # Greenland
+    [(-73, 78), (-60, 82), (-40, 83.5), (-20, 82), (-18, 77), (-20, 70), (-25, 68), (-32, 68),
+     (-40, 65), (-43, 60), (-48, 61), (-52, 65), (-54, 69), (-55, 72), (-60, 76), (-73, 78)],
+    # Cuba
+    [(-85, 21.9), (-82, 23.1), (-77, 22), (-74.1, 20.2), (-77.7, 19.9), (-80, 21.7), (-85, 21.9)],
+    # Hispaniola
+    [(-74.4, 18.5), (-72.8, 19.9), (-69.9, 19.6), (-68.4, 18.6), (-71.4, 17.6), (-74.4, 18.5)],
+    # South America
+    [(-78, 9), (-75, 11), (-72, 12), (-67, 11), (-62, 11), (-60, 8), (-57, 6), (-52, 5), (-50, 1),
+     (-48, -1), (-44, -2), (-40, -3), (-35, -5), (-35, -9), (-39, -13), (-39, -18), (-41, -22),
+     (-45, -24), (-48, -26), (-49, -29), (-53, -34), (-57, -36), (-57, -38), (-62, -39),
+     (-65, -41), (-64, -43), (-67, -46), (-66, -48), (-69, -51), (-68, -53), (-72, -54),
+     (-75, -50), (-74, -45), (-73, -40), (-72, -33), (-71, -27), (-70, -18), (-76, -14),
+     (-80, -6), (-81, -2), (-80, 1), (-77, 4), (-77, 8), (-78, 9)],
+    # Iceland
+    [(-24, 65.5), (-22, 66.4), (-16, 66.5), (-13.5, 65.2), (-15, 64.3), (-18.5, 63.4),
+     (-22.7, 63.8), (-24, 65.5)],
+    # Great Britain
+    [(-5.7, 50), (1.4, 51.2), (1.7, 52.7), (0, 53.5), (-1.5, 55), (-2, 56), (-1.8, 57.6),
+     (-3, 58.6), (-5, 58.6), (-6.2, 56.5), (-5, 55), (-3, 54), (-3, 53.3), (-4.5, 52.8),
+     (-5.3, 51.7), (-4, 51.5), (-5.7, 50)],
+    # Ireland
+    [(-6, 52.2), (-6, 54), (-7.3, 55.3), (-8.5, 55), (-10, 54), (-10.2, 52), (-8.5, 51.6), (-6, 52.2)],
+    # Eurasia
+    [(-5.6, 36), (-9, 37), (-9, 43), (-2, 43.5), (-1, 46), (-4.5, 48), (2, 51), (5, 53), (8, 54),
+     (8.5, 57), (10.5, 57.7), (12, 56), (11, 54), (14, 54), (19, 54.5), (21, 57), (24, 59.5),
+     (29, 60), (23, 60), (21.5, 61), (21, 64), (25, 65.5), (22, 65.8), (17.5, 62.5), (19, 60),
+     (16.5, 57), (14, 55.5), (12.5, 56.5), (11, 59), (8, 58), (5, 59), (5, 62), (10, 64),
+     (14, 67.5), (19, 70), (25, 71), (31, 70), (41, 67), (33, 66), (38, 64.5), (44, 66),
+     (44, 68.5), (53, 68.5), (60, 69), (68, 69), (73, 72), (80, 72.5), (87, 75), (100, 77),
+     (113, 74), (130, 71), (140, 72), (152, 71), (160, 70), (170, 70), (180, 68.5), (180, 65),
+     (178, 64), (170, 60), (163, 60), (156, 57), (156, 51), (160, 55), (163, 58), (155, 59.5),
+     (143, 59), (137, 54), (141, 52), (140, 48), (135, 43), (130, 42), (129, 35.5),
+     (126, 34.5), (126, 37.5), (125, 39.5), (121, 39), (118, 38), (122, 37), (120, 34),
+     (121.5, 31), (122, 30), (119.5, 25), (116, 22.7), (111, 21.5), (108, 21.5), (106, 19),
+     (109, 15), (109, 11.5), (105, 8.7), (104.5, 10.4), (101, 13), (100, 8), (103.4, 4),
+     (104, 1.3), (101, 2.8), (98, 7.8), (98.5, 12), (97.5, 16.5), (94, 16), (92, 21), (89, 22),
+     (86.5, 20), (80, 15.5), (80, 10), (77.5, 8), (76, 10), (73, 17), (72.8, 21), (70, 22.5),
+     (67, 24.8), (61, 25.2), (57, 25.7), (56, 26.5), (51.5, 27.8), (48.5, 29.9), (50, 26),
+     (51.5, 24.5), (54, 24), (56.3, 26), (57, 24), (59.8, 22.5), (57.8, 19), (55, 17),
+     (52, 15.5), (48, 14), (43.5, 12.7), (42.7, 16), (39, 21.5), (36, 26.5), (34.8, 28),
+     (32.5, 29.9), (32.3, 31.3), (34.3, 31.3), (35, 33), (36, 35.5), (36, 36.8), (32, 36.2),
+     (29, 36.7), (27, 38), (26.5, 40), (29, 41), (31, 41.2), (36, 41.7), (41.5, 41.5),
+     (39, 44.6), (37.5, 47), (35, 45), (33, 44.5), (33, 46), (30.5, 46.5), (29, 44.8),
+     (28.6, 43.5), (28, 41.5), (26.5, 40.8), (24, 40.8), (23, 40.2), (24, 38), (23, 36.5),
+     (21.7, 36.8), (21, 38.5), (19.5, 40), (19.5, 42), (16, 43.5), (13.7, 45.5), (12.3, 45.3),
+     (12.5, 44), (16, 41.9), (18.5, 40.2), (16.5, 38.5), (15.7, 38), (15.6, 40), (12, 41.8),
+     (10.5, 42.9), (8.8, 44.4), (6, 43), (3.2, 43.3), (3.2, 42), (0.5, 40.5), (-0.5, 38.5),
+     (-2, 36.7), (-5.6, 36)],
+    # Africa
+    [(32.5, 29.9), (33.5, 27), (35.5, 23.5), (37.4, 18), (38.6, 18), (39.8, 15.3), (41.7, 13.5),
+     (43.3, 12.5), (44.5, 10.5), (51.2, 11.8), (51, 10.4), (49, 6.5), (47.5, 4.5), (44, 1),
+     (41, -1.7), (39.2, -4.7), (39.5, -8), (40.5, -11), (40.6, -15.5), (35, -19.5), (35.5, -24),
+     (32.9, -26), (32.5, -28.6), (30, -31.3), (27, -33.7), (22.5, -34), (20, -34.8), (18.4, -34),
+     (17.8, -32), (15.2, -27), (14.5, -22.5), (11.8, -17.3), (12.3, -13.5), (13.5, -11),
+     (12.2, -6), (9, -1), (9.5, 3.5), (8.5, 4.5), (6, 4.3), (3, 6.3), (-2, 4.8), (-7.5, 4.3),
+     (-11.5, 6.9), (-13.3, 9), (-15, 11), (-17, 14.7), (-16.5, 19.5), (-17, 21), (-15, 24.5),
+     (-13, 27.7), (-9.8, 29.7), (-9.7, 32), (-6.8, 34), (-5.9, 35.8), (-2, 35.1), (1, 36.5),
+     (6.5, 37), (10.2, 37.2), (11, 35.5), (10, 34), (11.5, 33), (15.3, 32.2), (19, 30.3),
+     (20.1, 32.1), (23, 32.6), (25, 31.7), (29, 30.9), (32.3, 31.3), (32.5, 29.9)],
+    # Madagascar
+    [(49.3, -12), (50.5, -15.5), (49.4, -18), (47, -25), (45, -25.5), (43.3, -22), (44, -17),
+     (46.3, -15.7), (48, -13.5), (49.3, -12)],
+    # Sri Lanka
+    [(79.8, 6.5), (80, 9.7), (81.3, 8.5), (81.8, 7), (81, 6), (79.8, 6.5)],
+    # Sumatra
+    [(95.3, 5.6), (98, 4), (104, -2), (106, -6), (104.5, -5.8), (101, -2.5), (98.5, 1.7), (95.3, 5.6)],
+    # Java
+    [(105.3, -6.8), (108, -6.3), (112.5, -6.9), (114.5, -7.8), (110, -8.1), (106, -7.3), (105.3, -6.8)],
+    # Borneo
+    [(109, 1.5), (111, 1.8), (114, 4.6), (116, 6.8), (119, 5), (118, 1), (117.5, -1), (116, -3.8),
+     (114, -3.5), (110.2, -2.9), (109, -0.5), (109, 1.5)],
+    # New Guinea
+    [(131, -1.3), (135, -3.3), (138, -1.6), (141, -2.6), (145.5, -5), (150.5, -10.5), (147, -10),
+     (144, -7.7), (141, -9.1), (138, -8.3), (137.7, -5), (133, -4), (131, -1.3)],
+    # Luzon
+    [(120.5, 18.5), (122, 18.5), (122, 16), (124, 13), (122.5, 13.5), (120.5, 14.5), (120, 16.5),
+     (120.5, 18.5)],
+    # Mindanao
+    [(122, 7), (125.5, 9.7), (126.5, 7), (125.3, 5.6), (124, 6.5), (122, 7)],
+    # Taiwan
+    [(120.1, 23), (121, 25.2), (121.9, 24.8), (120.8, 21.9), (120.1, 23)],
+    # Honshu, Shikoku and Kyushu
+    [(130, 31), (131.5, 33.5), (132.5, 35.5), (136, 36), (137, 37), (139.5, 38.5), (140, 40),
+     (141.5, 41.3), (142, 39), (141, 37), (140.8, 35.5), (139.5, 34.8), (137, 34.5), (135, 33.5),
+     (132.7, 32.8), (131, 31), (130, 31)],
+    # Hokkaido
+    [(140, 41.6), (140.5, 43.5), (141.7, 45.4), (145.5, 43.3), (143, 42), (140, 41.6)],
+    # Australia
+    [(114, -22), (114, -26), (115, -34), (118, -35), (123, -34), (129, -31.6), (135, -34.5),
+     (138, -35.5), (140, -38), (144, -38.5), (147, -38), (150, -37.5), (151, -34), (153, -31),
+     (153, -25), (150, -22), (146, -19), (145.5, -15), (142.5, -10.7), (141.5, -13), (141.5, -17),
+     (139, -17), (136, -15), (136.5, -12), (132, -11.3), (130, -12.5), (129, -15), (126, -14),
+     (123, -17), (121, -19.5), (117, -20.7), (114, -22)],
+    # Tasmania
+    [(144.6, -40.7), (148.3, -40.9), (148, -43.2), (146, -43.6), (144.6, -40.7)],
+    # New Zealand, North Island
+    [(172.7, -34.5), (174.8, -36.8), (178.5, -37.7), (177, -39.2), (176, -41.3), (174.6, -41.3),
+     (174, -39.5), (172.7, -34.5)],
+    # New Zealand, South Island
+    [(172.7, -40.5), (174.3, -41.7), (173, -43.7), (171, -45), (169, -46.6), (166.5, -46),
+     (168.3, -44), (171.5, -41.7), (172.7, -40.5)],
+    # Antarctica, closed along the bottom edge of the map
+    [(-180, -90), (-180, -78), (-160, -78), (-150, -76), (-130, -74), (-100, -73), (-75, -72),
+     (-65, -65), (-58, -63), (-60, -70), (-45, -78), (-30, -77), (-10, -71), (10, -70), (40, -69),
+     (55, -67), (70, -68), (90, -66), (110, -66), (135, -66), (160, -70), (170, -72), (165, -78),
+     (180, -78), (180, -90), (-180, -90)],
+]
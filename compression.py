@@ -0,0 +1,69 @@
+# compression.py
+"""
+Module for reading log archives compressed with gzip, bzip2 or xz
+
+The compression is recognised from the magic bytes at the start of the
+file, not from its name, and the file is decompressed as a stream while it
+is parsed, so an archive never has to be unpacked to disk first.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+
+# Magic bytes at the start of each supported compressed format
+MAGIC_BYTES = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+
+OPENERS = {
+    'gzip': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open,
+}
+
+# Size of the buffer decompressed data is read through
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+def detect_compression(file_path):
+    """
+    Return the compression of a file from its magic bytes
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        str: 'gzip', 'bz2' or 'xz', or None for an uncompressed file
+    """
+    with open(file_path, 'rb') as file:
+        head = file.read(6)
+    for magic, compression in MAGIC_BYTES:
+        if head.startswith(magic):
+            return compression
+    return None
+
+def is_compressed(file_path):
+    """Check if a file is compressed in one of the supported formats"""
+    return detect_compression(file_path) is not None
+
+def open_log(file_path):
+    """
+    Open a log file for reading bytes, decompressing it as it is read
+
+    Byte offsets in a compressed file count decompressed bytes and seeking
+    means decompressing everything before the offset, so compressed files
+    are read from the start and have no time index or byte ranges.
+
+    Args:
+        file_path (str): Path to the plain or compressed file
+
+    Returns:
+        file: Binary file object
+    """
+    compression = detect_compression(file_path)
+    if compression is None:
+        return open(file_path, 'rb')
+    return io.BufferedReader(OPENERS[compression](file_path, 'rb'), buffer_size=STREAM_BUFFER_SIZE)
@@ -0,0 +1,206 @@
+# dedup.py
+"""
+Module to remove duplicate WSPR spots and ADIF contacts
+
+Logs are read in time order, so duplicates of a record are close to it in
+the file.  Records are held in a sliding window of a few minutes and each
+one is passed on once the window has moved past it, which keeps the memory
+bounded by the window instead of the size of the log.  A jump back in time,
+as where two merged logs meet, also moves the window on.
+
+A WSPR spot is a duplicate of another with the same date, time, transmitter,
+reporter and band, and the instance with the best SNR is kept.  An ADIF
+contact is a duplicate of an earlier one with the same call, band and mode
+logged within the window, and the first contact is kept.
+"""
+
+from collections import OrderedDict
+from datetime import date
+from wspr_columnar import WsprColumns
+from records import Spot
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Minutes a record is held while waiting for its duplicates
+DEDUP_WINDOW_MINUTES = 10
+
+_day_numbers = {}
+
+def minute_of(qso_date, time_on):
+    """
+    Return the minutes since 0001-01-01 of a date and time
+
+    Args:
+        qso_date (str): Date as YYYYMMDD
+        time_on (str): Time as HHMM or HHMMSS
+
+    Returns:
+        int: Minute number, or None if the date or time is not valid
+    """
+    day = _day_numbers.get(qso_date)
+    if day is None:
+        try:
+            day = date(int(qso_date[:4]), int(qso_date[4:6]), int(qso_date[6:8])).toordinal()
+        except ValueError:
+            return None
+        _day_numbers[qso_date] = day
+    try:
+        return day * 1440 + int(time_on[:2]) * 60 + int(time_on[2:4])
+    except ValueError:
+        return None
+
+def dedup_spots(spots, window_minutes=DEDUP_WINDOW_MINUTES):
+    """
+    Yield the spots without duplicates, keeping the best SNR of each
+
+    Args:
+        spots: Iterable of Spot records in time order
+        window_minutes (int): Minutes a spot is held for its duplicates
+
+    Yields:
+        Spot: Each distinct spot, in the order it was first seen
+    """
+    # key -> [minute, spot], oldest first
+    pending = OrderedDict()
+    for spot in spots:
+        minute = minute_of(spot.qso_date, spot.time)
+        if minute is not None:
+            while pending:
+                key, (first_minute, kept) = next(iter(pending.items()))
+                if abs(minute - first_minute) <= window_minutes:
+                    break
+                pending.popitem(last=False)
+                yield kept
+
+        key = (spot.date, spot.time, spot.tx_call, spot.rx_call, spot.band)
+        held = pending.get(key)
+        if held is None:
+            pending[key] = [minute if minute is not None else 0, spot]
+        elif spot.snr > held[1].snr:
+            held[1] = spot
+
+    for _, kept in pending.values():
+        yield kept
+
+def dedup_contacts(contacts, window_minutes=DEDUP_WINDOW_MINUTES):
+    """
+    Yield the contacts without duplicates, keeping the first of each
+
+    Args:
+        contacts: Iterable of Contact records in time order
+        window_minutes (int): Minutes after a contact in which another with
+            the same call, band and mode is a duplicate
+
+    Yields:
+        Contact: Each distinct contact
+    """
+    # key -> minute of the last contact kept, oldest first
+    recent = OrderedDict()
+    for contact in contacts:
+        minute = minute_of(contact.get('QSO_DATE') or '', contact.get('TIME_ON') or '')
+        if minute is None:
+            yield contact
+            continue
+
+        while recent:
+            key, last_minute = next(iter(recent.items()))
+            if abs(minute - last_minute) <= window_minutes:
+                break
+            recent.popitem(last=False)
+
+        key = contact_key(contact)
+        if key in recent:
+            continue
+        recent[key] = minute
+        yield contact
+
+def contact_key(contact):
+    """Return the call, band and mode that make two contacts in the window duplicates"""
+    return ((contact.get('CALL') or '').upper(), (contact.get('BAND') or '').lower(),
+            (contact.get('MODE') or '').upper())
+
+class RecentRecords:
+    """
+    Duplicates of records arriving in batches, as in the logs followed by --serve
+
+    Records already on a served map cannot be held back or replaced, so a
+    record is dropped when one with the same key was seen within the window
+    and the first one is kept, for WSPR spots too.  Spots and contacts have
+    separate windows, since the two kinds of log are not in time order with
+    each other.
+    """
+
+    def __init__(self, window_minutes=DEDUP_WINDOW_MINUTES):
+        self.window_minutes = window_minutes
+        # key -> minute it was seen, oldest first, for spots and for contacts
+        self.recent = {True: OrderedDict(), False: OrderedDict()}
+
+    def is_new(self, record):
+        """Check if a record is not a duplicate of one seen before, and remember it"""
+        is_spot = isinstance(record, Spot)
+        if is_spot:
+            minute = minute_of(record.qso_date, record.time)
+            key = (record.date, record.time, record.tx_call, record.rx_call, record.band)
+        else:
+            minute = minute_of(record.get('QSO_DATE') or '', record.get('TIME_ON') or '')
+            key = contact_key(record)
+        if minute is None:
+            return True
+
+        recent = self.recent[is_spot]
+        while recent:
+            _, first_minute = next(iter(recent.items()))
+            if abs(minute - first_minute) <= self.window_minutes:
+                break
+            recent.popitem(last=False)
+        if key in recent:
+            return False
+        recent[key] = minute
+        return True
+
+    def filter(self, records):
+        """Return the records that are not duplicates, in order"""
+        return [record for record in records if self.is_new(record)]
+
+def dedup_columns(columns):
+    """
+    Remove duplicate spots from WsprColumns, keeping the best SNR of each
+
+    The columns are already in memory, so they are de-duplicated in one
+    vectorized pass instead of through a window.
+
+    Returns:
+        WsprColumns: The distinct spots, in file order
+    """
+    # Sort by key and best SNR first, then keep the first row of each key
+    order = np.lexsort((-columns.snr, columns.band, columns.rx_call, columns.tx_call,
+                        columns.time, columns.date))
+    keys = np.stack([columns.date[order], columns.time[order], columns.tx_call[order],
+                     columns.rx_call[order], columns.band[order]])
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(keys[:, 1:] != keys[:, :-1], axis=0)
+    return columns.select(np.sort(order[first]))
+
+def dedup_records(records, is_wspr, window_minutes=DEDUP_WINDOW_MINUTES):
+    """
+    Remove duplicate spots or contacts
+
+    Args:
+        records: Iterable of Spot or Contact records, or WsprColumns
+        is_wspr (bool): True for WSPR spots, False for ADIF contacts
+        window_minutes (int): Size of the sliding window
+
+    Returns:
+        The distinct records: WsprColumns for WsprColumns, a list for a list
+        and a generator for any other iterable
+    """
+    if isinstance(records, WsprColumns):
+        return dedup_columns(records)
+    if is_wspr:
+        distinct = dedup_spots(records, window_minutes)
+    else:
+        distinct = dedup_contacts(records, window_minutes)
+    return list(distinct) if isinstance(records, list) else distinct
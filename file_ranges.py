@@ -0,0 +1,122 @@
+# file_ranges.py
+"""
+Helpers for finding record boundaries in WSPR and ADIF files, so that a
+file can be read from or up to an arbitrary byte offset
+"""
+
+import os
+from compression import is_compressed
+
+# Ranges smaller than this are not worth a separate process
+MIN_RANGE_BYTES = 1024 * 1024
+
+# Bytes read at a time while looking for a record boundary
+SCAN_SIZE = 64 * 1024
+
+def next_line_start(file, offset):
+    """Return the offset of the first line starting at or after offset"""
+    if offset == 0:
+        return 0
+    file.seek(offset - 1)
+    file.readline()
+    return file.tell()
+
+def next_record_start(file, offset):
+    """Return the offset just after the first <eor> at or after offset"""
+    if offset == 0:
+        return 0
+    file.seek(offset)
+    position = offset
+    tail = b''
+    while True:
+        block = file.read(SCAN_SIZE)
+        if not block:
+            return position
+        data = (tail + block).lower()
+        found = data.find(b'<eor>')
+        if found >= 0:
+            return position - len(tail) + found + 5
+        # Keep enough bytes to find a tag split across two blocks
+        tail = block[-4:]
+        position += len(block)
+
+def split_byte_ranges(file_path, parts, kind, start=0, end=None):
+    """
+    Split a file into byte ranges aligned to record boundaries
+
+    Args:
+        file_path (str): Path to the file
+        parts (int): Number of ranges wanted
+        kind (str): 'wspr' to align to lines, 'adif' to align to <eor>
+        start (int): Record boundary to start at
+        end (int): Byte offset to stop at, or None for the end of the file
+
+    Returns:
+        list: (start, end) byte offsets covering the requested part of the file in order
+    """
+    # A compressed file can only be decompressed from the start, in one range
+    if is_compressed(file_path):
+        return [(start, end)]
+
+    if end is None:
+        end = os.path.getsize(file_path)
+    length = max(0, end - start)
+    parts = max(1, min(parts, length // MIN_RANGE_BYTES))
+    find_boundary = next_line_start if kind == 'wspr' else next_record_start
+
+    boundaries = [start]
+    with open(file_path, 'rb') as file:
+        for part in range(1, parts):
+            boundary = find_boundary(file, start + length * part // parts)
+            if boundaries[-1] < boundary < end:
+                boundaries.append(boundary)
+    boundaries.append(max(start, end))
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def last_line_end(file, size):
+    """Return the offset just after the last newline before size, or 0"""
+    position = size
+    while position > 0:
+        start = max(0, position - SCAN_SIZE)
+        file.seek(start)
+        block = file.read(position - start)
+        found = block.rfind(b'\n')
+        if found >= 0:
+            return start + found + 1
+        position = start
+    return 0
+
+def last_record_end(file, size):
+    """Return the offset just after the last <eor> before size, or 0"""
+    position = size
+    while position > 0:
+        start = max(0, position - SCAN_SIZE)
+        file.seek(start)
+        # Read a few extra bytes so a tag split across two blocks is still found
+        block = file.read(min(position + 4, size) - start).lower()
+        found = block.rfind(b'<eor>')
+        if found >= 0:
+            return start + found + 5
+        position = start
+    return 0
+
+def complete_end(file_path, size, kind):
+    """
+    Return the offset just after the last complete record in the first size bytes
+
+    A writer may be part way through the last line or record, so only the
+    bytes up to the returned offset are safe to parse.
+
+    Args:
+        file_path (str): Path to the file
+        size (int): Number of bytes of the file to consider
+        kind (str): 'wspr' for lines, 'adif' for <eor> terminated records
+
+    Returns:
+        int: Byte offset
+    """
+    with open(file_path, 'rb') as file:
+        if kind == 'wspr':
+            return last_line_end(file, size)
+        return last_record_end(file, size)
@@ -0,0 +1,151 @@
+# filters.py
+"""
+Record filters that the parsers apply to raw field text before any
+conversion, so records outside the requested window cost as little as possible
+"""
+
+import fnmatch
+import re
+from band_plan import adif_band, frequency_to_band
+
+class RecordFilter:
+    """Date, band, mode and callsign predicates evaluated on raw field text"""
+
+    # The ADIF fields rejects_adif_field checks
+    ADIF_FIELDS = frozenset(('QSO_DATE', 'BAND', 'CALL'))
+
+    def __init__(self, start_date=None, end_date=None, bands=None, modes=None, calls=None):
+        """
+        Args:
+            start_date (date): First date to include, or None
+            end_date (date): Last date to include, or None
+            bands (list): Band names such as '20m' or '20', or None for all
+            modes (list): Mode names such as 'FT8', or None for all
+            calls (list): Callsign patterns using * and ? wildcards, or None for all
+        """
+        self.start_date = start_date
+        self.end_date = end_date
+
+        # Dates are compared as YYYYMMDD strings, WSPR lines carry YYMMDD
+        self.start = start_date.strftime("%Y%m%d") if start_date else None
+        self.end = end_date.strftime("%Y%m%d") if end_date else None
+        self.wspr_start = self.start[2:] if self.start else None
+        self.wspr_end = self.end[2:] if self.end else None
+
+        self.bands = set(normalize_band(band) for band in bands) if bands else None
+
+        self.modes = set(mode.upper() for mode in modes) if modes else None
+
+        self.call_pattern = None
+        if calls:
+            pattern = "|".join(fnmatch.translate(call.upper()) for call in calls)
+            self.call_pattern = re.compile(pattern, re.IGNORECASE)
+
+    def is_active(self):
+        """Return True if any predicate is set"""
+        return bool(self.start or self.end or self.bands or self.modes or self.call_pattern)
+
+    def signature(self):
+        """Return a string describing the predicates, used to key saved parse results"""
+        return repr((self.start, self.end,
+                     sorted(self.bands or ()), sorted(self.modes or ()),
+                     self.call_pattern.pattern if self.call_pattern else None))
+
+    def date_ok(self, qso_date):
+        """Check a YYYYMMDD date string against the date window"""
+        if self.start and qso_date < self.start:
+            return False
+        if self.end and qso_date > self.end:
+            return False
+        return True
+
+    def wspr_date_ok(self, wspr_date):
+        """Check a YYMMDD date string from ALL_WSPR.TXT against the date window"""
+        if self.wspr_start and wspr_date < self.wspr_start:
+            return False
+        if self.wspr_end and wspr_date > self.wspr_end:
+            return False
+        return True
+
+    def band_ok(self, band):
+        """Check an ADIF band name against the requested bands"""
+        return not self.bands or band.lower() in self.bands
+
+    def frequency_ok(self, frequency):
+        """Check a frequency in MHz against the band plan edges of the requested bands"""
+        return not self.bands or frequency_to_band(frequency) in self.bands
+
+    def mode_ok(self, mode):
+        """Check a mode name against the requested modes"""
+        return not self.modes or mode.upper() in self.modes
+
+    def call_ok(self, call):
+        """Check a callsign against the requested patterns"""
+        return self.call_pattern is None or self.call_pattern.match(call) is not None
+
+    def rejects_adif_field(self, field_name, value):
+        """
+        Check a single ADIF field as soon as the tokenizer has read it
+
+        Args:
+            field_name (str): Upper case ADIF field name
+            value (str): Raw field value
+
+        Returns:
+            bool: True if the record holding this field can be skipped
+        """
+        if field_name == 'QSO_DATE':
+            return not self.date_ok(value)
+        if field_name == 'BAND':
+            return not self.band_ok(value)
+        if field_name == 'CALL':
+            return not self.call_ok(value)
+        return False
+
+    def accepts_adif_record(self, record):
+        """
+        Check the predicates that need the complete ADIF record
+
+        A band filter falls back to FREQ when BAND is missing and a mode
+        filter also matches SUBMODE (e.g. MFSK/FT4).
+        """
+        if self.bands and not self.band_ok(adif_band(record)):
+            return False
+        if self.modes and not (self.mode_ok(record.get('MODE', '')) or self.mode_ok(record.get('SUBMODE', ''))):
+            return False
+        return True
+
+def normalize_band(band):
+    """Normalize a band name from the command line, e.g. '20' -> '20m'"""
+    band = band.strip().lower()
+    if band.isdigit():
+        band += 'm'
+    return band
+
+def split_list(value):
+    """Split a comma separated command line value, treating 'all' as no filter"""
+    if not value:
+        return None
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    if not items or any(item.lower() == 'all' for item in items):
+        return None
+    return items
+
+def record_filter_for(settings):
+    """
+    Return the filter the parsers should use for these settings
+
+    Args:
+        settings (Settings): Settings object, possibly holding a filter built by main.py
+
+    Returns:
+        RecordFilter: The filter from settings or one built from its date, band, mode and call values
+    """
+    if getattr(settings, 'record_filter', None) is not None:
+        return settings.record_filter
+
+    return RecordFilter(start_date=settings.start_date,
+                        end_date=settings.end_date,
+                        bands=split_list(settings.band),
+                        modes=split_list(settings.mode),
+                        calls=split_list(settings.call))
@@ -0,0 +1,205 @@
+# geodesy.py
+"""
+Module for the great-circle distance and bearing of each contact
+
+Paths are computed between grid squares: from the operator grid, or the
+MY_GRIDSQUARE of a contact when no operator grid is given, to the grid of
+the contact.  The same pairs of locators repeat throughout a log, so each
+pair is computed once, with all new pairs of a batch of records in one
+vectorized NumPy pass, and memoized.  The results are set on the records
+as path_km and path_bearing (PATH_KM and PATH_BEARING).
+"""
+
+import math
+from itertools import islice
+from grid_converter import grids_to_coordinates
+from wspr_columnar import WsprColumns
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Mean radius of the earth
+EARTH_RADIUS_KM = 6371.0
+
+# Number of grid pairs kept in the path cache before it is cleared
+PATH_CACHE_SIZE = 1 << 20
+
+# Records per batch when paths are added to a stream of records
+PATH_CHUNK = 4096
+
+# (from grid, to grid) -> (km, bearing), (None, None) when a grid is invalid
+_paths = {}
+
+def distance_bearing(lat1, lon1, lat2, lon2):
+    """
+    Return the great-circle distance and initial bearing between two points
+
+    Args:
+        lat1, lon1 (float): Start point in decimal degrees
+        lat2, lon2 (float): End point in decimal degrees
+
+    Returns:
+        tuple: (distance in km, bearing in degrees clockwise from north)
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = phi2 - phi1
+    delta_lambda = math.radians(lon2 - lon1)
+
+    # Haversine formula
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    distance = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+    y = math.sin(delta_lambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(delta_lambda)
+    bearing = math.degrees(math.atan2(y, x)) % 360
+    return distance, bearing
+
+def distances_bearings(lat1, lon1, lat2, lon2):
+    """
+    Vectorized distance_bearing over NumPy arrays of points
+
+    Returns:
+        tuple: (distances in km, bearings in degrees) as float64 arrays,
+        NaN where a point is NaN
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    y = np.sin(delta_lambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(delta_lambda)
+    bearings = np.degrees(np.arctan2(y, x)) % 360
+    return distances, bearings
+
+def grid_paths(pairs):
+    """
+    Compute the paths of grid pairs that are not memoized yet
+
+    Args:
+        pairs (iterable): (from grid, to grid) tuples
+
+    Returns:
+        dict: The path cache, (from grid, to grid) -> (km, bearing) rounded to
+        0.1, or (None, None) when a grid is not valid
+    """
+    missing = [pair for pair in set(pairs) if pair not in _paths]
+    if not missing:
+        return _paths
+    if len(_paths) + len(missing) > PATH_CACHE_SIZE:
+        _paths.clear()
+
+    from_lat, from_lon = grids_to_coordinates(grid for grid, _ in missing)
+    to_lat, to_lon = grids_to_coordinates(grid for _, grid in missing)
+    if np is not None:
+        distances, bearings = distances_bearings(from_lat, from_lon, to_lat, to_lon)
+        distances = distances.tolist()
+        bearings = bearings.tolist()
+    else:
+        distances = []
+        bearings = []
+        for lat1, lon1, lat2, lon2 in zip(from_lat, from_lon, to_lat, to_lon):
+            distance, bearing = distance_bearing(lat1, lon1, lat2, lon2)
+            distances.append(distance)
+            bearings.append(bearing)
+
+    for pair, distance, bearing in zip(missing, distances, bearings):
+        if math.isnan(distance):
+            _paths[pair] = (None, None)
+        else:
+            _paths[pair] = (round(distance, 1), round(bearing, 1))
+    return _paths
+
+def record_grids(record, operator_grid):
+    """Return the (from grid, to grid) pair of a record"""
+    origin = operator_grid or record.get('MY_GRIDSQUARE') or ''
+    return origin.strip(), (record.get('GRIDSQUARE') or '').strip()
+
+def add_paths(records, operator_grid=None):
+    """
+    Set the distance and bearing from the operator on each record
+
+    Args:
+        records (list): Spot or Contact records, or WsprColumns
+        operator_grid (str): Grid the paths start from, or None to use the
+            MY_GRIDSQUARE of each record
+
+    Returns:
+        The records; path_km and path_bearing are set on each record with
+        valid grids, and WsprColumns get path_km and path_bearing arrays
+        that are NaN where a grid is not valid
+    """
+    if isinstance(records, WsprColumns):
+        return _add_column_paths(records, operator_grid)
+
+    pairs = [record_grids(record, operator_grid) for record in records]
+    paths = grid_paths(pair for pair in pairs if pair[0] and pair[1])
+    for record, pair in zip(records, pairs):
+        distance, bearing = paths.get(pair, (None, None))
+        if distance is not None:
+            record['path_km'] = distance
+            record['path_bearing'] = bearing
+    return records
+
+def _add_column_paths(columns, operator_grid):
+    """Set path_km and path_bearing arrays on WsprColumns, one path per distinct grid"""
+    columns.path_km = np.full(len(columns), np.nan, dtype=np.float32)
+    columns.path_bearing = np.full(len(columns), np.nan, dtype=np.float32)
+    if not operator_grid:
+        return columns
+
+    codes = np.unique(columns.tx_grid).tolist()
+    paths = grid_paths((operator_grid.strip(), columns.grids[code]) for code in codes)
+    km_by_code = np.full(len(columns.grids), np.nan, dtype=np.float32)
+    bearing_by_code = np.full(len(columns.grids), np.nan, dtype=np.float32)
+    for code in codes:
+        distance, bearing = paths[(operator_grid.strip(), columns.grids[code])]
+        if distance is not None:
+            km_by_code[code] = distance
+            bearing_by_code[code] = bearing
+
+    valid = ~np.isnan(columns.tx_lat)
+    columns.path_km = np.where(valid, km_by_code[columns.tx_grid], np.nan).astype(np.float32)
+    columns.path_bearing = np.where(valid, bearing_by_code[columns.tx_grid], np.nan).astype(np.float32)
+    return columns
+
+def iter_with_paths(records, operator_grid=None, chunk_size=PATH_CHUNK):
+    """
+    Add paths to a stream of records, a batch at a time
+
+    Yields:
+        The records of the stream with path_km and path_bearing set
+    """
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield from add_paths(chunk, operator_grid)
+
+def filter_min_km(records, min_km):
+    """
+    Keep the records at least min_km from the operator
+
+    Records without a path are dropped.  Returns WsprColumns for
+    WsprColumns, a list for a list and a generator for any other iterable.
+    """
+    if isinstance(records, WsprColumns):
+        path_km = getattr(records, 'path_km', None)
+        if path_km is None:
+            return records.select(np.zeros(len(records), dtype=bool))
+        return records.select(path_km >= min_km)
+
+    distant = (record for record in records
+               if record.get('path_km') is not None and record.get('path_km') >= min_km)
+    return list(distant) if isinstance(records, list) else distant
+
+def clear_path_cache():
+    """Forget the memoized paths"""
+    _paths.clear()
@@ -3,58 +3,179 @@
 Module for converting Maidenhead grid squares to latitude and longitude coordinates
 """
 
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Number of distinct 6 and 8 character locators kept in the conversion cache
+LOCATOR_CACHE_SIZE = 65536
+
+# Number of grid squares that could not be converted, counted instead of printed
+invalid_grids = 0
+
+def _build_tables():
+    """
+    Precompute the center of every field (2 characters) and square (4 characters)
+
+    Returns:
+        tuple: (fields, squares) dictionaries of grid -> (latitude, longitude)
+    """
+    fields = {}
+    squares = {}
+    for lon_field in range(18):
+        for lat_field in range(18):
+            field = chr(ord('A') + lon_field) + chr(ord('A') + lat_field)
+            fields[field] = (lat_field * 10 - 90 + 5, lon_field * 20 - 180 + 10)
+            for lon_square in range(10):
+                for lat_square in range(10):
+                    square = f"{field}{lon_square}{lat_square}"
+                    latitude = lat_field * 10 + lat_square - 90 + 0.5
+                    longitude = lon_field * 20 + lon_square * 2 - 180 + 1
+                    squares[square] = (round(latitude, 6), round(longitude, 6))
+    return fields, squares
+
+FIELD_COORDINATES, SQUARE_COORDINATES = _build_tables()
+
+def _is_valid_locator(grid):
+    """Check an upper case 6 or 8 character locator beyond its square"""
+    if not ('A' <= grid[4] <= 'X' and 'A' <= grid[5] <= 'X'):
+        return False
+    return len(grid) == 6 or (grid[6].isdigit() and grid[7].isdigit())
+
+@lru_cache(maxsize=LOCATOR_CACHE_SIZE)
+def _locator_to_coordinates(grid):
+    """
+    Convert an upper case 6 or 8 character locator, memoized
+
+    Returns:
+        tuple: (latitude, longitude) or (None, None) if the locator is invalid
+    """
+    square = SQUARE_COORDINATES.get(grid[:4])
+    if square is None or not _is_valid_locator(grid):
+        return None, None
+
+    # Start from the south west corner of the square
+    latitude = square[0] - 0.5 + (ord(grid[5]) - ord('A')) / 24
+    longitude = square[1] - 1 + (ord(grid[4]) - ord('A')) / 12
+
+    if len(grid) == 8:
+        latitude += int(grid[7]) / 240 + 1/480   # Half of extended square height
+        longitude += int(grid[6]) / 120 + 1/240  # Half of extended square width
+    else:
+        latitude += 1/48   # Half of subsquare height
+        longitude += 1/24  # Half of subsquare width
+
+    return round(latitude, 6), round(longitude, 6)
+
 def grid_to_coordinates(grid_square):
     """
     Convert a Maidenhead grid square to latitude and longitude
-    
+
     Args:
         grid_square (str): Maidenhead grid square (e.g., FM18lw)
-    
+
+    Returns:
+        tuple: (latitude, longitude) in decimal degrees, or (None, None) if invalid
+    """
+    global invalid_grids
+
+    # Fast path for the common upper case four character square
+    coordinates = SQUARE_COORDINATES.get(grid_square)
+    if coordinates is not None:
+        return coordinates
+
+    grid = grid_square.upper().strip() if isinstance(grid_square, str) else ''
+
+    if len(grid) == 4:
+        coordinates = SQUARE_COORDINATES.get(grid)
+    elif len(grid) == 2:
+        coordinates = FIELD_COORDINATES.get(grid)
+    elif len(grid) in (6, 8):
+        coordinates = _locator_to_coordinates(grid)
+        if coordinates[0] is None:
+            coordinates = None
+
+    if coordinates is None:
+        invalid_grids += 1
+        return None, None
+
+    return coordinates
+
+def grids_to_coordinates(grid_squares):
+    """
+    Convert many grid squares at once
+
+    Args:
+        grid_squares (iterable): Maidenhead grid squares
+
+    Returns:
+        tuple: (latitudes, longitudes) as NumPy float64 arrays when NumPy is
+        installed, otherwise as array('d'); invalid grids are NaN
+    """
+    latitudes = array('d')
+    longitudes = array('d')
+    nan = float('nan')
+    for grid_square in grid_squares:
+        latitude, longitude = grid_to_coordinates(grid_square)
+        if latitude is None:
+            latitude = longitude = nan
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+
+    if np is not None:
+        return np.frombuffer(latitudes, dtype=np.float64), np.frombuffer(longitudes, dtype=np.float64)
+    return latitudes, longitudes
+
+def coordinates_to_grid(latitude, longitude, precision=6):
+    """
+    Convert latitude and longitude to the Maidenhead grid square containing them
+
+    Args:
+        latitude (float): Latitude in decimal degrees (-90 to 90)
+        longitude (float): Longitude in decimal degrees (-180 to 180)
+        precision (int): Number of characters, 2, 4, 6 or 8
+
     Returns:
-        tuple: (latitude, longitude) in decimal degrees
-    """
-    try:
-        # Ensure the grid square is uppercase
-        grid = grid_square.upper().strip()
-        
-        # Basic validation
-        if not grid or len(grid) < 2:
-            return None, None
-        
-        # Convert the first pair (field) A-R -> 0-17
-        lon = (ord(grid[0]) - ord('A')) * 20
-        lat = (ord(grid[1]) - ord('A')) * 10
-        
-        # Convert the second pair (square) 0-9 -> 0-9
-        if len(grid) >= 4:
-            lon += int(grid[2]) * 2
-            lat += int(grid[3])
-        
-        # Convert the third pair (subsquare) a-x -> 0-23
-        if len(grid) >= 6:
-            lon += (ord(grid[4]) - ord('A')) / 12
-            lat += (ord(grid[5]) - ord('A')) / 24
-        
-        # Convert to the final coordinates
-        longitude = lon - 180  # Convert to range -180 to 180
-        latitude = lat - 90    # Convert to range -90 to 90
-        
-        # For subsquare, we need to add half of the subsquare size
-        # to get the center point
-        if len(grid) >= 6:
-            longitude += 1/24  # Half of subsquare width
-            latitude += 1/48   # Half of subsquare height
-        # For square, we need to add half of the square size
-        elif len(grid) >= 4:
-            longitude += 1     # Half of square width
-            latitude += 0.5    # Half of square height
-        # For field, we need to add half of the field size
-        else:
-            longitude += 10    # Half of field width
-            latitude += 5      # Half of field height
-        
-        return round(latitude, 6), round(longitude, 6)
-        
-    except Exception as e:
-        print(f"Error converting grid square {grid_square}: {e}")
-        return None, None
\ No newline at end of file
+        str: Grid square with the subsquare in lower case (e.g., FM18lw), or None if out of range
+    """
+    if precision not in (2, 4, 6, 8):
+        raise ValueError(f"Unsupported grid precision: {precision}")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+
+    # Clamp the north and east edges into the last square
+    lat = min(latitude + 90, 180 - 1e-9)
+    lon = min(longitude + 180, 360 - 1e-9)
+
+    grid = chr(ord('A') + int(lon // 20)) + chr(ord('A') + int(lat // 10))
+    if precision >= 4:
+        lon %= 20
+        lat %= 10
+        grid += str(int(lon // 2)) + str(int(lat))
+    if precision >= 6:
+        lon = (lon % 2) * 12
+        lat = (lat % 1) * 24
+        grid += chr(ord('a') + int(lon)) + chr(ord('a') + int(lat))
+    if precision == 8:
+        grid += str(int((lon % 1) * 10)) + str(int((lat % 1) * 10))
+
+    return grid
+
+def invalid_grid_count():
+    """Return the number of grid squares that failed to convert"""
+    return invalid_grids
+
+def add_invalid_grids(count):
+    """Add grid squares that failed to convert elsewhere, such as in a worker process"""
+    global invalid_grids
+    invalid_grids += count
+
+def clear_grid_cache():
+    """Reset the locator cache and the invalid grid counter"""
+    global invalid_grids
+    _locator_to_coordinates.cache_clear()
+    invalid_grids = 0
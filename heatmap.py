@@ -0,0 +1,268 @@
+# heatmap.py
+"""
+Module for the SNR-weighted propagation heatmap
+
+Spots are binned into CELL_DEGREES latitude/longitude cells per band in one
+vectorized NumPy pass, so millions of spots reduce to the few thousand cells
+that were heard before anything is drawn.  The cells are weighted by spot
+count, mean SNR or best SNR and drawn as a small transparent PNG, either
+equirectangular for the static renderer or resampled to Web Mercator for a
+Google Maps ground overlay.
+"""
+
+import base64
+import math
+from png_writer import png_bytes
+from wspr_columnar import WsprColumns
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Size of a heatmap cell in degrees of latitude and longitude
+CELL_DEGREES = 0.5
+
+WEIGHTS = ('count', 'mean', 'best')
+
+# Key of the heatmap holding every band
+ALL_BANDS = 'all'
+
+# SNR in dB drawn with the first and the last HEAT_COLORS
+SNR_RANGE = (-30.0, 10.0)
+
+# Colors from the weakest to the strongest cell
+HEAT_COLORS = ((0, 0, 255), (0, 255, 255), (0, 255, 0), (255, 255, 0), (255, 0, 0))
+
+# Latitude where the square Web Mercator world used by Google Maps ends
+MERCATOR_LATITUDE = 85.05112878
+
+class Heatmap:
+    """
+    Binned spots of one band, or of all bands
+
+    Only cells holding spots are kept, in cells as
+    cell index (row * columns + column) -> [count, snr count, snr sum, best snr].
+    Row 0 is the northernmost row and column 0 starts at longitude -180.
+    """
+
+    def __init__(self, band, cell_degrees=CELL_DEGREES):
+        self.band = band
+        self.cell_degrees = cell_degrees
+        self.rows = int(round(180 / cell_degrees))
+        self.columns = int(round(360 / cell_degrees))
+        self.cells = {}
+
+    def add(self, cell, count, snr_count, snr_sum, best_snr):
+        """Merge binned spots into a cell"""
+        totals = self.cells.get(cell)
+        if totals is None:
+            self.cells[cell] = [count, snr_count, snr_sum, best_snr]
+            return
+        totals[0] += count
+        totals[1] += snr_count
+        totals[2] += snr_sum
+        if best_snr is not None and (totals[3] is None or best_snr > totals[3]):
+            totals[3] = best_snr
+
+    def values(self, weight):
+        """
+        Return the weight of every cell scaled to 0..1
+
+        Counts are scaled logarithmically against the busiest cell; mean and
+        best SNR are scaled over SNR_RANGE.  Cells without an SNR are left
+        out of the SNR weights.
+
+        Returns:
+            dict: cell index -> value between 0 and 1
+        """
+        if weight == 'count':
+            if not self.cells:
+                return {}
+            top = math.log1p(max(totals[0] for totals in self.cells.values()))
+            return {cell: math.log1p(totals[0]) / top for cell, totals in self.cells.items()}
+
+        low, high = SNR_RANGE
+        values = {}
+        for cell, (count, snr_count, snr_sum, best_snr) in self.cells.items():
+            if not snr_count:
+                continue
+            snr = snr_sum / snr_count if weight == 'mean' else best_snr
+            values[cell] = min(max((snr - low) / (high - low), 0.0), 1.0)
+        return values
+
+def parse_hours(text):
+    """
+    Parse an hour selection such as "6", "6-12", "22-2" or "0-3,18-23"
+
+    Ranges include both ends and wrap around midnight.
+
+    Returns:
+        set: UTC hours, or None for every hour
+    """
+    if not text or text.lower() == 'all':
+        return None
+    hours = set()
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        first = int(first)
+        last = int(last) if last else first
+        if not (0 <= first <= 23 and 0 <= last <= 23):
+            raise ValueError(f"hours must be between 0 and 23: {part}")
+        hour = first
+        hours.add(hour)
+        while hour != last:
+            hour = (hour + 1) % 24
+            hours.add(hour)
+    return hours
+
+def spot_columns(contacts):
+    """
+    Return the coordinates, SNR, band and hour of every contact
+
+    Returns:
+        tuple: (latitudes, longitudes, snrs, band codes, hours, band names)
+        where a band code indexes band names, a missing SNR is NaN and a
+        missing hour is -1
+    """
+    if isinstance(contacts, WsprColumns):
+        return (contacts.tx_lat, contacts.tx_lon, contacts.snr, contacts.band,
+                contacts.time // 100, contacts.bands)
+
+    latitudes = []
+    longitudes = []
+    snrs = []
+    bands = []
+    hours = []
+    band_names = []
+    band_codes = {}
+    for contact in contacts:
+        latitude = contact.get('LATITUDE')
+        longitude = contact.get('LONGITUDE')
+        if latitude is None or longitude is None or latitude == '' or longitude == '':
+            continue
+        latitudes.append(float(latitude))
+        longitudes.append(float(longitude))
+        snr = contact.get('snr')
+        snrs.append(float(snr) if snr is not None and snr != '' else math.nan)
+        band = contact.get('BAND') or ''
+        code = band_codes.get(band)
+        if code is None:
+            code = band_codes[band] = len(band_names)
+            band_names.append(band)
+        bands.append(code)
+        time_on = contact.get('TIME_ON') or ''
+        hours.append(int(time_on[:2]) if time_on[:2].isdigit() else -1)
+    return latitudes, longitudes, snrs, bands, hours, band_names
+
+def bin_spots(contacts, hours=None, by_band=True, cell_degrees=CELL_DEGREES):
+    """
+    Bin spots into heatmap cells
+
+    Args:
+        contacts (list): Contacts with coordinates, or WsprColumns
+        hours (set): UTC hours to keep, None for every hour
+        by_band (bool): Also return one heatmap per band
+        cell_degrees (float): Size of a cell in degrees
+
+    Returns:
+        dict: ALL_BANDS, and each band if by_band is True, -> Heatmap
+    """
+    latitudes, longitudes, snrs, bands, spot_hours, band_names = spot_columns(contacts)
+    heatmaps = {ALL_BANDS: Heatmap(ALL_BANDS, cell_degrees)}
+    rows = heatmaps[ALL_BANDS].rows
+    columns = heatmaps[ALL_BANDS].columns
+
+    def add(band, cell, count, snr_count, snr_sum, best_snr):
+        heatmaps[ALL_BANDS].add(cell, count, snr_count, snr_sum, best_snr)
+        if by_band:
+            if band not in heatmaps:
+                heatmaps[band] = Heatmap(band, cell_degrees)
+            heatmaps[band].add(cell, count, snr_count, snr_sum, best_snr)
+
+    if np is None:
+        for latitude, longitude, snr, band, hour in zip(latitudes, longitudes, snrs, bands, spot_hours):
+            if math.isnan(latitude) or (hours is not None and hour not in hours):
+                continue
+            row = min(max(int((90.0 - latitude) / cell_degrees), 0), rows - 1)
+            column = min(max(int((longitude + 180.0) / cell_degrees), 0), columns - 1)
+            has_snr = not math.isnan(snr)
+            add(band_names[band], row * columns + column,
+                1, 1 if has_snr else 0, snr if has_snr else 0.0, snr if has_snr else None)
+        return heatmaps
+
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    snrs = np.asarray(snrs, dtype=np.float64)
+    bands = np.asarray(bands, dtype=np.int64)
+    keep = ~np.isnan(latitudes) & ~np.isnan(longitudes)
+    if hours is not None:
+        keep &= np.isin(np.asarray(spot_hours), sorted(hours))
+    latitudes, longitudes, snrs, bands = latitudes[keep], longitudes[keep], snrs[keep], bands[keep]
+
+    # One key per band and cell, binned in a single pass over the spots
+    row = np.clip(((90.0 - latitudes) / cell_degrees).astype(np.int64), 0, rows - 1)
+    column = np.clip(((longitudes + 180.0) / cell_degrees).astype(np.int64), 0, columns - 1)
+    keys = bands * (rows * columns) + row * columns + column
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    has_snr = ~np.isnan(snrs)
+    counts = np.bincount(inverse, minlength=len(unique_keys))
+    snr_counts = np.bincount(inverse, weights=has_snr, minlength=len(unique_keys))
+    snr_sums = np.bincount(inverse, weights=np.where(has_snr, snrs, 0.0), minlength=len(unique_keys))
+    best = np.full(len(unique_keys), -np.inf)
+    np.maximum.at(best, inverse[has_snr], snrs[has_snr])
+
+    for key, count, snr_count, snr_sum, best_snr in zip(
+            unique_keys.tolist(), counts.tolist(), snr_counts.tolist(), snr_sums.tolist(), best.tolist()):
+        band, cell = divmod(key, rows * columns)
+        add(band_names[band], cell, count, int(snr_count), snr_sum,
+            best_snr if snr_count else None)
+    return heatmaps
+
+def heat_color(value):
+    """Return the RGBA bytes for a cell value between 0 and 1"""
+    position = value * (len(HEAT_COLORS) - 1)
+    index = min(int(position), len(HEAT_COLORS) - 2)
+    fraction = position - index
+    low = HEAT_COLORS[index]
+    high = HEAT_COLORS[index + 1]
+    red, green, blue = (int(a + (b - a) * fraction) for a, b in zip(low, high))
+    return bytes((red, green, blue, int(96 + 159 * value)))
+
+def heatmap_pixels(heatmap, weight):
+    """Return the heatmap as equirectangular RGBA rows, one pixel per cell"""
+    pixels = bytearray(heatmap.rows * heatmap.columns * 4)
+    for cell, value in heatmap.values(weight).items():
+        pixels[cell * 4:cell * 4 + 4] = heat_color(value)
+    return pixels
+
+def heatmap_png(heatmap, weight, mercator=False):
+    """
+    Draw the heatmap as a transparent PNG
+
+    Args:
+        heatmap (Heatmap): Binned spots
+        weight (str): 'count', 'mean' or 'best'
+        mercator (bool): Resample the rows to Web Mercator, covering latitudes
+            up to MERCATOR_LATITUDE, for a Google Maps ground overlay
+
+    Returns:
+        bytes: The PNG file contents
+    """
+    pixels = heatmap_pixels(heatmap, weight)
+    if not mercator:
+        return png_bytes(heatmap.columns, heatmap.rows, pixels, alpha=True)
+
+    stride = heatmap.columns * 4
+    height = heatmap.columns
+    resampled = bytearray()
+    for row in range(height):
+        y = math.pi * (1 - 2 * (row + 0.5) / height)
+        latitude = math.degrees(math.atan(math.sinh(y)))
+        source = min(int((90.0 - latitude) / heatmap.cell_degrees), heatmap.rows - 1)
+        resampled += pixels[source * stride:(source + 1) * stride]
+    return png_bytes(heatmap.columns, height, resampled, alpha=True)
+
+def data_uri(png):
+    """Return a PNG as a data: URI"""
+    return "data:image/png;base64," + base64.b64encode(png).decode('ascii')
@@ -0,0 +1,128 @@
+# incremental.py
+"""
+Incremental parsing of log files that WSJT-X keeps appending to
+
+A checkpoint per input file records how far the file has been parsed.  On
+the next run only the bytes appended since then are parsed and the new
+records are appended to the ones saved before.  If the file was truncated
+or replaced (rotated) the whole file is parsed again.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from adif_parser import parse_adif_range
+from wspr_parser import parse_wspr_range
+from file_ranges import complete_end
+from compression import is_compressed
+from filters import record_filter_for
+from settings import Settings
+
+# Bumped whenever the saved record layout changes
+CHECKPOINT_VERSION = 2
+
+# Number of bytes at the start of the file used to recognise it after rotation
+HEAD_BYTES = 4096
+
+def checkpoint_paths(file_path, settings : Settings):
+    """
+    Return the checkpoint and record file names for an input file
+
+    Returns:
+        tuple: (checkpoint json path, pickled records path)
+    """
+    directory = os.path.join(settings.OUTPUT_DIRECTORY, "checkpoints")
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    base = os.path.join(directory, f"{os.path.basename(file_path)}.{key}")
+    return base + ".json", base + ".pkl"
+
+def head_hash(file_path, length):
+    """Return a hash of the first length bytes of the file"""
+    with open(file_path, 'rb') as file:
+        return hashlib.sha1(file.read(length)).hexdigest()
+
+def load_checkpoint(checkpoint_file):
+    """Return the saved checkpoint dictionary, or None if there is none"""
+    try:
+        with open(checkpoint_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_records(records_file):
+    """Read every batch of records appended to the records file"""
+    records = []
+    with open(records_file, 'rb') as f:
+        while True:
+            try:
+                records.extend(pickle.load(f))
+            except EOFError:
+                break
+    return records
+
+def parse_incremental(file_path, settings : Settings, kind):
+    """
+    Parse only what was appended to a file since the last run
+
+    Args:
+        file_path (str): Path to the ALL_WSPR.TXT or ADIF file
+        settings (Settings): Settings holding the date, band, mode and call filters
+        kind (str): 'wspr' or 'adif'
+
+    Returns:
+        list: Every record in the file, the same as parse_wspr_file or parse_adif_file
+    """
+    parse_range = parse_wspr_range if kind == 'wspr' else parse_adif_range
+
+    # Archives do not grow and their offsets are not file offsets, so read them in full
+    if is_compressed(file_path):
+        print(f"Incremental: {file_path} is compressed, parsing it in full")
+        return parse_range(file_path, settings)
+    checkpoint_file, records_file = checkpoint_paths(file_path, settings)
+    checkpoint = load_checkpoint(checkpoint_file)
+
+    stat = os.stat(file_path)
+    # Stop before a line or record that is still being written
+    end = complete_end(file_path, stat.st_size, kind)
+    filter_signature = record_filter_for(settings).signature()
+
+    resume = (checkpoint is not None
+              and checkpoint.get('version') == CHECKPOINT_VERSION
+              and checkpoint.get('filter') == filter_signature
+              and checkpoint.get('inode') == stat.st_ino
+              and checkpoint.get('offset', 0) <= end
+              and os.path.exists(records_file)
+              and head_hash(file_path, checkpoint['head_length']) == checkpoint['head_hash'])
+
+    if resume:
+        start = checkpoint['offset']
+        records = load_records(records_file)
+        new_records = parse_range(file_path, settings, start, end)
+        print(f"Incremental: parsed {end - start} new bytes, {len(new_records)} new records")
+    else:
+        if checkpoint is not None:
+            print(f"Incremental: {file_path} was truncated, rotated or filtered differently, parsing it again")
+        records = []
+        new_records = parse_range(file_path, settings, 0, end)
+
+    os.makedirs(os.path.dirname(checkpoint_file), exist_ok=True)
+    with open(records_file, 'ab' if resume else 'wb') as f:
+        if new_records:
+            pickle.dump(new_records, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    head_length = min(HEAD_BYTES, end)
+    with open(checkpoint_file, 'w') as f:
+        json.dump({
+            'version': CHECKPOINT_VERSION,
+            'path': os.path.abspath(file_path),
+            'inode': stat.st_ino,
+            'size': stat.st_size,
+            'offset': end,
+            'head_length': head_length,
+            'head_hash': head_hash(file_path, head_length),
+            'filter': filter_signature,
+        }, f, indent=4)
+
+    records.extend(new_records)
+    return records
@@ -0,0 +1,267 @@
+# instrumentation.py
+"""
+Module for timing the stages of a run, enabled by --profile
+
+Code marks its stages with `with stage('name') as timed:` and reports
+problems with count('name').  Until start() is called stage() returns one
+shared object that does nothing and count() returns at once, so the
+instrumented code runs as fast as without it.  Once started, each stage
+records its calls, wall and CPU time, the records it handled and, with
+memory tracing, the peak of the memory Python allocated while it ran.
+One stage may also be run under cProfile and its statistics saved.
+"""
+
+import cProfile
+import json
+import time
+import tracemalloc
+
+class StageStats:
+    """Totals of every run of one stage"""
+
+    __slots__ = ('name', 'depth', 'calls', 'wall', 'cpu', 'records', 'peak_memory')
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.records = 0
+        self.peak_memory = None
+
+    def to_dict(self):
+        """Return the totals as a dictionary for the JSON metrics"""
+        return {
+            "calls": self.calls,
+            "wall_seconds": round(self.wall, 6),
+            "cpu_seconds": round(self.cpu, 6),
+            "records": self.records,
+            "records_per_second": round(self.records / self.wall, 1) if self.wall else None,
+            "peak_memory_mb": round(self.peak_memory / (1024 * 1024), 2) if self.peak_memory is not None else None,
+        }
+
+class Stage:
+    """One run of a stage, used as a context manager"""
+
+    __slots__ = ('profile', 'stats', 'wall', 'cpu', 'child_peak')
+
+    def __init__(self, profile, stats):
+        self.profile = profile
+        self.stats = stats
+        self.child_peak = 0
+
+    def add_records(self, count):
+        """Add to the number of records the stage handled"""
+        self.stats.records += count
+
+    def __enter__(self):
+        profile = self.profile
+        if profile.trace_memory:
+            # The peak is reset for this stage, the enclosing stage keeps its own peak so far
+            if profile.running:
+                parent = profile.running[-1]
+                parent.child_peak = max(parent.child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        profile.running.append(self)
+        if self.stats.name == profile.profile_stage:
+            profile.profiler.enable()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        profile = self.profile
+        stats = self.stats
+        stats.wall += time.perf_counter() - self.wall
+        stats.cpu += time.process_time() - self.cpu
+        stats.calls += 1
+        if stats.name == profile.profile_stage:
+            profile.profiler.disable()
+        profile.running.pop()
+        if profile.trace_memory:
+            peak = max(self.child_peak, tracemalloc.get_traced_memory()[1])
+            stats.peak_memory = peak if stats.peak_memory is None else max(stats.peak_memory, peak)
+            if profile.running:
+                parent = profile.running[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+        if exc_type is not None:
+            profile.counters['errors'] = profile.counters.get('errors', 0) + 1
+        return False
+
+class NullStage:
+    """Stand-in for a stage while instrumentation is off"""
+
+    __slots__ = ()
+
+    def add_records(self, count):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_STAGE = NullStage()
+
+class Profile:
+    """Stage totals and counters of the current run"""
+
+    def __init__(self, trace_memory=False, profile_stage=None):
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profiler = cProfile.Profile() if profile_stage else None
+        self.stages = {}
+        self.running = []
+        self.counters = {}
+        # Files loaded from a cache entry saved without its counters
+        self.uncounted = []
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    def stage(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name, len(self.running))
+        return Stage(self, stats)
+
+# The profile of the current run, None while instrumentation is off
+_profile = None
+
+def start(trace_memory=False, profile_stage=None):
+    """
+    Start recording stages and counters
+
+    Args:
+        trace_memory (bool): Trace memory allocations to find each stage's peak,
+            which slows the run down
+        profile_stage (str): Name of a stage to run under cProfile, or None
+    """
+    global _profile
+    _profile = Profile(trace_memory, profile_stage)
+    if trace_memory:
+        tracemalloc.start()
+
+def is_enabled():
+    """Check if stages are being recorded"""
+    return _profile is not None
+
+def stage(name):
+    """
+    Return a context manager timing a stage
+
+    The same name may be entered many times, such as once per file, and
+    its totals are added up.  A stage entered inside another is shown
+    indented under it.
+
+    Args:
+        name (str): Name of the stage
+
+    Returns:
+        Stage: Context manager whose add_records() counts the records handled
+    """
+    if _profile is None:
+        return NULL_STAGE
+    return _profile.stage(name)
+
+def count(name, amount=1):
+    """Add to a counter such as invalid grids or malformed lines"""
+    if _profile is None:
+        return
+    _profile.counters[name] = _profile.counters.get(name, 0) + amount
+
+def counters():
+    """Return a copy of the counters, or None if not started"""
+    if _profile is None:
+        return None
+    return dict(_profile.counters)
+
+def add_counters(counters):
+    """Add counters taken elsewhere, such as in a worker process or from a cache entry"""
+    if _profile is None or not counters:
+        return
+    for name, amount in counters.items():
+        count(name, amount)
+
+def uncounted_files():
+    """Return the files whose counters were not taken, or None if not started"""
+    if _profile is None:
+        return None
+    return list(_profile.uncounted)
+
+def count_unavailable(source):
+    """Note that the counters of a file were not taken, so the totals leave it out"""
+    if _profile is None:
+        return
+    _profile.uncounted.append(source)
+
+def metrics():
+    """
+    Return the recorded stages and counters
+
+    Returns:
+        dict: Total wall and CPU time, the totals of each stage in the order
+        they were first entered and the counters, or None if not started
+    """
+    if _profile is None:
+        return None
+    return {
+        "wall_seconds": round(time.perf_counter() - _profile.wall, 6),
+        "cpu_seconds": round(time.process_time() - _profile.cpu, 6),
+        "memory_traced": _profile.trace_memory,
+        "stages": {name: stats.to_dict() for name, stats in _profile.stages.items()},
+        "counters": dict(_profile.counters),
+        "uncounted_files": list(_profile.uncounted),
+    }
+
+def summary():
+    """Return the recorded stages and counters as a table for the console"""
+    if _profile is None:
+        return ""
+    data = metrics()
+    lines = [f"{'stage':<24}{'calls':>6}{'wall s':>10}{'cpu s':>10}{'records':>10}{'records/s':>12}{'peak MB':>10}"]
+    for name, stats in _profile.stages.items():
+        totals = data["stages"][name]
+        rate = f"{totals['records_per_second']:.0f}" if totals['records'] and totals['records_per_second'] else "-"
+        peak = f"{totals['peak_memory_mb']:.1f}" if totals['peak_memory_mb'] is not None else "-"
+        label = "  " * stats.depth + name
+        lines.append(f"{label:<24}{totals['calls']:>6}{totals['wall_seconds']:>10.3f}{totals['cpu_seconds']:>10.3f}"
+                     f"{totals['records'] or '-':>10}{rate:>12}{peak:>10}")
+    lines.append(f"{'total':<24}{'':>6}{data['wall_seconds']:>10.3f}{data['cpu_seconds']:>10.3f}")
+    for name, value in data["counters"].items():
+        lines.append(f"{name}: {value}")
+    if data["uncounted_files"]:
+        lines.append(f"malformed lines and records: not available for {len(data['uncounted_files'])} files "
+                     f"loaded from cache, run with --rebuild-cache to count them")
+    return "\n".join(lines)
+
+def finish(metrics_file=None, profile_file=None):
+    """
+    Stop recording and report the results
+
+    Args:
+        metrics_file (str): Write the metrics to this JSON file, or print
+            the summary if None
+        profile_file (str): Save the cProfile statistics of the profiled stage here
+    """
+    global _profile
+    if _profile is None:
+        return
+    if metrics_file:
+        with open(metrics_file, 'w') as f:
+            json.dump(metrics(), f, indent=4)
+        print(f"Profile metrics written to {metrics_file}")
+    else:
+        print(summary())
+
+    if _profile.profiler is not None and profile_file:
+        if _profile.profile_stage in _profile.stages:
+            _profile.profiler.dump_stats(profile_file)
+            print(f"cProfile statistics of stage {_profile.profile_stage} written to {profile_file}")
+        else:
+            print(f"Warning: Stage {_profile.profile_stage} did not run, no cProfile statistics written")
+
+    if _profile.trace_memory:
+        tracemalloc.stop()
+    _profile = None
@@ -0,0 +1,326 @@
+# log_store.py
+"""
+Module for keeping spots and contacts in an indexed SQLite database
+
+`main.py ingest` parses log files once and stores their records, and
+`main.py map` draws maps from the database.  The date, band, mode, call and
+grid filters become indexed queries, so making a map costs time in
+proportion to the records it shows rather than to the size of the archive.
+
+Records are inserted in large batches, one transaction per file.  Each
+record has a natural key, so ingesting a file again, or overlapping files
+from several stations, stores every spot and contact once: a repeated spot
+keeps the best SNR and a repeated contact the first instance.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date
+from grid_converter import grid_to_coordinates
+from filters import normalize_band, split_list
+from band_plan import adif_band
+from records import Spot, Contact
+from batch_ingest import merge_by_time
+
+# Rows handed to executemany at a time
+INSERT_BATCH = 10000
+
+# Page cache of the connection in KiB, large enough to keep the indexes being filled in memory
+CACHE_KIB = 256 * 1024
+
+# Days from 0001-01-01 to the Unix epoch
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+
+# Text columns compared without case, so their indexes also serve case-insensitive queries
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spots (
+    id INTEGER PRIMARY KEY,
+    time INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    hhmm TEXT NOT NULL,
+    band TEXT COLLATE NOCASE,
+    frequency REAL,
+    snr REAL,
+    drift REAL,
+    call TEXT COLLATE NOCASE NOT NULL,
+    grid TEXT COLLATE NOCASE,
+    latitude REAL,
+    longitude REAL,
+    power INTEGER,
+    reporter TEXT COLLATE NOCASE NOT NULL,
+    reporter_grid TEXT,
+    distance INTEGER,
+    azimuth INTEGER,
+    source TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS spots_key ON spots (time, call, reporter, band);
+CREATE INDEX IF NOT EXISTS spots_band ON spots (band, time);
+CREATE INDEX IF NOT EXISTS spots_call ON spots (call, time);
+CREATE INDEX IF NOT EXISTS spots_grid ON spots (grid);
+CREATE INDEX IF NOT EXISTS spots_position ON spots (latitude, longitude);
+
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    time INTEGER NOT NULL,
+    qso_date TEXT NOT NULL,
+    time_on TEXT NOT NULL,
+    call TEXT COLLATE NOCASE NOT NULL,
+    name TEXT,
+    band TEXT COLLATE NOCASE,
+    mode TEXT COLLATE NOCASE,
+    submode TEXT COLLATE NOCASE,
+    freq REAL,
+    grid TEXT COLLATE NOCASE,
+    my_grid TEXT,
+    latitude REAL,
+    longitude REAL,
+    extra TEXT,
+    source TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS contacts_key ON contacts (call, time, band, mode);
+CREATE INDEX IF NOT EXISTS contacts_time ON contacts (time);
+CREATE INDEX IF NOT EXISTS contacts_band ON contacts (band, time);
+CREATE INDEX IF NOT EXISTS contacts_grid ON contacts (grid);
+CREATE INDEX IF NOT EXISTS contacts_position ON contacts (latitude, longitude);
+"""
+
+SPOT_COLUMNS = ('time', 'date', 'hhmm', 'band', 'frequency', 'snr', 'drift', 'call', 'grid', 'latitude',
+                'longitude', 'power', 'reporter', 'reporter_grid', 'distance', 'azimuth', 'source')
+
+CONTACT_COLUMNS = ('time', 'qso_date', 'time_on', 'call', 'name', 'band', 'mode', 'submode', 'freq', 'grid',
+                   'my_grid', 'latitude', 'longitude', 'extra', 'source')
+
+# A repeated spot replaces the stored one only when it was heard with a better SNR
+INSERT_SPOT = (f"INSERT INTO spots ({', '.join(SPOT_COLUMNS)}) VALUES ({', '.join('?' * len(SPOT_COLUMNS))}) "
+               "ON CONFLICT (time, call, reporter, band) DO UPDATE SET "
+               + ", ".join(f"{column} = excluded.{column}" for column in SPOT_COLUMNS[4:])
+               + " WHERE excluded.snr > spots.snr")
+
+INSERT_CONTACT = (f"INSERT OR IGNORE INTO contacts ({', '.join(CONTACT_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(CONTACT_COLUMNS))})")
+
+_day_seconds = {}
+
+def utc_seconds(qso_date, time_on):
+    """
+    Return the Unix time of a date and time
+
+    Args:
+        qso_date (str): Date as YYYYMMDD
+        time_on (str): Time as HHMM or HHMMSS
+
+    Returns:
+        int: Seconds since 1970-01-01 UTC, or None if the date or time is not valid
+    """
+    day = _day_seconds.get(qso_date)
+    if day is None:
+        try:
+            day = (date(int(qso_date[:4]), int(qso_date[4:6]), int(qso_date[6:8])).toordinal() - EPOCH_DAY) * 86400
+        except ValueError:
+            return None
+        _day_seconds[qso_date] = day
+    try:
+        return day + int(time_on[:2]) * 3600 + int(time_on[2:4]) * 60 + int(time_on[4:6] or 0)
+    except ValueError:
+        return None
+
+def connect(database):
+    """
+    Open the log store, creating its tables and indexes if needed
+
+    Args:
+        database (str): Path to the SQLite file
+
+    Returns:
+        sqlite3.Connection: The open database
+    """
+    directory = os.path.dirname(database)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(database)
+    # The store can be rebuilt from the logs, so bulk loads trade durability for speed
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(f"PRAGMA cache_size = -{CACHE_KIB}")
+    connection.executescript(SCHEMA)
+    return connection
+
+def optional_float(value):
+    """Convert a value to float, None when it is missing or not a number"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def spot_row(spot, source):
+    """Return the spots table row of a Spot, or None if its date is not valid"""
+    time = utc_seconds(spot.qso_date, spot.time)
+    if time is None:
+        return None
+    power = spot.tx_power
+    return (time, spot.date, spot.time, spot.band, spot.frequency, spot.snr, spot.drift, spot.tx_call,
+            spot.tx_grid or None, optional_float(spot.tx_lat), optional_float(spot.tx_long),
+            int(power) if str(power).isdigit() else None, spot.rx_call, spot.rx_grid or None,
+            spot.distance, spot.azimuth, source)
+
+def contact_row(contact, source):
+    """Return the contacts table row of a Contact, or None if it has no valid date"""
+    qso_date = contact.get('QSO_DATE', '')
+    time_on = contact.get('TIME_ON', '')
+    time = utc_seconds(qso_date, time_on)
+    if time is None:
+        return None
+
+    grid = contact.get('GRIDSQUARE', '').strip()
+    latitude = longitude = None
+    if grid:
+        latitude, longitude = grid_to_coordinates(grid)
+    extra = getattr(contact, 'extra', None)
+    # Band and mode are part of the natural key, where NULLs would never match, so missing ones are ''
+    return (time, qso_date, time_on, contact['CALL'], contact.get('NAME'), adif_band(contact).lower(),
+            contact.get('MODE', ''), contact.get('SUBMODE'), optional_float(contact.get('FREQ')), grid or None,
+            contact.get('MY_GRIDSQUARE'), latitude, longitude, json.dumps(extra) if extra else None, source)
+
+def ingest_records(connection, records, is_wspr, source):
+    """
+    Store records in one transaction, skipping those already stored
+
+    Args:
+        connection (sqlite3.Connection): The log store
+        records: Iterable of Spot or Contact records
+        is_wspr (bool): True for spots, False for contacts
+        source (str): Name of the file the records came from
+
+    Returns:
+        tuple: (records read, records added, records skipped for an invalid date)
+    """
+    table, statement, to_row = ('spots', INSERT_SPOT, spot_row) if is_wspr else ('contacts', INSERT_CONTACT, contact_row)
+    # New rows get ids above the largest one, so the count of added rows is cheap to find
+    last_id = connection.execute(f"SELECT coalesce(max(id), 0) FROM {table}").fetchone()[0]
+    read = skipped = 0
+    batch = []
+    with connection:
+        for record in records:
+            read += 1
+            row = to_row(record, source)
+            if row is None:
+                skipped += 1
+                continue
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH:
+                connection.executemany(statement, batch)
+                batch = []
+        if batch:
+            connection.executemany(statement, batch)
+    added = connection.execute(f"SELECT coalesce(max(id), 0) FROM {table}").fetchone()[0] - last_id
+    return read, added, skipped
+
+def query_conditions(settings, grid=None, contacts=False):
+    """
+    Build the WHERE clause of the date, band, mode, call and grid filters
+
+    Args:
+        settings (Settings): Settings holding start_date, end_date, band, mode and call
+        grid (str): Grid square prefix such as EM or EM73, or None
+        contacts (bool): True for the contacts table, whose mode filter also matches SUBMODE
+
+    Returns:
+        tuple: (SQL condition, parameters), or (None, None) if no record can match
+    """
+    conditions = ["latitude IS NOT NULL"]
+    parameters = []
+    if settings.start_date:
+        conditions.append("time >= ?")
+        parameters.append((settings.start_date.toordinal() - EPOCH_DAY) * 86400)
+    if settings.end_date:
+        conditions.append("time < ?")
+        parameters.append((settings.end_date.toordinal() + 1 - EPOCH_DAY) * 86400)
+
+    bands = split_list(settings.band)
+    if bands:
+        conditions.append(f"band IN ({', '.join('?' * len(bands))})")
+        parameters += [normalize_band(band) for band in bands]
+
+    modes = split_list(settings.mode)
+    if modes:
+        if not contacts:
+            # Every spot is WSPR
+            if 'WSPR' not in (mode.upper() for mode in modes):
+                return None, None
+        else:
+            marks = ', '.join('?' * len(modes))
+            conditions.append(f"(mode IN ({marks}) OR submode IN ({marks}))")
+            parameters += modes + modes
+
+    calls = split_list(settings.call)
+    if calls:
+        # Call signs hold no % or _, so the wildcards translate directly to LIKE
+        conditions.append("(" + " OR ".join("call LIKE ?" for _ in calls) + ")")
+        parameters += [call.replace('*', '%').replace('?', '_') for call in calls]
+
+    if grid:
+        conditions.append("grid LIKE ?")
+        parameters.append(grid.strip() + '%')
+
+    return " AND ".join(conditions), parameters
+
+def row_spot(row):
+    """Rebuild a Spot from a spots table row"""
+    (_, spot_date, hhmm, _, frequency, snr, drift, call, grid, latitude, longitude, power, reporter,
+     reporter_grid, distance, azimuth, source) = row
+    spot = Spot(spot_date, hhmm, snr, drift, frequency, call, grid or '', latitude, longitude,
+                '' if power is None else str(power), reporter, reporter_grid or '', distance, azimuth)
+    if source:
+        spot.source = source
+    return spot
+
+def row_contact(row):
+    """Rebuild a Contact from a contacts table row, leaving out the fields that were missing"""
+    (_, qso_date, time_on, call, name, band, mode, submode, freq, grid, my_grid, latitude, longitude,
+     extra, source) = row
+    contact = Contact(json.loads(extra) if extra else None)
+    for field, value in (('CALL', call), ('QSO_DATE', qso_date), ('TIME_ON', time_on), ('NAME', name),
+                         ('BAND', band), ('MODE', mode), ('SUBMODE', submode), ('GRIDSQUARE', grid),
+                         ('MY_GRIDSQUARE', my_grid), ('LATITUDE', latitude), ('LONGITUDE', longitude),
+                         ('SOURCE', source)):
+        if value is not None and value != '':
+            contact[field] = value
+    if freq is not None:
+        contact['FREQ'] = str(freq)
+    return contact
+
+def query_records(connection, settings, grid=None):
+    """
+    Yield the stored spots and contacts that pass the filters, in time order
+
+    Only records with coordinates are returned.  The rows are read from the
+    cursor as they are needed, so no copy of the result set is built here.
+
+    Args:
+        connection (sqlite3.Connection): The log store
+        settings (Settings): Settings holding start_date, end_date, band, mode and call
+        grid (str): Grid square prefix such as EM or EM73, or None
+
+    Returns:
+        iterator: Spot and Contact records
+    """
+    streams = []
+    for table, columns, to_record in (('contacts', CONTACT_COLUMNS, row_contact), ('spots', SPOT_COLUMNS, row_spot)):
+        where, parameters = query_conditions(settings, grid, contacts=(table == 'contacts'))
+        if where is None:
+            continue
+        cursor = connection.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {where} ORDER BY time",
+                                    parameters)
+        streams.append(map(to_record, cursor))
+    return merge_by_time(streams)
+
+def store_summary(connection):
+    """
+    Describe what the store holds
+
+    Returns:
+        dict: 'spots' and 'contacts' to (count, first Unix time, last Unix time)
+    """
+    return {table: connection.execute(f"SELECT count(*), min(time), max(time) FROM {table}").fetchone()
+            for table in ('spots', 'contacts')}
@@ -8,18 +8,62 @@ import datetime
 
 import sys
 import os
-from adif_parser import parse_adif_file
-from wspr_parser import parse_wspr_file
-from grid_converter import grid_to_coordinates
-from maps_interface import create_map
+from functools import partial
+from adif_parser import parse_adif_file, iter_adif_file
+from wspr_parser import parse_wspr_file, iter_wspr_file
+from incremental import parse_incremental
+from parse_cache import load_or_parse
+from parallel_parser import parse_adif_file_parallel, parse_wspr_file_parallel, parse_wsprnet_file_parallel
+from wsprnet_csv import parse_wsprnet_file, iter_wsprnet_records
+from wspr_columnar import load_wspr_columns, concat_columns, WsprColumns
+from grid_converter import grid_to_coordinates, invalid_grid_count
+from maps_interface import create_map, operator_location
+from static_renderer import render_static_map
 from settings import Settings
+from filters import record_filter_for
+from heatmap import parse_hours
+from stats import compute_stats, write_stats
+from dedup import dedup_records, RecentRecords
+from geodesy import add_paths, filter_min_km, iter_with_paths
+from batch_ingest import expand_paths, merge_by_time, parse_files, source_tag, tag_records
+import instrumentation
+from log_store import connect, ingest_records, query_records, store_summary
+from map_server import log_tails, serve_map
+
+# Commands working on the SQLite log store
+STORE_COMMANDS = ('ingest', 'map')
 
 def main():
     """Main entry point for the application"""
 
-    parser = argparse.ArgumentParser()
-    args = parse_args(parser)
-    
+    # The ingest and map commands work on the log store, anything else is the original command line
+    if len(sys.argv) > 1 and sys.argv[1] in STORE_COMMANDS:
+        args = parse_store_args(sys.argv[1], sys.argv[2:])
+        command = do_ingest if args.command == 'ingest' else do_store_map
+    else:
+        parser = argparse.ArgumentParser(epilog="commands: 'main.py ingest -h' and 'main.py map -h' for the SQLite log store")
+        args = parse_args(parser)
+        command = run
+
+    # Time each stage of the run when asked to, otherwise the stages cost nothing
+    profiling = args.profile is not None or args.profile_memory or args.profile_stage
+    if profiling:
+        instrumentation.start(args.profile_memory, args.profile_stage)
+    try:
+        command(args)
+    finally:
+        if profiling:
+            instrumentation.count('invalid_grids', invalid_grid_count())
+            profile_file = f"profile_{args.profile_stage}.prof" if args.profile_stage else None
+            instrumentation.finish(args.profile or None, profile_file)
+
+def run(args):
+    """
+    Make the map or the statistics report asked for on the command line
+
+    Args:
+        args (Namespace): The parsed command line arguments
+    """
     settings = Settings()
     
     if args.start:
@@ -28,17 +72,78 @@ def main():
     if args.end:
         settings.end_date = args.end
 
-    is_wspr = False
-    
-    # Check if adif file is provided as argument
-    if args.adi:
-        contacts = do_adi_processing(args, settings)
+    settings.band = args.band
+    settings.mode = args.mode
+    settings.call = args.call
+
+    settings.heatmap = args.heatmap
+    settings.heatmap_hours = args.heatmap_hours
+
+    # Build the filter once and let the parsers apply it to the raw records
+    settings.record_filter = record_filter_for(settings)
+
+    if args.columnar and args.wspr and (args.adi or args.wsprnet_csv):
+        print("Error: --columnar WSPR spots cannot be combined with ADIF or wsprnet.org files")
+        return
+
+    if args.serve is not None and (args.stats or args.columnar or args.render == 'static'):
+        print("Error: --serve cannot be combined with --stats, --columnar or --render static")
+        return
+
+    # Write a statistics report in one streaming pass instead of a map
+    if args.stats:
+        do_stats_processing(args, settings)
+        return
 
-    if args.wspr:
-        is_wspr = True
-        contacts = do_wspr_processing(args, settings)
+    is_wspr = bool(args.wspr or args.wsprnet_csv)
+
+    # Served logs are followed from where they end now, before they are read
+    tails = None
+    recent = None
+    if args.serve is not None:
+        tails = []
+        for kind, patterns in (('adif', args.adi), ('wspr', args.wspr)):
+            if patterns:
+                paths = expand_paths(patterns)
+                tails += log_tails(paths, kind, len(paths) > 1)
+        # Records appended later are checked against the same window as those read now
+        if args.dedup:
+            recent = RecentRecords(settings.DEDUP_WINDOW_MINUTES)
+
+    # Read every ADIF and WSPR file, each kind merged in time order
+    record_sets = []
+    for kind, patterns in (('adif', args.adi), ('wspr', args.wspr), ('wsprnet', args.wsprnet_csv)):
+        if not patterns:
+            continue
+        with instrumentation.stage(f"read_{kind}") as timed:
+            records = do_files_processing(patterns, kind, args, settings)
+            if records:
+                timed.add_records(len(records))
+
+        # Drop repeated decodes and logged contacts before counting and mapping them
+        if args.dedup and records:
+            found = len(records)
+            with instrumentation.stage('dedup') as timed:
+                records = dedup_records(records, kind != 'adif', settings.DEDUP_WINDOW_MINUTES)
+                timed.add_records(found)
+            print(f"Removed {found - len(records)} duplicates")
+            if recent is not None:
+                recent.filter(records)
+
+        if records:
+            record_sets.append(records)
+
+    # Contacts and spots given together are merged into one time ordered list
+    if len(record_sets) > 1:
+        contacts = list(merge_by_time(record_sets))
+    else:
+        contacts = record_sets[0] if record_sets else None
     
-    if not contacts:
+    if not contacts and tails:
+        # A served map starts empty and fills as records are appended to the logs
+        print("No contacts found yet, waiting for new records")
+        contacts = []
+    elif not contacts:
         if is_wspr :
             print("No contacts found in the WSPR file.")
         else :
@@ -46,70 +151,157 @@ def main():
         return
     
     print(f"Found {len(contacts)} contacts")
-    
-    # Find operator's grid square if not already in contacts
-    operator_grid = settings.OPERATOR_GRIDSQUARE
-    
-    # If operator grid is not in settings, look for it in contacts
-    if not operator_grid:
-        for contact in contacts:
-            if 'MY_GRIDSQUARE' in contact and contact['MY_GRIDSQUARE'].strip():
-                operator_grid = contact['MY_GRIDSQUARE'].strip()
-                break
+    make_map(contacts, is_wspr, args, settings, tails, recent)
+
+def make_map(contacts, is_wspr, args, settings : Settings, tails=None, recent=None):
+    """
+    Locate the contacts and draw them on a Google map page or a static image
+
+    Args:
+        contacts (list): List of contacts or spots, or WsprColumns
+        is_wspr (bool): True if the records are WSPR spots
+        args (Namespace): Command line arguments holding min_km, render and image_format
+        settings (Settings): Settings for the map
+        tails (list): LogTail of each log to follow when the map is served, or None
+        recent (RecentRecords): With --dedup, the window new records of a
+            served map are checked against, or None
+    """
+    # Find operator's grid square in the settings or else in the contacts
+    operator_grid, _, _ = operator_location(contacts, settings)
     
     if operator_grid:
         print(f"Using operator grid square: {operator_grid}")
     else:
         print("Warning: Operator grid square not found. Paths between contacts will not be displayed.")
+
+    # Without an operator grid no contact has a distance, and --min-km would drop them all
+    min_km = args.min_km
+    if min_km is not None and not operator_grid:
+        print("Warning: --min-km is ignored, distances need the operator grid square (OPERATOR_GRIDSQUARE).")
+        min_km = None
+
+    # Distance and bearing of every contact from the operator, computed once per pair of grids
+    with instrumentation.stage('paths') as timed:
+        timed.add_records(len(contacts))
+        contacts = add_paths(contacts, operator_grid)
+        if min_km is not None:
+            found = len(contacts)
+            contacts = filter_min_km(contacts, min_km)
+    if min_km is not None:
+        print(f"Kept {len(contacts)} of {found} contacts at least {min_km:g} km away")
     
     # Convert grid squares to coordinates for all contacts
-    valid_contacts = []
+    with instrumentation.stage('grid_conversion') as timed:
+        timed.add_records(len(contacts))
+        valid_contacts = locate_contacts(contacts, is_wspr)
     
-    for contact in contacts:
-        if args.wspr and contact['GRIDSQUARE'] and contact['LATITUDE'] and contact['LONGITUDE'] :
-            valid_contacts.append(contact)
-            continue
-
-        # Copy the contact to avoid modifying the original
-        processed_contact = contact.copy()
-        
-        # Convert contact's grid square
-        if 'GRIDSQUARE' in processed_contact and processed_contact['GRIDSQUARE'].strip():
-            grid = processed_contact['GRIDSQUARE'].strip()
-            lat, lon = grid_to_coordinates(grid)
-            if lat is not None and lon is not None:
-                processed_contact['LATITUDE'] = lat
-                processed_contact['LONGITUDE'] = lon
-                valid_contacts.append(processed_contact)
-            else:
-                print(f"Warning: Invalid grid square '{grid}' for contact {processed_contact.get('CALL', 'Unknown')}")
-        else:
-            print(f"Warning: No grid square found for contact {processed_contact.get('CALL', 'Unknown')}")
-    
-    if not valid_contacts:
+    if not valid_contacts and tails is None:
         print("Error: No contacts with valid grid squares found.")
         return
     
-    # Make sure operator grid is also included
-    if operator_grid:
-        for contact in valid_contacts:
-            contact['MY_GRIDSQUARE'] = operator_grid
-    
     print(f"Successfully processed {len(valid_contacts)} contacts with valid coordinates")
     
+    # Render a static image without Google Maps if asked to
+    if args.render == 'static':
+        with instrumentation.stage('render') as timed:
+            timed.add_records(len(valid_contacts))
+            image_file = render_static_map(valid_contacts, settings, args.image_format)
+        print(f"Map image created: {image_file}")
+        return
+
+    # Serve the map and push the records appended to the logs
+    if tails is not None:
+        locate = partial(locate_new_records, operator_grid=operator_grid, min_km=min_km, is_wspr=is_wspr,
+                         recent=recent)
+        serve_map(valid_contacts, settings, tails, locate, args.serve)
+        return
+
     # Create and display the map
-    html_file = create_map(valid_contacts, settings)
+    with instrumentation.stage('render') as timed:
+        timed.add_records(len(valid_contacts))
+        html_file = create_map(valid_contacts, settings)
     
     print(f"Map created: {html_file}")
     print(f"Open {html_file} in your web browser to view your contacts")
 
+def locate_contacts(contacts, is_wspr):
+    """
+    Give the contacts their coordinates from their grid squares
+
+    Args:
+        contacts (list): List of contacts or spots, or WsprColumns
+        is_wspr (bool): True if the records are WSPR spots, which already carry coordinates
+
+    Returns:
+        list: The contacts with valid coordinates, or WsprColumns
+    """
+    # Columnar spots already carry coordinates for every grid
+    if isinstance(contacts, WsprColumns):
+        return contacts.with_coordinates()
+
+    valid_contacts = []
+    for contact in contacts:
+        if is_wspr and contact.get('GRIDSQUARE') and contact.get('LATITUDE') and contact.get('LONGITUDE') :
+            valid_contacts.append(contact)
+            continue
+
+        # Convert contact's grid square, records are set in place instead of copied
+        if 'GRIDSQUARE' in contact and contact['GRIDSQUARE'].strip():
+            grid = contact['GRIDSQUARE'].strip()
+            lat, lon = grid_to_coordinates(grid)
+            if lat is not None and lon is not None:
+                contact['LATITUDE'] = lat
+                contact['LONGITUDE'] = lon
+                valid_contacts.append(contact)
+            else:
+                print(f"Warning: Invalid grid square '{grid}' for contact {contact.get('CALL', 'Unknown')}")
+        else:
+            instrumentation.count('missing_grids')
+            print(f"Warning: No grid square found for contact {contact.get('CALL', 'Unknown')}")
+
+    return valid_contacts
+
+def locate_new_records(records, operator_grid, min_km, is_wspr, recent=None):
+    """
+    Give records appended to a served log their paths and coordinates, as make_map did for the others
+
+    With recent, duplicates of records seen within the --dedup window are dropped first.
+    min_km is only applied with an operator grid, as in make_map.
+    """
+    if recent is not None:
+        found = len(records)
+        records = recent.filter(records)
+        if found > len(records):
+            print(f"Removed {found - len(records)} duplicates")
+    records = add_paths(records, operator_grid)
+    if min_km is not None and operator_grid:
+        records = filter_min_km(records, min_km)
+    return locate_contacts(records, is_wspr)
+
 def parse_args(parser) :
     try:
-        parser.add_argument("--adi", help="the ADI file name and location")
-        parser.add_argument("--wspr", help="the WSPR text file name and location")
-        parser.add_argument("--start", type=lambda d: datetime.datetime.strptime(d, '%Y-%m-%d').date(), help="the start date Y-M-D")
-        parser.add_argument("--end", type=lambda d: datetime.datetime.strptime(d, '%Y-%m-%d').date(), help="the end date Y-M-D")
-        # parser.add_argument("--band", help="the band: all, 10,12,15,20,30...")
+        parser.add_argument("--adi", nargs="+", help="the ADI file name(s) and location(s), globs allowed: logs/*.adi")
+        parser.add_argument("--wspr", nargs="+", help="the WSPR text file name(s) and location(s), globs allowed: logs/ALL_WSPR*.TXT")
+        parser.add_argument("--wsprnet-csv", nargs="+", help="the wsprnet.org wsprspots-YYYY-MM.csv archive(s), globs allowed")
+        parser.add_argument("--start", type=parse_date, help="the start date Y-M-D")
+        parser.add_argument("--end", type=parse_date, help="the end date Y-M-D")
+        parser.add_argument("--band", help="the band(s): all, 10,12,15,20,30... (comma separated)")
+        parser.add_argument("--mode", help="the mode(s): FT8,FT4,WSPR... (comma separated)")
+        parser.add_argument("--call", help="the callsign pattern(s), * and ? allowed: K1*,W?AB (comma separated)")
+        parser.add_argument("--columnar", action="store_true", help="load the WSPR file into NumPy columns instead of one dictionary per spot")
+        parser.add_argument("--workers", type=int, default=1, help="the number of processes used to parse the files")
+        parser.add_argument("--incremental", action="store_true", help="only parse what was appended to the file since the last run")
+        parser.add_argument("--no-cache", action="store_true", help="always parse the file instead of using the parse cache")
+        parser.add_argument("--rebuild-cache", action="store_true", help="parse the file again and replace its parse cache entry")
+        parser.add_argument("--render", choices=["google", "static"], default="google", help="draw a Google map page or an offline static image")
+        parser.add_argument("--image-format", choices=["png", "svg"], default="png", help="the image format used by --render static")
+        parser.add_argument("--heatmap", choices=["count", "mean", "best"], help="add a heatmap of the spots weighted by count, mean SNR or best SNR")
+        parser.add_argument("--heatmap-hours", type=parse_hours, help="the UTC hours in the heatmap: 6-12,22-2 (comma separated)")
+        parser.add_argument("--min-km", type=float, help="only map contacts at least this many km from the operator")
+        parser.add_argument("--dedup", action="store_true", help="remove duplicate spots and contacts, keeping the best SNR of each spot")
+        parser.add_argument("--serve", nargs="?", type=int, const=8000, metavar="PORT", help="serve the map on http://127.0.0.1:PORT (8000) and add the records appended to the logs as they arrive")
+        parser.add_argument("--stats", metavar="REPORT", help="write band, hour, grid and callsign statistics to a .json or .csv file instead of a map")
+        add_profile_arguments(parser)
         args = parser.parse_args(args=None if sys.argv[1:] else ['--help'])
         return args
         
@@ -117,8 +309,149 @@ def parse_args(parser) :
         parser.print_help
         sys.exit(0)
 
-def do_adi_processing(args, settings : Settings) :
-    adif_file = args.adi
+def parse_date(text):
+    """Read a Y-M-D date from the command line"""
+    return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", nargs="?", const="", metavar="METRICS", help="time each stage of the run and print a summary, or write it to a JSON file")
+    parser.add_argument("--profile-memory", action="store_true", help="also trace the peak memory of each stage, which slows the run down")
+    parser.add_argument("--profile-stage", metavar="STAGE", help="run one stage under cProfile and save its statistics to profile_STAGE.prof")
+
+def parse_store_args(command, argv):
+    """
+    Parse the arguments of the ingest and map commands
+
+    Args:
+        command (str): 'ingest' or 'map'
+        argv (list): The arguments after the command
+
+    Returns:
+        Namespace: The parsed arguments, with the command in args.command
+    """
+    parser = argparse.ArgumentParser(prog=f"main.py {command}")
+    parser.add_argument("--db", help="the SQLite log store, LOG_DATABASE from the settings by default")
+    if command == 'ingest':
+        parser.description = "Parse log files into the SQLite log store, skipping records already stored"
+        parser.add_argument("--adi", nargs="+", help="the ADI file name(s) and location(s), globs allowed: logs/*.adi")
+        parser.add_argument("--wspr", nargs="+", help="the WSPR text file name(s) and location(s), globs allowed: logs/ALL_WSPR*.TXT")
+        parser.add_argument("--wsprnet-csv", nargs="+", help="the wsprnet.org wsprspots-YYYY-MM.csv archive(s), globs allowed")
+    else:
+        parser.description = "Map the records of the SQLite log store that pass the filters"
+        parser.add_argument("--start", type=parse_date, help="the start date Y-M-D")
+        parser.add_argument("--end", type=parse_date, help="the end date Y-M-D")
+        parser.add_argument("--band", help="the band(s): all, 10,12,15,20,30... (comma separated)")
+        parser.add_argument("--mode", help="the mode(s): FT8,FT4,WSPR... (comma separated)")
+        parser.add_argument("--call", help="the callsign pattern(s), * and ? allowed: K1*,W?AB (comma separated)")
+        parser.add_argument("--grid", help="the grid square prefix: EM or EM73")
+        parser.add_argument("--render", choices=["google", "static"], default="google", help="draw a Google map page or an offline static image")
+        parser.add_argument("--image-format", choices=["png", "svg"], default="png", help="the image format used by --render static")
+        parser.add_argument("--heatmap", choices=["count", "mean", "best"], help="add a heatmap of the spots weighted by count, mean SNR or best SNR")
+        parser.add_argument("--heatmap-hours", type=parse_hours, help="the UTC hours in the heatmap: 6-12,22-2 (comma separated)")
+        parser.add_argument("--min-km", type=float, help="only map contacts at least this many km from the operator")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    args.command = command
+    return args
+
+def do_ingest(args):
+    if not args.adi and not args.wspr and not args.wsprnet_csv:
+        print("Error: ingest needs an ADIF or WSPR file")
+        return
+
+    settings = Settings()
+    database = args.db or settings.LOG_DATABASE
+    connection = connect(database)
+    try:
+        for kind, patterns, iter_file in (('adif', args.adi, iter_adif_file), ('wspr', args.wspr, iter_wspr_file),
+                                          ('wsprnet', args.wsprnet_csv, iter_wsprnet_records)):
+            if not patterns:
+                continue
+            for log_file in expand_paths(patterns):
+                if not os.path.exists(log_file):
+                    print(f"Error: Log file not found: {log_file}")
+                    continue
+                print(f"Ingesting: {log_file}")
+
+                # The records are streamed from the parser into the database in batches
+                with instrumentation.stage(f"ingest_{kind}") as timed:
+                    read, added, skipped = ingest_records(connection, iter_file(log_file, settings),
+                                                          kind != 'adif', source_tag(log_file))
+                    timed.add_records(read)
+                print(f"Stored {added} new of {read} records")
+                if skipped:
+                    print(f"Warning: Skipped {skipped} records without a valid date and time")
+
+        for table, (count, first, last) in store_summary(connection).items():
+            if count:
+                first_day = datetime.datetime.fromtimestamp(first, datetime.timezone.utc).date()
+                last_day = datetime.datetime.fromtimestamp(last, datetime.timezone.utc).date()
+                print(f"{database} holds {count} {table} from {first_day} to {last_day}")
+    finally:
+        connection.close()
+
+def do_store_map(args):
+    settings = Settings()
+    settings.start_date = args.start
+    settings.end_date = args.end
+    settings.band = args.band
+    settings.mode = args.mode
+    settings.call = args.call
+    settings.heatmap = args.heatmap
+    settings.heatmap_hours = args.heatmap_hours
+    settings.record_filter = record_filter_for(settings)
+
+    database = args.db or settings.LOG_DATABASE
+    if not os.path.exists(database):
+        print(f"Error: Log store not found: {database}, fill it with 'main.py ingest'")
+        return
+
+    connection = connect(database)
+    try:
+        # Only the matching rows are read, through the indexes
+        with instrumentation.stage('query') as timed:
+            contacts = list(query_records(connection, settings, args.grid))
+            timed.add_records(len(contacts))
+    finally:
+        connection.close()
+
+    if not contacts:
+        print(f"No contacts in {database} pass the filters.")
+        return
+
+    print(f"Found {len(contacts)} contacts")
+    # Stored records already carry their coordinates, like spots
+    make_map(contacts, True, args, settings)
+
+def do_files_processing(patterns, kind, args, settings : Settings) :
+    paths = expand_paths(patterns)
+    if kind == 'wspr' and args.columnar:
+        process = do_wspr_columnar_processing
+    elif kind == 'wspr':
+        process = do_wspr_processing
+    elif kind == 'wsprnet':
+        process = do_wsprnet_processing
+    else:
+        process = do_adi_processing
+
+    # Several files are parsed one per worker, a single file may be split between the workers
+    workers = args.workers if len(paths) == 1 else 1
+    results = parse_files(paths, partial(process, args=args, settings=settings, workers=workers), args.workers)
+    if len(paths) == 1:
+        return results[0]
+
+    parts = [(path, records) for path, records in zip(paths, results) if records]
+    if not parts:
+        return None
+
+    # Tag each record with its file and merge the files in time order
+    if kind == 'wspr' and args.columnar:
+        return concat_columns([records for _, records in parts], [source_tag(path) for path, _ in parts])
+    for path, records in parts:
+        tag_records(records, source_tag(path))
+    return list(merge_by_time(records for _, records in parts))
+
+def do_adi_processing(adif_file, args, settings : Settings, workers=1) :
     
     if not os.path.exists(adif_file):
         print(f"Error: ADIF file not found: {adif_file}")
@@ -127,21 +460,133 @@ def do_adi_processing(args, settings : Settings) :
     print(f"Processing ADIF file: {adif_file}")
     
     # Parse the ADIF file
-    contacts = parse_adif_file(adif_file, settings)
+    if workers > 1:
+        parse = lambda filename, settings: parse_adif_file_parallel(filename, settings, workers)
+    else:
+        parse = parse_adif_file
+
+    if args.incremental:
+        contacts = parse_incremental(adif_file, settings, 'adif')
+    elif args.no_cache:
+        contacts = parse(adif_file, settings)
+    else:
+        contacts = load_or_parse(adif_file, settings, 'adif', parse, rebuild=args.rebuild_cache)
     return contacts
 
-def do_wspr_processing(args, settings : Settings) :
-    wspr_file = args.wspr
+def do_wspr_processing(wspr_file, args, settings : Settings, workers=1) :
     
     if not os.path.exists(wspr_file):
         print(f"Error: WSPR file not found: {wspr_file}")
         return None
     
-    print(f"Processing ADIF file: {wspr_file}")
+    print(f"Processing WSPR file: {wspr_file}")
     
     # Parse the WSPR file
-    contacts = parse_wspr_file(wspr_file, settings)
+    if workers > 1:
+        parse = lambda file_path, settings: parse_wspr_file_parallel(file_path, settings, workers)
+    else:
+        parse = parse_wspr_file
+
+    if args.incremental:
+        contacts = parse_incremental(wspr_file, settings, 'wspr')
+    elif args.no_cache:
+        contacts = parse(wspr_file, settings)
+    else:
+        contacts = load_or_parse(wspr_file, settings, 'wspr', parse, rebuild=args.rebuild_cache)
+    return contacts
+
+def do_wsprnet_processing(csv_file, args, settings : Settings, workers=1) :
+    if not os.path.exists(csv_file):
+        print(f"Error: wsprnet.org CSV file not found: {csv_file}")
+        return None
+
+    print(f"Processing wsprnet.org CSV file: {csv_file}")
+
+    # The monthly archives do not grow, so they are cached but never parsed incrementally
+    if workers > 1:
+        parse = lambda file_path, settings: parse_wsprnet_file_parallel(file_path, settings, workers)
+    else:
+        parse = parse_wsprnet_file
+
+    if args.no_cache:
+        contacts = parse(csv_file, settings)
+    else:
+        contacts = load_or_parse(csv_file, settings, 'wsprnet', parse, rebuild=args.rebuild_cache)
     return contacts
 
+def do_wspr_columnar_processing(wspr_file, args, settings : Settings, workers=1) :
+
+    if not os.path.exists(wspr_file):
+        print(f"Error: WSPR file not found: {wspr_file}")
+        return None
+
+    print(f"Processing WSPR file (columnar): {wspr_file}")
+
+    # Load the WSPR file into typed columns
+    try:
+        if args.no_cache:
+            contacts = load_wspr_columns(wspr_file, settings)
+        else:
+            contacts = load_or_parse(wspr_file, settings, 'wspr-columnar', load_wspr_columns, rebuild=args.rebuild_cache)
+    except ImportError as e:
+        print(f"Error: {e}")
+        return None
+    return contacts
+
+def do_stats_processing(args, settings : Settings) :
+    if not args.wspr and not args.adi and not args.wsprnet_csv:
+        print("Error: --stats needs an ADIF or WSPR file")
+        return
+
+    # Columns are already compact, other records are streamed so the report uses constant memory
+    if args.wspr and args.columnar:
+        with instrumentation.stage('read_wspr') as timed:
+            records = do_files_processing(args.wspr, 'wspr', args, settings)
+            if records is not None:
+                timed.add_records(len(records))
+        if records is None:
+            return
+        if args.dedup:
+            records = dedup_records(records, True, settings.DEDUP_WINDOW_MINUTES)
+    else:
+        kinds = []
+        for kind, patterns, iter_file in (('adif', args.adi, iter_adif_file), ('wspr', args.wspr, iter_wspr_file),
+                                          ('wsprnet', args.wsprnet_csv, iter_wsprnet_records)):
+            if not patterns:
+                continue
+            streams = []
+            for log_file in expand_paths(patterns):
+                if not os.path.exists(log_file):
+                    print(f"Error: Log file not found: {log_file}")
+                    continue
+                print(f"Computing statistics for: {log_file}")
+                streams.append(iter_file(log_file, settings))
+
+            # The files of one kind are merged in time order so duplicates between them are found
+            stream = merge_by_time(streams)
+            if args.dedup:
+                stream = dedup_records(stream, kind != 'adif', settings.DEDUP_WINDOW_MINUTES)
+            kinds.append(stream)
+        records = merge_by_time(kinds)
+
+    # Paths start at OPERATOR_GRIDSQUARE, or else at the MY_GRIDSQUARE of each contact
+    if isinstance(records, WsprColumns):
+        records = add_paths(records, settings.OPERATOR_GRIDSQUARE)
+    else:
+        records = iter_with_paths(records, settings.OPERATOR_GRIDSQUARE)
+    # Spots have no MY_GRIDSQUARE to fall back to, so without an operator grid none has a distance
+    if args.min_km is not None and not settings.OPERATOR_GRIDSQUARE and not args.adi:
+        print("Warning: --min-km is ignored, distances need the operator grid square (OPERATOR_GRIDSQUARE).")
+    elif args.min_km is not None:
+        records = filter_min_km(records, args.min_km)
+
+    # The records are streamed, so reading the files is timed as part of the statistics
+    with instrumentation.stage('stats') as timed:
+        stats = compute_stats(records)
+        timed.add_records(stats.total.count)
+    with instrumentation.stage('write_report'):
+        write_stats(stats, args.stats)
+    print(f"Statistics for {stats.total.count} records written to {args.stats}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,419 @@
+# map_server.py
+"""
+Module for serving the map page locally and pushing new records to it
+
+With --serve the map is not written to a new HTML file each run.  A small
+asyncio HTTP server hands out the page, tails the log files, and sends
+each batch of appended records to every open page over Server-Sent Events.
+An update carries only the aggregated groups the new records changed, so
+the work per update grows with the new records and not with the size of
+the log.
+
+The page itself holds no contacts.  It asks for the groups of the
+Maidenhead tiles that come into view, reads the number of groups and
+contacts in view from the server's spatial index, and fetches the
+contacts of a group when it is clicked.
+"""
+
+import asyncio
+import io
+import json
+import math
+import os
+import webbrowser
+from collections import defaultdict, deque
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+from adif_parser import parse_adif_range
+from wspr_parser import parse_wspr_range
+from file_ranges import complete_end
+from compression import is_compressed
+from batch_ingest import source_tag, tag_records
+from aggregation import LEVELS, LevelAggregator
+from spatial_index import ViewportIndex
+from maps_interface import group_contacts, group_entry, location_key, pack_contacts, to_json, write_map_page
+import instrumentation
+
+# Address the server listens on, only this computer can open the map
+HOST = "127.0.0.1"
+
+# Updates kept for pages that reconnect, a page that missed older ones reloads
+MAX_UPDATES = 1000
+
+# Seconds between comments that keep an idle event stream open
+KEEPALIVE_SECONDS = 15
+
+# Contacts of a group sent when it is clicked, the page shows how many more there are
+GROUP_CONTACTS = 100
+
+# Tiles a page may ask for at once
+MAX_TILES = 1000
+
+class BadRequest(ValueError):
+    """A request with missing or invalid parameters"""
+
+class LiveMap:
+    """The contacts on the map, their locations and groups, and the updates sent so far"""
+
+    def __init__(self, contacts, settings):
+        self.settings = settings
+        self.contacts = list(contacts)
+        self.grouped = group_contacts(self.contacts)
+        self.location_indexes = {key: index for index, key in enumerate(self.grouped)}
+        self.locations = list(self.grouped.values())
+        self.aggregator = LevelAggregator()
+        for index, (key, location_contacts) in enumerate(self.grouped.items()):
+            self.aggregator.add(index, key, location_contacts)
+        self.index = ViewportIndex()
+        for level, groups in self.aggregator.levels().items():
+            for position, group in enumerate(groups):
+                self.index.update(level, position, group)
+        self.version = 0
+        self.updates = deque(maxlen=MAX_UPDATES)
+        self.page = None
+        self.page_version = None
+
+    def page_html(self):
+        """Return the map page as it is now, written again only after the map changed"""
+        if self.page_version != self.version:
+            with instrumentation.stage('html') as timed:
+                timed.add_records(len(self.contacts))
+                page = io.StringIO()
+                write_map_page(page, self.contacts, self.settings, {}, {},
+                               live={"version": self.version, "bounds": self.index.bounds})
+                self.page = page.getvalue().encode('utf-8')
+                self.page_version = self.version
+        return self.page
+
+    def add_contacts(self, contacts):
+        """
+        Add contacts that carry their coordinates to the map
+
+        Args:
+            contacts (list): The new contacts
+
+        Returns:
+            str: The update for the pages as JSON, or None if there was nothing to add
+        """
+        added_by_location = defaultdict(list)
+        for contact in contacts:
+            added_by_location[location_key(contact)].append(contact)
+        if not added_by_location:
+            return None
+
+        changes = {level: {} for level in LEVELS}
+        for key, added in added_by_location.items():
+            index = self.location_indexes.get(key)
+            if index is None:
+                index = self.location_indexes[key] = len(self.locations)
+                self.grouped[key] = added
+                self.locations.append(added)
+                changed = self.aggregator.add(index, key, added)
+            else:
+                self.grouped[key].extend(added)
+                changed = self.aggregator.add(index, key, self.grouped[key], added)
+            # A group is sent once per update however many of its locations changed
+            for level, position, group in changed:
+                changes[level][position] = group
+
+        # New groups have the next positions, so they are added to the index in order
+        for level, level_changes in changes.items():
+            for position in sorted(level_changes):
+                self.index.update(level, position, level_changes[position])
+
+        self.contacts.extend(contacts)
+        self.version += 1
+        update = to_json({
+            "version": self.version,
+            "contacts": len(contacts),
+            "levels": {str(level): [served_group(position, group) for position, group in sorted(level_changes.items())]
+                       for level, level_changes in changes.items()},
+        })
+        self.updates.append((self.version, update))
+        return update
+
+    def viewport(self, level, bounds, keys):
+        """
+        Return the groups of the tiles a page asked for and the counts of its viewport
+
+        Args:
+            level (int): Aggregation level shown by the page
+            bounds (list): South, west, north and east edge of the viewport
+            keys (list): Keys of the tiles the page has not loaded yet
+
+        Returns:
+            dict: The map "version", the "tiles" that hold groups, the
+            "locations" and "contacts" in view and the "levelLocations" in all
+        """
+        locations, contacts = self.index.count(level, *bounds)
+        return {
+            "version": self.version,
+            "tiles": {key: [served_group(position, group) for position, group in groups]
+                      for key, groups in self.index.tile_groups(level, keys).items()},
+            "locations": locations,
+            "contacts": contacts,
+            "levelLocations": len(self.index.groups[level]),
+        }
+
+    def group_details(self, level, position):
+        """Return a group and the first GROUP_CONTACTS of its contacts"""
+        group = self.index.groups[level][position]
+        contacts = []
+        for index in group.locations:
+            contacts += self.locations[index][:GROUP_CONTACTS - len(contacts)]
+            if len(contacts) >= GROUP_CONTACTS:
+                break
+        return {"group": group_entry(group)[:7], "contacts": pack_contacts(contacts)}
+
+    def updates_since(self, version):
+        """
+        Return the updates a page showing a version of the map has not seen
+
+        Returns:
+            list: (version, JSON) of each update in order, or None if the
+            page must reload because they are no longer all kept
+        """
+        if version == self.version:
+            return []
+        if version > self.version or not self.updates or self.updates[0][0] > version + 1:
+            return None
+        return list(islice(self.updates, version + 1 - self.updates[0][0], None))
+
+def served_group(position, group):
+    """Pack a group for a served page: its position in its level, then the group without its locations"""
+    return [position] + group_entry(group)[:7]
+
+def request_level(query):
+    """Return the aggregation level asked for"""
+    try:
+        level = int(query['level'][0])
+    except (KeyError, ValueError):
+        raise BadRequest("level must be one of " + ", ".join(str(level) for level in LEVELS))
+    if level not in LEVELS:
+        raise BadRequest("level must be one of " + ", ".join(str(level) for level in LEVELS))
+    return level
+
+class LogTail:
+    """The end of a log file, read again as records are appended"""
+
+    def __init__(self, path, kind, source=None):
+        """
+        Start following a file from its last complete record
+
+        Args:
+            path (str): Path to the ALL_WSPR.TXT or ADIF file
+            kind (str): 'wspr' or 'adif'
+            source (str): Tag for the records of this file when several are followed
+        """
+        self.path = path
+        self.kind = kind
+        self.source = source
+        stat = os.stat(path)
+        self.inode = stat.st_ino
+        self.offset = complete_end(path, stat.st_size, kind)
+
+    def read_new(self, settings):
+        """
+        Parse the complete records appended since the last read
+
+        Returns:
+            list: The new records that pass the filters
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            print(f"{self.path} was truncated or rotated, reading it from the start")
+            self.inode = stat.st_ino
+            self.offset = 0
+        if stat.st_size == self.offset:
+            return []
+
+        # Stop before a line or record that is still being written
+        end = complete_end(self.path, stat.st_size, self.kind)
+        if end <= self.offset:
+            return []
+        parse_range = parse_wspr_range if self.kind == 'wspr' else parse_adif_range
+        records = parse_range(self.path, settings, self.offset, end)
+        self.offset = end
+        if self.source:
+            tag_records(records, self.source)
+        return records
+
+def log_tails(paths, kind, tag_sources):
+    """
+    Start following the files of one kind that can grow
+
+    Call this before the files are first read, so that nothing appended
+    while they are read is missed.
+
+    Returns:
+        list: LogTail for each plain file that exists
+    """
+    tails = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        if is_compressed(path):
+            print(f"Serve: {path} is compressed and will not be followed")
+            continue
+        tails.append(LogTail(path, kind, source_tag(path) if tag_sources else None))
+    return tails
+
+class MapServer:
+    """HTTP server for the page and its event stream, and the task tailing the logs"""
+
+    def __init__(self, live_map, tails, locate, settings):
+        self.live_map = live_map
+        self.tails = tails
+        self.locate = locate
+        self.settings = settings
+        self.changed = None
+
+    def read_tails(self):
+        """Read and locate the new records of every tailed file"""
+        records = []
+        for tail in self.tails:
+            records += tail.read_new(self.settings)
+        return self.locate(records) if records else []
+
+    async def follow(self):
+        """Poll the tailed files and push what was appended to them"""
+        while True:
+            await asyncio.sleep(self.settings.SERVE_POLL_SECONDS)
+            # Files are read in a thread, the map is only changed by the event loop
+            contacts = await asyncio.to_thread(self.read_tails)
+            if not contacts:
+                continue
+            with instrumentation.stage('live_update') as timed:
+                timed.add_records(len(contacts))
+                update = self.live_map.add_contacts(contacts)
+            if update is not None:
+                print(f"Sent {len(contacts)} new contacts, {len(self.live_map.contacts)} on the map")
+                async with self.changed:
+                    self.changed.notify_all()
+
+    async def handle(self, reader, writer):
+        """Answer one HTTP request"""
+        try:
+            request = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, _ = request.decode('latin-1').split(' ', 2)
+            except ValueError:
+                return
+
+            url = urlsplit(target)
+            if method != 'GET':
+                await self.respond(writer, "405 Method Not Allowed", "text/plain", b"Method not allowed\n")
+            elif url.path == '/':
+                await self.respond(writer, "200 OK", "text/html; charset=utf-8", self.live_map.page_html())
+            elif url.path in ('/viewport', '/group'):
+                try:
+                    body = self.answer(url.path, parse_qs(url.query))
+                except BadRequest as e:
+                    await self.respond(writer, "400 Bad Request", "text/plain", f"{e}\n".encode('utf-8'))
+                else:
+                    await self.respond(writer, "200 OK", "application/json", json.dumps(body).encode('utf-8'))
+            elif url.path == '/events':
+                # A reconnecting EventSource gives the last update it saw
+                since = headers.get('last-event-id') or parse_qs(url.query).get('since', ['0'])[0]
+                try:
+                    since = int(since)
+                except ValueError:
+                    since = 0
+                await self.stream(writer, since)
+            else:
+                await self.respond(writer, "404 Not Found", "text/plain", b"Not found\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def answer(self, path, query):
+        """Answer a request for the groups and counts of a viewport, or for the contacts of a group"""
+        level = request_level(query)
+        if path == '/group':
+            try:
+                position = int(query['position'][0])
+            except (KeyError, ValueError):
+                raise BadRequest("position must be a number")
+            if not 0 <= position < len(self.live_map.index.groups[level]):
+                raise BadRequest("no group at that position")
+            return self.live_map.group_details(level, position)
+
+        try:
+            bounds = [float(value) for value in query['bounds'][0].split(',')]
+        except (KeyError, ValueError):
+            bounds = []
+        if len(bounds) != 4 or not all(math.isfinite(value) for value in bounds):
+            raise BadRequest("bounds must be south,west,north,east")
+        keys = [key for key in query.get('tiles', [''])[0].split(',') if key]
+        if len(keys) > MAX_TILES:
+            raise BadRequest(f"at most {MAX_TILES} tiles may be asked for at once")
+        return self.live_map.viewport(level, bounds, keys)
+
+    async def respond(self, writer, status, content_type, body):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+        writer.write(body)
+        await writer.drain()
+
+    async def stream(self, writer, version):
+        """Send a page every update after the version it shows, until it goes away"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+        while True:
+            updates = self.live_map.updates_since(version)
+            if updates is None:
+                writer.write(b"event: reload\ndata: \n\n")
+                await writer.drain()
+                return
+            for version, update in updates:
+                writer.write(f"id: {version}\ndata: {update}\n\n".encode('utf-8'))
+            await writer.drain()
+
+            async with self.changed:
+                try:
+                    await asyncio.wait_for(self.changed.wait_for(lambda: self.live_map.version > version),
+                                           KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+
+    async def serve(self, port):
+        self.changed = asyncio.Condition()
+        server = await asyncio.start_server(self.handle, HOST, port)
+        url = f"http://{HOST}:{server.sockets[0].getsockname()[1]}/"
+        print(f"Serving the map at {url}, press Ctrl+C to stop")
+        if self.tails:
+            print(f"Following {len(self.tails)} log file(s) for new records")
+        if self.settings.AUTO_OPEN_MAP:
+            webbrowser.open(url)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.follow())
+
+def serve_map(contacts, settings, tails, locate, port):
+    """
+    Serve the map and push the records appended to the logs until interrupted
+
+    Args:
+        contacts (list): The contacts already read, with their coordinates
+        settings (Settings): Settings for the map and the record filters
+        tails (list): LogTail of each file to follow
+        locate (function): Turns new records into contacts with coordinates,
+            the same way the records already read were
+        port (int): TCP port to listen on, 0 for any free port
+    """
+    server = MapServer(LiveMap(contacts, settings), tails, locate, settings)
+    try:
+        asyncio.run(server.serve(port))
+    except KeyboardInterrupt:
+        print("Stopped serving the map")
@@ -4,18 +4,23 @@ Module for interfacing with Google Maps API to display contacts and paths
 """
 
 import os
+import json
 import webbrowser
 from datetime import datetime
 from collections import defaultdict
-from utils import BAND_COLORS
+from utils import band_color
 from grid_converter import grid_to_coordinates
+from wspr_columnar import WsprColumns, WsprGroup
+from aggregation import aggregate_locations
+from heatmap import ALL_BANDS, MERCATOR_LATITUDE, bin_spots, data_uri, heatmap_png
+import instrumentation
 
 def create_map(contacts, settings):
     """
     Create an HTML file with Google Maps displaying the contacts and paths
     
     Args:
-        contacts (list): List of contacts with lat/long coordinates
+        contacts (list): List of contacts with lat/long coordinates, or WsprColumns
         settings (Settings): Settings object containing API keys and preferences
     
     Returns:
@@ -26,22 +31,59 @@ def create_map(contacts, settings):
     output_dir = settings.OUTPUT_DIRECTORY
     os.makedirs(output_dir, exist_ok=True)
     html_file = os.path.join(output_dir, f"ham_contacts_map_{timestamp}.html")
-    
-    # Find operator's grid square from contacts
-    operator_grid = settings.OPERATOR_GRIDSQUARE
-    operator_lat = None
-    operator_lon = None
-    
-    # Look for MY_GRIDSQUARE in contacts if not in settings
-    if not operator_grid:
-        for contact in contacts:
-            if 'MY_GRIDSQUARE' in contact and contact['MY_GRIDSQUARE'].strip():
-                operator_grid = contact['MY_GRIDSQUARE'].strip()
-                operator_lat, operator_lon = grid_to_coordinates(operator_grid)
-                break
-    else:
-        # Convert operator grid from settings
-        operator_lat, operator_lon = grid_to_coordinates(operator_grid)
+
+    with instrumentation.stage('grouping') as timed:
+        grouped_contacts = group_contacts(contacts)
+        # Aggregate the locations by field, square and subsquare for the zoom levels
+        levels = aggregate_locations(grouped_contacts)
+        timed.add_records(len(contacts))
+
+    with instrumentation.stage('html') as timed, open(html_file, 'w', encoding='utf-8') as f:
+        timed.add_records(len(contacts))
+        write_map_page(f, contacts, settings, grouped_contacts, levels)
+
+    # Open the file in the default browser if auto-open is enabled
+    if settings.AUTO_OPEN_MAP:
+        webbrowser.open('file://' + os.path.abspath(html_file))
+
+    return html_file
+
+def group_contacts(contacts):
+    """
+    Group contacts by their coordinates
+
+    Returns:
+        dict: "lat,lon" -> list of the contacts at that location, in the
+        order the locations were first seen
+    """
+    if isinstance(contacts, WsprColumns):
+        return contacts.group_by_location()
+    grouped_contacts = defaultdict(list)
+    for contact in contacts:
+        if 'LATITUDE' in contact and 'LONGITUDE' in contact:
+            grouped_contacts[location_key(contact)].append(contact)
+    return grouped_contacts
+
+def location_key(contact):
+    """Return the "lat,lon" key a contact is grouped under"""
+    return f"{contact['LATITUDE']},{contact['LONGITUDE']}"
+
+def write_map_page(f, contacts, settings, grouped_contacts, levels, live=None):
+    """
+    Write the map page
+
+    Args:
+        f (file): Text file to stream the HTML to
+        contacts (list): List of contacts with lat/long coordinates, or WsprColumns
+        settings (Settings): Settings object containing API keys and preferences
+        grouped_contacts (dict): The contacts grouped by group_contacts
+        levels (dict): The aggregation levels of grouped_contacts
+        live (dict): For a page served by map_server, the "version" of the map
+            and the "bounds" of its locations; the page then fetches the groups
+            in view from the server and follows its updates, and
+            grouped_contacts and levels are left empty
+    """
+    operator_grid, operator_lat, operator_lon = operator_location(contacts, settings)
     
     # Format date range for display if available
     date_range_html = ""
@@ -56,8 +98,8 @@ def create_map(contacts, settings):
         end_date_str = settings.end_date.strftime("%Y-%m-%d")
         date_range_html = f'<div id="date-range">To Date: {end_date_str}</div>'
     
-    # Start building the HTML content
-    html_content = f"""<!DOCTYPE html>
+    # Start writing the page, the HTML is streamed to the file as it is produced
+    page_head = f"""<!DOCTYPE html>
 <html>
 <head>
     <title>Ham Radio Contacts Map</title>
@@ -136,208 +178,522 @@ def create_map(contacts, settings):
         <div id="marker-count">Locations: 0</div>
         {date_range_html}
     </div>
-    <script>
-        function initMap() {{
-            const map = new google.maps.Map(document.getElementById("map"), {{
+"""
+
+    operator = None
+    if operator_lat and operator_lon:
+        operator = [operator_lat, operator_lon, operator_grid]
+
+    f.write(page_head)
+
+    # Contacts of each location, as a JSON string that is only parsed when clicked
+    f.write('    <script type="application/json" id="contact-details">[')
+    for i, location_contacts in enumerate(grouped_contacts.values()):
+        if i:
+            f.write(',')
+        f.write(to_json(to_json(pack_contacts(location_contacts))))
+    f.write(']</script>\n')
+
+    f.write("    <script>\n        const MAP_DATA = {")
+    f.write(f'"mapTypeId":{to_json(settings.DEFAULT_MAP_TYPE)},')
+    f.write(f'"totalContacts":{len(contacts)},')
+    f.write(f'"operator":{to_json(operator)},')
+    f.write(f'"heatmap":{to_json(heatmap_layers(contacts, settings))},')
+    f.write(f'"live":{to_json(live)},')
+    f.write('"levels":{')
+    for i, (level, groups) in enumerate(levels.items()):
+        if i:
+            f.write(',')
+        f.write(f'"{level}":[')
+        for j, group in enumerate(groups):
+            if j:
+                f.write(',')
+            f.write(to_json(group_entry(group)))
+        f.write(']')
+    f.write('}};\n')
+    f.write(MAP_SCRIPT)
+    f.write(MAP_FOOTER.replace("API_KEY", settings.GOOGLE_MAPS_API_KEY))
+
+def operator_location(contacts, settings):
+    """
+    Find the operator's grid square and its coordinates
+
+    The grid comes from OPERATOR_GRIDSQUARE, or else from the first contact
+    with a MY_GRIDSQUARE field.
+
+    Returns:
+        tuple: (grid, latitude, longitude), with None for what was not found
+    """
+    operator_grid = settings.OPERATOR_GRIDSQUARE
+    
+    # Look for MY_GRIDSQUARE in contacts if not in settings
+    if not operator_grid and not isinstance(contacts, WsprColumns):
+        for contact in contacts:
+            if 'MY_GRIDSQUARE' in contact and contact['MY_GRIDSQUARE'].strip():
+                operator_grid = contact['MY_GRIDSQUARE'].strip()
+                break
+
+    if not operator_grid:
+        return None, None, None
+
+    operator_lat, operator_lon = grid_to_coordinates(operator_grid)
+    return operator_grid, operator_lat, operator_lon
+
+def heatmap_layers(contacts, settings):
+    """
+    Draw the heatmap overlays for the page, one for all bands and one per band
+
+    Returns:
+        dict: {"weight", "bounds": [south, west, north, east], "layers": [[band, PNG data URI], ...]}
+        or None when no heatmap was asked for
+    """
+    if not settings.heatmap:
+        return None
+
+    heatmaps = bin_spots(contacts, settings.heatmap_hours)
+    bands = [ALL_BANDS] + sorted(band for band in heatmaps if band != ALL_BANDS)
+    return {
+        "weight": settings.heatmap,
+        "bounds": [-MERCATOR_LATITUDE, -180, MERCATOR_LATITUDE, 180],
+        "layers": [[band, data_uri(heatmap_png(heatmaps[band], settings.heatmap, mercator=True))] for band in bands],
+    }
+
+# Most contacts listed in one info window, as MAX_INFO_CONTACTS in MAP_SCRIPT
+MAX_INFO_CONTACTS = 100
+
+# Fields shown in the info window, in the order they are packed for each contact
+CONTACT_FIELDS = ('CALL', 'NAME', 'QSO_DATE', 'TIME_ON', 'BAND', 'MODE', 'GRIDSQUARE', 'PATH_KM', 'PATH_BEARING',
+                  'SOURCE')
+
+def to_json(value):
+    """Encode a value as compact JSON that is safe inside a <script> element"""
+    return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+def pack_contacts(location_contacts):
+    """
+    Pack the contacts of one location as lists of the CONTACT_FIELDS values, null when missing
+
+    Of columnar spots only the first MAX_INFO_CONTACTS are packed, the most
+    an info window shows, so no row is made for the others.
+    """
+    if isinstance(location_contacts, WsprGroup):
+        location_contacts = location_contacts.head(MAX_INFO_CONTACTS)
+    return [[contact.get(field) for field in CONTACT_FIELDS] for contact in location_contacts]
+
+def group_entry(group):
+    """
+    Pack one aggregated grid group for the map data
+
+    Returns:
+        list: [lat, lng, color, grid, count, bands, best snr, location indexes]
+        where bands maps each band to its number of contacts
+    """
+    return [group.latitude, group.longitude, band_color(group.main_band()), group.grid, group.count,
+            group.bands, group.best_snr, group.locations]
+
+# Fixed script that builds the markers, info windows and paths from MAP_DATA,
+# switching between the aggregation levels as the map is zoomed
+MAP_SCRIPT = """
+        function escapeHtml(text) {
+            return String(text).replace(/[&<>"']/g, c => ({
+                "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"
+            })[c]);
+        }
+
+        // Zoom level up to which each aggregation level (grid characters) is shown
+        const LEVEL_ZOOMS = [[3, "2"], [7, "4"], [Infinity, "6"]];
+        const MAX_INFO_CONTACTS = 100;
+        let contactDetails = null;
+
+        function levelForZoom(zoom) {
+            return LEVEL_ZOOMS.find(([maxZoom]) => zoom <= maxZoom)[1];
+        }
+
+        function locationContacts(location) {
+            if (contactDetails === null) {
+                contactDetails = JSON.parse(document.getElementById("contact-details").textContent);
+            }
+            return JSON.parse(contactDetails[location]);
+        }
+
+        // Tiles holding the groups of each level on a served page, as in spatial_index.py
+        const TILE_SIZES = { "2": [360, 180], "4": [20, 10], "6": [2, 1] };
+
+        function tileIndex(value, offset, size, count) {
+            return Math.min(Math.max(Math.floor((value + offset) / size), 0), count - 1);
+        }
+
+        function tileName(level, column, row) {
+            if (level === "2") return "";
+            if (level === "4") return String.fromCharCode(65 + column, 65 + row);
+            return String.fromCharCode(65 + Math.floor(column / 10), 65 + Math.floor(row / 10)) + (column % 10) + (row % 10);
+        }
+
+        function tileKey(level, lat, lng) {
+            const [width, height] = TILE_SIZES[level];
+            return tileName(level, tileIndex(lng, 180, width, 360 / width), tileIndex(lat, 90, height, 180 / height));
+        }
+
+        // Keys of the tiles a viewport overlaps, one crossing the antimeridian is taken in two parts
+        function tileKeys(level, south, west, north, east) {
+            const [width, height] = TILE_SIZES[level];
+            const ranges = west <= east ? [[west, east]] : [[west, 180], [-180, east]];
+            const firstRow = tileIndex(south, 90, height, 180 / height);
+            const lastRow = tileIndex(north, 90, height, 180 / height);
+            const keys = [];
+            for (const [rangeWest, rangeEast] of ranges) {
+                const lastColumn = tileIndex(rangeEast, 180, width, 360 / width);
+                for (let column = tileIndex(rangeWest, 180, width, 360 / width); column <= lastColumn; column++) {
+                    for (let row = firstRow; row <= lastRow; row++) {
+                        keys.push(tileName(level, column, row));
+                    }
+                }
+            }
+            return keys;
+        }
+
+        function contactHtml(contact, index) {
+            const [call, name, date, time, band, mode, grid, km, bearing, source] = contact;
+            const infoParts = [];
+            if (call !== null) infoParts.push(`<strong>Callsign:</strong> ${escapeHtml(call)}`);
+            if (name !== null) infoParts.push(`<strong>Name:</strong> ${escapeHtml(name)}`);
+            if (date !== null && date.length === 8) {
+                infoParts.push(`<strong>Date:</strong> ${date.slice(0, 4)}-${date.slice(4, 6)}-${date.slice(6, 8)}`);
+            }
+            if (time !== null && time.length >= 4) {
+                infoParts.push(`<strong>Time:</strong> ${time.slice(0, 2)}:${time.slice(2, 4)}`);
+            }
+            if (band !== null) infoParts.push(`<strong>Band:</strong> ${escapeHtml(band)}`);
+            if (mode !== null) infoParts.push(`<strong>Mode:</strong> ${escapeHtml(mode)}`);
+            if (grid !== null) infoParts.push(`<strong>Grid:</strong> ${escapeHtml(grid)}`);
+            if (km !== null) infoParts.push(`<strong>Distance:</strong> ${Math.round(km)} km`);
+            if (bearing !== null) infoParts.push(`<strong>Bearing:</strong> ${Math.round(bearing)}&deg;`);
+            if (source !== null) infoParts.push(`<strong>Source:</strong> ${escapeHtml(source)}`);
+            return `<div class="contact-entry">
+                <h4>Contact ${index + 1}: ${escapeHtml(call !== null ? call : "Unknown")}</h4>
+                <p>${infoParts.join(" | ")}</p>
+            </div>`;
+        }
+
+        // Ground overlay of the heatmap for each band, with a selector in the legend
+        function addHeatmapControl(map) {
+            const [south, west, north, east] = MAP_DATA.heatmap.bounds;
+            const layers = MAP_DATA.heatmap.layers;
+            const overlays = {};
+            let current = null;
+
+            function showHeatmap(index) {
+                if (current !== null) overlays[current].setMap(null);
+                current = null;
+                if (index < 0) return;
+                if (!overlays[index]) {
+                    overlays[index] = new google.maps.GroundOverlay(layers[index][1],
+                        { south: south, west: west, north: north, east: east },
+                        { opacity: 0.7, clickable: false });
+                }
+                overlays[index].setMap(map);
+                current = index;
+            }
+
+            const select = document.createElement("select");
+            select.add(new Option("Off", "-1"));
+            layers.forEach(([band], index) => select.add(new Option(band, String(index))));
+            select.value = "0";
+            select.addEventListener("change", () => showHeatmap(Number(select.value)));
+
+            const control = document.createElement("div");
+            control.append(`Heatmap (${MAP_DATA.heatmap.weight}): `, select);
+            document.querySelector(".legend").append(control);
+            showHeatmap(0);
+        }
+
+        function initMap() {
+            const map = new google.maps.Map(document.getElementById("map"), {
                 zoom: 2,
-                center: {{ lat: 0, lng: 0 }},
-                mapTypeId: google.maps.MapTypeId.{settings.DEFAULT_MAP_TYPE}
-            }});
-            
+                center: { lat: 0, lng: 0 },
+                mapTypeId: google.maps.MapTypeId[MAP_DATA.mapTypeId]
+            });
+
             const infoWindow = new google.maps.InfoWindow();
             const bounds = new google.maps.LatLngBounds();
             let markersArray = [];
             let pathsArray = [];
-            let totalContacts = {len(contacts)};
-"""
-    
-    # Add operator marker if grid square is available
-    if operator_lat and operator_lon:
-        html_content += f"""
+            let totalContacts = MAP_DATA.totalContacts;
+            let operatorPosition = null;
+
             // Add operator's location marker
-            const operatorPosition = {{ lat: {operator_lat}, lng: {operator_lon} }};
-            const operatorMarker = new google.maps.Marker({{
-                position: operatorPosition,
-                map: map,
-                title: "Your Location ({operator_grid})",
-                icon: {{
-                    path: google.maps.SymbolPath.CIRCLE,
-                    scale: 7,
-                    fillColor: "#2196F3",
-                    fillOpacity: 0.8,
-                    strokeWeight: 2,
-                    strokeColor: "#0b47a1"
-                }}
-            }});
-            
-            bounds.extend(operatorPosition);
-            
-            operatorMarker.addListener("click", () => {{
-                infoWindow.setContent(
-                    `<div class="info-window">
-                        <h3>Your Location</h3>
-                        <p>Grid Square: {operator_grid}</p>
-                        <p>Coordinates: {operator_lat}, {operator_lon}</p>
-                    </div>`
-                );
-                infoWindow.open(map, operatorMarker);
-            }});
-"""
-    
-    # Group contacts by their coordinates
-    grouped_contacts = defaultdict(list)
-    for contact in contacts:
-        if 'LATITUDE' in contact and 'LONGITUDE' in contact:
-            key = f"{contact['LATITUDE']},{contact['LONGITUDE']}"
-            grouped_contacts[key].append(contact)
-    
-    # Add contact markers for each unique location
-    html_content += """
-            // Create markers for each unique location
-"""
+            if (MAP_DATA.operator) {
+                const [operatorLat, operatorLng, operatorGrid] = MAP_DATA.operator;
+                operatorPosition = { lat: operatorLat, lng: operatorLng };
+                const operatorMarker = new google.maps.Marker({
+                    position: operatorPosition,
+                    map: map,
+                    title: `Your Location (${operatorGrid})`,
+                    icon: {
+                        path: google.maps.SymbolPath.CIRCLE,
+                        scale: 7,
+                        fillColor: "#2196F3",
+                        fillOpacity: 0.8,
+                        strokeWeight: 2,
+                        strokeColor: "#0b47a1"
+                    }
+                });
+
+                bounds.extend(operatorPosition);
+
+                operatorMarker.addListener("click", () => {
+                    infoWindow.setContent(
+                        `<div class="info-window">
+                            <h3>Your Location</h3>
+                            <p>Grid Square: ${escapeHtml(operatorGrid)}</p>
+                            <p>Coordinates: ${operatorLat}, ${operatorLng}</p>
+                        </div>`
+                    );
+                    infoWindow.open(map, operatorMarker);
+                });
+            }
+
+            if (MAP_DATA.heatmap) {
+                addHeatmapControl(map);
+            }
+
+            // Markers and paths are created per aggregation level the first time it is shown
+            const levelMarkers = {};
+            let currentLevel = null;
+
+            function groupHtml(group, contacts) {
+                const [lat, lng, color, grid, count, bands, bestSnr] = group;
+                const bandMix = Object.entries(bands)
+                    .sort((a, b) => b[1] - a[1])
+                    .map(([band, bandCount]) => `${escapeHtml(band || "Unknown")}: ${bandCount}`)
+                    .join(", ");
+                const entries = contacts.slice(0, MAX_INFO_CONTACTS).map(contactHtml);
+                const more = count > entries.length ? `<p>... and ${count - entries.length} more</p>` : "";
+                return `<div class="info-window">
+                    <h3>${escapeHtml(grid || "Location")}: ${count} contact${count > 1 ? "s" : ""}</h3>
+                    <p><strong>Bands:</strong> ${bandMix}</p>
+                    ${bestSnr !== null ? `<p><strong>Best SNR:</strong> ${bestSnr} dB</p>` : ""}
+                    ${entries.join("")}${more}
+                </div>`;
+            }
+
+            // The contact details of a group are only parsed when it is clicked
+            function groupContacts(locations) {
+                const contacts = [];
+                for (const location of locations) {
+                    for (const contact of locationContacts(location)) {
+                        if (contacts.length >= MAX_INFO_CONTACTS) return contacts;
+                        contacts.push(contact);
+                    }
+                }
+                return contacts;
+            }
+
+            function openGroup(marker, group, contacts) {
+                infoWindow.setContent(groupHtml(group, contacts));
+                infoWindow.open(map, marker);
+            }
 
-    for i, (coord_key, location_contacts) in enumerate(grouped_contacts.items()):
-        lat, lng = coord_key.split(',')
-        
-        # Get the first contact's call for the marker title
-        first_call = location_contacts[0].get('CALL', 'Unknown').replace('"', '\\"')
-        contact_count = len(location_contacts)
-        
-        # Build content for info window with all contacts at this location
-        info_window_content = []
-        
-        for j, contact in enumerate(location_contacts):
-            # Build a description with available information
-            info_parts = []
-            
-            if 'CALL' in contact:
-                call = contact['CALL'].replace('"', '\\"')
-                info_parts.append(f"<strong>Callsign:</strong> {call}")
-            if 'NAME' in contact:
-                name = contact['NAME'].replace('"', '\\"')
-                info_parts.append(f"<strong>Name:</strong> {name}")
-            if 'QSO_DATE' in contact:
-                date = contact['QSO_DATE']
-                if len(date) == 8:  # YYYYMMDD format
-                    formatted_date = f"{date[0:4]}-{date[4:6]}-{date[6:8]}"
-                    info_parts.append(f"<strong>Date:</strong> {formatted_date}")
-            if 'TIME_ON' in contact:
-                time = contact['TIME_ON']
-                if len(time) >= 4:  # HHMM format
-                    formatted_time = f"{time[0:2]}:{time[2:4]}"
-                    info_parts.append(f"<strong>Time:</strong> {formatted_time}")
-            if 'BAND' in contact:
-                info_parts.append(f"<strong>Band:</strong> {contact['BAND']}")
-            if 'MODE' in contact:
-                info_parts.append(f"<strong>Mode:</strong> {contact['MODE']}")
-            if 'GRIDSQUARE' in contact:
-                info_parts.append(f"<strong>Grid:</strong> {contact['GRIDSQUARE']}")
-            
-            contact_html = f"""<div class="contact-entry">
-                <h4>Contact {j+1}: {call if 'CALL' in contact else 'Unknown'}</h4>
-                <p>{" | ".join(info_parts)}</p>
-            </div>"""
-            
-            info_window_content.append(contact_html)
-        
-        marker_title = f"{first_call} ({contact_count} contact{'s' if contact_count > 1 else ''})"
-        combined_info = "".join(info_window_content).replace('\\', '\\\\').replace('`', '\\`')
-        band_color = BAND_COLORS[contact['BAND']]
-        # Add marker for this location with info about all contacts
-        html_content += f"""
-            // Location {i+1} with {contact_count} contact(s)
-            const location{i} = new google.maps.Marker({{
-                position: {{ lat: {lat}, lng: {lng} }},
-                map: map,
-                title: "{marker_title}",
-                icon: {{
+            function groupTitle(grid, count) {
+                return `${grid} (${count} contact${count > 1 ? "s" : ""})`;
+            }
+
+            function groupIcon(color, count) {
+                return {
                     path: google.maps.SymbolPath.CIRCLE,
-                    scale: 5,
-                    fillColor: "{band_color}",
+                    scale: Math.min(5 + Math.log2(count), 12),
+                    fillColor: color,
                     fillOpacity: 0.8,
                     strokeWeight: 2,
-                    strokeColor: "{band_color}"
-                }},
-                contactCount: {contact_count}
-            }});
-            
-            bounds.extend({{ lat: {lat}, lng: {lng} }});
-            markersArray.push(location{i});
-            
-            location{i}.addListener("click", () => {{
-                infoWindow.setContent(
-                    `<div class="info-window">
-                        <h3>Location with {contact_count} contact{'s' if contact_count > 1 else ''}</h3>
-                        {combined_info}
-                    </div>`
-                );
-                infoWindow.open(map, location{i});
-            }});
-"""
-        
-        # Add path from operator to this location if operator location is available
-        if operator_lat and operator_lon:
-            html_content += f"""
-            // Draw path to location {i+1}
-            const path{i} = new google.maps.Polyline({{
-                path: [
-                    {{ lat: {operator_lat}, lng: {operator_lon} }},
-                    {{ lat: {lat}, lng: {lng} }}
-                ],
-                geodesic: true,
-                strokeColor: "{band_color}",
-                strokeOpacity: 0.6,
-                strokeWeight: 2
-            }});
-            path{i}.setMap(map);
-            pathsArray.push(path{i});
-"""
-    
-    # Add final JavaScript to fit bounds and control marker visibility
-    html_content += """
-            // Adjust the map to fit all markers
-            if (markersArray.length > 0) {
-                map.fitBounds(bounds);
-                // Update marker count initially
-                document.getElementById("marker-count").textContent = `Locations: ${markersArray.length} total`;
+                    strokeColor: color
+                };
             }
-            
-            // Add a listener to update marker visibility when the map changes
-            map.addListener("bounds_changed", () => {
-                const mapBounds = map.getBounds();
-                let visibleMarkers = 0;
-                let visibleContacts = 0;
-                
-                if (mapBounds) {
-                    markersArray.forEach(marker => {
-                        if (mapBounds.contains(marker.getPosition())) {
-                            visibleMarkers++;
-                            visibleContacts += marker.contactCount;
-                        }
+
+            // The marker and path of one group, showContacts is called when the marker is clicked
+            function createGroup(group, showContacts) {
+                const [lat, lng, color, grid, count] = group;
+                const position = { lat: lat, lng: lng };
+                const marker = new google.maps.Marker({
+                    position: position,
+                    title: groupTitle(grid, count),
+                    icon: groupIcon(color, count),
+                    contactCount: count
+                });
+                marker.addListener("click", () => showContacts(marker));
+
+                let path = null;
+                if (operatorPosition) {
+                    path = new google.maps.Polyline({
+                        path: [operatorPosition, position],
+                        geodesic: true,
+                        strokeColor: color,
+                        strokeOpacity: 0.6,
+                        strokeWeight: 2
                     });
+                }
+                return { marker: marker, path: path };
+            }
+
+            function addGroup(built, created) {
+                built.markers.push(created.marker);
+                if (created.path) built.paths.push(created.path);
+            }
+
+            // Every group of a level from the page data
+            function createLevel(level) {
+                const built = { markers: [], paths: [] };
+                MAP_DATA.levels[level].forEach(group => addGroup(built, createGroup(group,
+                    marker => openGroup(marker, group, groupContacts(group[7])))));
+                return built;
+            }
+
+            function showLevel(level) {
+                if (level === currentLevel) return;
+                if (currentLevel !== null) {
+                    levelMarkers[currentLevel].markers.forEach(marker => marker.setMap(null));
+                    levelMarkers[currentLevel].paths.forEach(path => path.setMap(null));
+                }
+                if (!levelMarkers[level]) {
+                    // A served page starts each level empty and fetches its tiles as they come into view
+                    levelMarkers[level] = MAP_DATA.live
+                        ? { markers: [], paths: [], groups: {}, tiles: new Set() }
+                        : createLevel(level);
+                }
+                levelMarkers[level].markers.forEach(marker => marker.setMap(map));
+                levelMarkers[level].paths.forEach(path => path.setMap(map));
+                markersArray = levelMarkers[level].markers;
+                pathsArray = levelMarkers[level].paths;
+                currentLevel = level;
+            }
+
+            function showCounts(visibleMarkers, visibleContacts, levelLocations) {
+                document.getElementById("contact-count").textContent = 
+                    `Contacts: ${visibleContacts} visible of ${totalContacts} total`;
+                document.getElementById("marker-count").textContent = 
+                    `Locations: ${visibleMarkers} visible of ${levelLocations} total`;
+            }
+
+            // Fit the map to every location: the finest level holds them all, a served page gives their bounds
+            if (MAP_DATA.live) {
+                if (MAP_DATA.live.bounds) {
+                    const [south, west, north, east] = MAP_DATA.live.bounds;
+                    bounds.extend({ lat: south, lng: west });
+                    bounds.extend({ lat: north, lng: east });
+                    map.fitBounds(bounds);
+                }
+            } else {
+                const finestLevel = MAP_DATA.levels[LEVEL_ZOOMS[LEVEL_ZOOMS.length - 1][1]];
+                finestLevel.forEach(([lat, lng]) => bounds.extend({ lat: lat, lng: lng }));
+                if (finestLevel.length > 0) {
+                    map.fitBounds(bounds);
+                }
+            }
+            showLevel(levelForZoom(map.getZoom()));
+            map.addListener("zoom_changed", () => showLevel(levelForZoom(map.getZoom())));
+
+            if (!MAP_DATA.live) {
+                // Count the visible markers once the map stops moving rather than on every frame
+                map.addListener("idle", () => {
+                    const mapBounds = map.getBounds();
+                    let visibleMarkers = 0;
+                    let visibleContacts = 0;
                     
-                    // Update the counts in the legend
-                    document.getElementById("contact-count").textContent = 
-                        `Contacts: ${visibleContacts} visible of ${totalContacts} total`;
-                    document.getElementById("marker-count").textContent = 
-                        `Locations: ${visibleMarkers} visible of ${markersArray.length} total`;
+                    if (mapBounds) {
+                        markersArray.forEach(marker => {
+                            if (mapBounds.contains(marker.getPosition())) {
+                                visibleMarkers++;
+                                visibleContacts += marker.contactCount;
+                            }
+                        });
+                        showCounts(visibleMarkers, visibleContacts, markersArray.length);
+                    }
+                });
+                return;
+            }
+
+            // Add or update a group of a served page, given as [position, lat, lng, color, grid, count, bands, bestSnr]
+            function setServedGroup(level, [position, ...group]) {
+                const built = levelMarkers[level];
+                const known = built.groups[position];
+                if (known) {
+                    const [lat, lng, color, grid, count] = group;
+                    known.marker.setTitle(groupTitle(grid, count));
+                    known.marker.setIcon(groupIcon(color, count));
+                    known.marker.contactCount = count;
+                    if (known.path) known.path.setOptions({ strokeColor: color });
+                    return;
                 }
-            });
+                const created = createGroup(group, marker => {
+                    fetch(`group?level=${level}&position=${position}`)
+                        .then(response => response.json())
+                        .then(data => openGroup(marker, data.group, data.contacts));
+                });
+                built.groups[position] = created;
+                addGroup(built, created);
+                if (level === currentLevel) {
+                    created.marker.setMap(map);
+                    if (created.path) created.path.setMap(map);
+                }
+            }
+
+            // Fetch the tiles of the viewport not loaded yet, and its counts from the server's index
+            let liveVersion = MAP_DATA.live.version;
+            let viewportRequests = 0;
+            function loadViewport() {
+                const mapBounds = map.getBounds();
+                if (!mapBounds) return;
+                const level = currentLevel;
+                const built = levelMarkers[level];
+                const box = [mapBounds.getSouthWest().lat(), mapBounds.getSouthWest().lng(),
+                             mapBounds.getNorthEast().lat(), mapBounds.getNorthEast().lng()];
+                const missing = [...new Set(tileKeys(level, ...box))].filter(key => !built.tiles.has(key));
+                const request = ++viewportRequests;
+                fetch(`viewport?level=${level}&bounds=${box.join(",")}&tiles=${missing.join(",")}`)
+                    .then(response => response.json())
+                    .then(data => {
+                        // An update arrived after the server answered, so these tiles may be missing it
+                        if (data.version < liveVersion) {
+                            loadViewport();
+                            return;
+                        }
+                        missing.forEach(key => {
+                            if (built.tiles.has(key)) return;
+                            built.tiles.add(key);
+                            (data.tiles[key] || []).forEach(group => setServedGroup(level, group));
+                        });
+                        if (request === viewportRequests) {
+                            showCounts(data.locations, data.contacts, data.levelLocations);
+                        }
+                    });
+            }
+            map.addListener("idle", loadViewport);
+
+            // Apply one update from the server to the tiles already loaded, the others are fetched up to date
+            function applyUpdate(update) {
+                liveVersion = update.version;
+                Object.entries(update.levels).forEach(([level, groups]) => {
+                    const built = levelMarkers[level];
+                    if (!built) return;
+                    groups.forEach(group => {
+                        if (built.tiles.has(tileKey(level, group[1], group[2]))) setServedGroup(level, group);
+                    });
+                });
+                totalContacts += update.contacts;
+                loadViewport();
+            }
+
+            // Follow the server's updates, a reconnecting EventSource resumes after the last one seen
+            const events = new EventSource(`events?since=${liveVersion}`);
+            events.addEventListener("message", event => applyUpdate(JSON.parse(event.data)));
+            // The server no longer holds every update since this page was served
+            events.addEventListener("reload", () => window.location.reload());
         }
     </script>
-    <script async defer
+"""
+
+MAP_FOOTER = """    <script async defer
         src="https://maps.googleapis.com/maps/api/js?key=API_KEY&callback=initMap">
     </script>
 </body>
 </html>
-""".replace("API_KEY", settings.GOOGLE_MAPS_API_KEY)
-    
-    # Write the HTML file
-    with open(html_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
-    
-    # Open the file in the default browser if auto-open is enabled
-    if settings.AUTO_OPEN_MAP:
-        webbrowser.open('file://' + os.path.abspath(html_file))
-    
-    return html_file
\ No newline at end of file
+"""
@@ -0,0 +1,95 @@
+# parallel_parser.py
+"""
+Module for parsing large WSPR and ADIF files on several cores
+
+The file is split into byte ranges that start on a line boundary (WSPR) or
+just after an <eor> (ADIF).  Each range is parsed in a separate process and
+the results are joined back in file order.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from adif_parser import parse_adif_range
+from wspr_parser import parse_wspr_range
+from wsprnet_csv import parse_wsprnet_range
+from file_ranges import split_byte_ranges
+from filters import record_filter_for
+from time_index import date_window
+from grid_converter import add_invalid_grids, invalid_grid_count
+from settings import Settings
+import instrumentation
+
+def _parse_range(task):
+    """Parse one byte range in a worker process"""
+    kind, file_path, settings, start, end = task
+    if kind == 'wspr':
+        return parse_wspr_range(file_path, settings, start, end)
+    if kind == 'wsprnet':
+        return parse_wsprnet_range(file_path, settings, start, end)
+    return parse_adif_range(file_path, settings, start, end)
+
+def _parse_range_counted(task):
+    """
+    Parse one byte range in a worker process, with the problems counted there
+
+    The counters of a worker process are lost when it ends, so they are
+    returned with the records for the parent to add to its own.
+    """
+    counting, task = task[0], task[1:]
+    if counting:
+        instrumentation.start()
+    grids = invalid_grid_count()
+    records = _parse_range(task)
+    return records, instrumentation.counters(), invalid_grid_count() - grids
+
+def parse_file_parallel(file_path, settings : Settings, kind, workers):
+    """
+    Parse a WSPR or ADIF file with a pool of worker processes
+
+    Args:
+        file_path (str): Path to the file
+        settings (Settings): Settings holding the date, band, mode and call filters
+        kind (str): 'wspr', 'wsprnet' or 'adif'
+        workers (int): Number of worker processes
+
+    Returns:
+        list: The same records parse_wspr_file or parse_adif_file returns, in file order
+    """
+    # Only split the part of the file that can hold the requested dates,
+    # wsprspots CSV files have no time index and are split on lines like WSPR
+    if kind == 'wsprnet':
+        start, end = 0, None
+    else:
+        start, end = date_window(file_path, kind, record_filter_for(settings))
+    ranges = split_byte_ranges(file_path, workers, 'adif' if kind == 'adif' else 'wspr', start, end)
+    tasks = [(kind, file_path, settings, start, end) for start, end in ranges]
+
+    if len(tasks) == 1:
+        return _parse_range(tasks[0])
+
+    counting = instrumentation.is_enabled()
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        results = list(executor.map(_parse_range_counted, [(counting,) + task for task in tasks]))
+    for _, counters, grids in results:
+        instrumentation.add_counters(counters)
+        add_invalid_grids(grids)
+    return list(chain.from_iterable(records for records, _, _ in results))
+
+def parse_wspr_file_parallel(file_path, settings : Settings, workers):
+    """Parse an ALL_WSPR.TXT file with a pool of worker processes"""
+    return parse_file_parallel(file_path, settings, 'wspr', workers)
+
+def parse_wsprnet_file_parallel(file_path, settings : Settings, workers):
+    """Parse a wsprspots CSV file with a pool of worker processes"""
+    return parse_file_parallel(file_path, settings, 'wsprnet', workers)
+
+def parse_adif_file_parallel(filename, settings : Settings, workers):
+    """Parse an ADIF file with a pool of worker processes"""
+    try:
+        contacts = parse_file_parallel(filename, settings, 'adif', workers)
+        print(f"Successfully parsed {len(contacts)} contacts from ADIF file")
+        return contacts
+
+    except Exception as e:
+        print(f"Error parsing ADIF file: {e}")
+        return []
@@ -0,0 +1,208 @@
+# parse_cache.py
+"""
+Persistent cache of parsed log files
+
+Parsed records are saved in a cache directory next to the map output
+directory, keyed by the file's path, size, modification time, a hash of its
+first and last bytes, the parser version and the active filters.  Record
+lists are pickled; columnar WSPR spots are saved as .npy files and loaded
+memory-mapped.  The least recently used entries are evicted once the cache
+grows past CACHE_MAX_BYTES.
+
+The problems counted while a file is parsed, its invalid grid squares and,
+with --profile, its malformed lines and records, are saved with the records
+and counted again when they are loaded.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from filters import record_filter_for
+from grid_converter import add_invalid_grids, invalid_grid_count
+from settings import Settings
+from wspr_columnar import WsprColumns
+import instrumentation
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Bumped whenever the parsers produce different records for the same input,
+# or the entries are saved differently
+PARSER_VERSION = 5
+
+# Number of bytes hashed at the start and at the end of the file
+FINGERPRINT_BYTES = 64 * 1024
+
+# Columns saved for columnar WSPR spots, the derived ones are recomputed on load
+COLUMN_NAMES = ('date', 'time', 'snr', 'drift', 'frequency', 'tx_power', 'distance', 'azimuth',
+                'tx_call', 'tx_grid', 'rx_call', 'rx_grid')
+
+def cache_directory(settings : Settings):
+    """Return the cache directory, by default OUTPUT_DIRECTORY with a _cache suffix"""
+    if settings.CACHE_DIRECTORY:
+        return settings.CACHE_DIRECTORY
+    return os.path.normpath(settings.OUTPUT_DIRECTORY) + "_cache"
+
+def cache_key(file_path, settings : Settings, kind):
+    """
+    Compute the cache key for a file
+
+    Args:
+        file_path (str): Path to the log file
+        settings (Settings): Settings holding the active filters
+        kind (str): 'adif', 'wspr', 'wsprnet' or 'wspr-columnar'
+
+    Returns:
+        str: Hex digest identifying this exact file content and parse
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha1()
+    digest.update(repr((os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns,
+                        PARSER_VERSION, kind, record_filter_for(settings).signature())).encode('utf-8'))
+
+    with open(file_path, 'rb') as file:
+        digest.update(file.read(FINGERPRINT_BYTES))
+        if stat.st_size > FINGERPRINT_BYTES:
+            file.seek(max(FINGERPRINT_BYTES, stat.st_size - FINGERPRINT_BYTES))
+            digest.update(file.read(FINGERPRINT_BYTES))
+
+    return digest.hexdigest()
+
+def entry_size(path):
+    """Return the number of bytes used by a cache entry file or directory"""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+def remove_entry(path):
+    """Delete a cache entry file or directory"""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def evict(directory, max_bytes):
+    """Delete the least recently used entries until the cache fits in max_bytes"""
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        entries.append((os.path.getmtime(path), entry_size(path), path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        remove_entry(path)
+        total -= size
+
+def save_columns(path, columns):
+    """Save WsprColumns as one .npy file per column plus the category tables"""
+    os.makedirs(path, exist_ok=True)
+    for name in COLUMN_NAMES:
+        np.save(os.path.join(path, f"{name}.npy"), getattr(columns, name))
+    with open(os.path.join(path, "tables.json"), 'w') as f:
+        json.dump({'calls': columns.calls, 'grids': columns.grids}, f)
+
+def load_columns(path):
+    """Load WsprColumns saved by save_columns, memory-mapping the arrays"""
+    with open(os.path.join(path, "tables.json"), 'r') as f:
+        tables = json.load(f)
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in COLUMN_NAMES}
+    return WsprColumns(calls=tables['calls'], grids=tables['grids'], **arrays)
+
+def save_counts(path, counts):
+    """Save the problems counted while parsing next to columnar WSPR spots"""
+    with open(os.path.join(path, "counts.json"), 'w') as f:
+        json.dump(counts, f)
+
+def load_counts(path):
+    """Load the problems counted while parsing columnar WSPR spots"""
+    with open(os.path.join(path, "counts.json"), 'r') as f:
+        return json.load(f)
+
+def parse_counted(parse, file_path, settings : Settings):
+    """
+    Parse a file and take the problems counted while doing it
+
+    Returns:
+        tuple: (records, counts), counts holding the number of invalid grid squares and
+        the instrumentation counters, None if instrumentation is off
+    """
+    grids = invalid_grid_count()
+    before = instrumentation.counters()
+    records = parse(file_path, settings)
+    counters = None
+    if before is not None:
+        after = instrumentation.counters()
+        counters = {name: amount - before.get(name, 0) for name, amount in after.items()
+                    if amount != before.get(name, 0)}
+    return records, {'invalid_grids': invalid_grid_count() - grids, 'counters': counters}
+
+def add_counts(file_path, counts):
+    """Count again the problems found when a cached file was parsed"""
+    add_invalid_grids(counts['invalid_grids'])
+    if counts['counters'] is None:
+        instrumentation.count_unavailable(file_path)
+    else:
+        instrumentation.add_counters(counts['counters'])
+
+def load_or_parse(file_path, settings : Settings, kind, parse, rebuild=False):
+    """
+    Return the cached records for a file, parsing and caching them on a miss
+
+    Args:
+        file_path (str): Path to the log file
+        settings (Settings): Settings holding the filters and cache options
+        kind (str): 'adif', 'wspr', 'wsprnet' or 'wspr-columnar'
+        parse (callable): Function taking (file_path, settings) that parses the file
+        rebuild (bool): Ignore an existing entry and parse the file again
+
+    Returns:
+        The value returned by parse, or the cached copy of it
+    """
+    directory = cache_directory(settings)
+    key = cache_key(file_path, settings, kind)
+    columnar = kind == 'wspr-columnar'
+    path = os.path.join(directory, key if columnar else f"{key}.pkl")
+
+    if os.path.exists(path) and not rebuild:
+        try:
+            if columnar:
+                records = load_columns(path)
+                # Loading the columns converts their grid squares, which counts the invalid ones again
+                counts = dict(load_counts(path), invalid_grids=0)
+            else:
+                with open(path, 'rb') as f:
+                    counts = pickle.load(f)
+                    records = pickle.load(f)
+            os.utime(path)
+            add_counts(file_path, counts)
+            print(f"Loaded {len(records)} records from cache: {path}")
+            return records
+        except Exception as e:
+            print(f"Error loading cache entry {path}: {e}")
+            remove_entry(path)
+
+    records, counts = parse_counted(parse, file_path, settings)
+    if not records:
+        return records
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        remove_entry(path)
+        if columnar:
+            save_columns(path, records)
+            save_counts(path, counts)
+        else:
+            with open(path, 'wb') as f:
+                pickle.dump(counts, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+        evict(directory, settings.CACHE_MAX_BYTES)
+    except OSError as e:
+        print(f"Error saving cache entry {path}: {e}")
+
+    return records
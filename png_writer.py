@@ -0,0 +1,37 @@
+# png_writer.py
+"""
+Minimal PNG encoder using only zlib and struct
+"""
+
+import struct
+import zlib
+
+def png_chunk(tag, data):
+    """Return one PNG chunk: length, tag, data and CRC"""
+    return (struct.pack('>I', len(data)) + tag + data
+            + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+def png_bytes(width, height, pixels, alpha=False):
+    """
+    Encode 8-bit pixels as a PNG
+
+    Args:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        pixels (bytes): Rows of RGB, or RGBA if alpha is True, pixels from the top
+        alpha (bool): Whether the pixels carry an alpha channel
+
+    Returns:
+        bytes: The PNG file contents
+    """
+    stride = width * (4 if alpha else 3)
+    raw = bytearray()
+    for row in range(height):
+        raw.append(0)  # no filter
+        raw += pixels[row * stride:(row + 1) * stride]
+
+    color_type = 6 if alpha else 2
+    return (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+            + png_chunk(b'IDAT', zlib.compress(bytes(raw), 6))
+            + png_chunk(b'IEND', b''))
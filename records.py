@@ -0,0 +1,188 @@
+# records.py
+"""
+Compact record types for parsed contacts and spots
+
+Records keep each field once in a __slots__ attribute instead of a
+dictionary per record.  They still support the ADIF style access used
+throughout the program, record['CALL'], record.get('BAND') and
+'MY_GRIDSQUARE' in record, by mapping the ADIF names to the attributes.
+"""
+
+from datetime import datetime
+from band_plan import frequency_to_band
+
+class Record:
+    """
+    Base class giving slotted records dictionary style access
+
+    ALIASES maps the names accepted by [] to attribute names.  A field that
+    was never set is missing, as it would be from a dictionary.
+    """
+
+    __slots__ = ()
+    ALIASES = {}
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.ALIASES.get(key, key))
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, self.ALIASES.get(key, key), value)
+
+    def __contains__(self, key):
+        return hasattr(self, self.ALIASES.get(key, key))
+
+    def get(self, key, default=None):
+        return getattr(self, self.ALIASES.get(key, key), default)
+
+    def keys(self):
+        """Return the names of the fields that are set"""
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.__getstate__()!r})"
+
+class Spot(Record):
+    """
+    One ALL_WSPR.TXT spot
+
+    The transmitting station is the contact: CALL, GRIDSQUARE, LATITUDE and
+    LONGITUDE name the tx_ fields, QSO_DATE is the date as YYYYMMDD and the
+    band and datetime are derived from the frequency and date when read.
+    path_km and path_bearing are only set by geodesy.add_paths and source
+    only when several files are read.
+    """
+
+    __slots__ = ('date', 'time', 'snr', 'drift', 'frequency', 'tx_call', 'tx_grid', 'tx_lat',
+                 'tx_long', 'tx_power', 'rx_call', 'rx_grid', 'distance', 'azimuth',
+                 'path_km', 'path_bearing', 'source')
+
+    ALIASES = {
+        'CALL': 'tx_call',
+        'GRIDSQUARE': 'tx_grid',
+        'QSO_DATE': 'qso_date',
+        'TIME_ON': 'time',
+        'LATITUDE': 'tx_lat',
+        'LONGITUDE': 'tx_long',
+        'BAND': 'band',
+        'PATH_KM': 'path_km',
+        'PATH_BEARING': 'path_bearing',
+        'SOURCE': 'source',
+    }
+
+    def __init__(self, date, time, snr, drift, frequency, tx_call, tx_grid, tx_lat, tx_long,
+                 tx_power, rx_call, rx_grid, distance, azimuth):
+        self.date = date            # YYMMDD
+        self.time = time            # HHMM
+        self.snr = snr
+        self.drift = drift
+        self.frequency = frequency  # MHz
+        self.tx_call = tx_call
+        self.tx_grid = tx_grid
+        self.tx_lat = tx_lat
+        self.tx_long = tx_long
+        self.tx_power = tx_power
+        self.rx_call = rx_call
+        self.rx_grid = rx_grid
+        self.distance = distance
+        self.azimuth = azimuth
+
+    @property
+    def qso_date(self):
+        return '20' + self.date
+
+    @property
+    def band(self):
+        return frequency_to_band(self.frequency)
+
+    @property
+    def datetime(self):
+        try:
+            return datetime.strptime(self.qso_date, "%Y%m%d")
+        except ValueError:
+            return None
+
+class Contact(Record):
+    """
+    One ADIF contact
+
+    The fields used by the program have their own slot; any other ADIF
+    fields are kept in the extra dictionary, which is only created when
+    a record has such fields.
+    """
+
+    __slots__ = ('call', 'name', 'qso_date', 'time_on', 'band', 'mode', 'submode', 'freq',
+                 'gridsquare', 'my_gridsquare', 'latitude', 'longitude', 'path_km', 'path_bearing',
+                 'source', 'extra')
+
+    ALIASES = {name.upper(): name for name in __slots__ if name != 'extra'}
+
+    def __init__(self, fields=None):
+        if fields:
+            # Parsed records have upper case names, so most fields find their slot at once
+            aliases = self.ALIASES
+            extra = None
+            for key, value in fields.items():
+                attribute = aliases.get(key)
+                if attribute is None:
+                    key = key.upper()
+                    attribute = aliases.get(key)
+                if attribute is not None:
+                    setattr(self, attribute, value)
+                    continue
+                if extra is None:
+                    extra = self.extra = {}
+                extra[key] = value
+
+    def _attribute(self, key):
+        """Return the slot holding an ADIF field, None for fields kept in extra"""
+        return self.ALIASES.get(key.upper())
+
+    def __getitem__(self, key):
+        attribute = self._attribute(key)
+        if attribute is not None:
+            try:
+                return getattr(self, attribute)
+            except AttributeError:
+                raise KeyError(key) from None
+        extra = getattr(self, 'extra', None)
+        if extra is None or key.upper() not in extra:
+            raise KeyError(key)
+        return extra[key.upper()]
+
+    def __setitem__(self, key, value):
+        attribute = self._attribute(key)
+        if attribute is not None:
+            setattr(self, attribute, value)
+            return
+        extra = getattr(self, 'extra', None)
+        if extra is None:
+            extra = self.extra = {}
+        extra[key.upper()] = value
+
+    def __contains__(self, key):
+        attribute = self._attribute(key)
+        if attribute is not None:
+            return hasattr(self, attribute)
+        extra = getattr(self, 'extra', None)
+        return extra is not None and key.upper() in extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """Return the ADIF names of the fields that are set"""
+        names = [name.upper() for name in self.__slots__ if name != 'extra' and hasattr(self, name)]
+        return names + list(getattr(self, 'extra', None) or ())
@@ -20,12 +20,24 @@ class Settings:
         self.AUTO_OPEN_MAP = True
         self.OPERATOR_GRIDSQUARE = ""  # Optional: can be set if not found in ADIF
         self.IS_WSPR = False
+        self.CACHE_DIRECTORY = ""  # Defaults to OUTPUT_DIRECTORY with a _cache suffix
+        self.CACHE_MAX_BYTES = 1024 * 1024 * 1024
+        self.STATIC_MAP_WIDTH = 1440  # Size in pixels of maps made with --render static
+        self.STATIC_MAP_HEIGHT = 720
+        self.DEDUP_WINDOW_MINUTES = 10  # Minutes in which --dedup looks for duplicates
+        self.LOG_DATABASE = "log_store.sqlite"  # SQLite file used by the ingest and map commands
+        self.SERVE_POLL_SECONDS = 2  # Seconds between checks of the logs tailed by --serve
         
         # Load settings from file if it exists
         self.load_settings()
         self.start_date = None
         self.end_date = None
         self.band = None
+        self.mode = None
+        self.call = None
+        self.record_filter = None
+        self.heatmap = None
+        self.heatmap_hours = None
     
     def load_settings(self):
         """Load settings from settings.json file if it exists"""
@@ -57,7 +69,14 @@ class Settings:
                 "GOOGLE_MAPS_API_KEY": self.GOOGLE_MAPS_API_KEY,
                 "DEFAULT_MAP_TYPE": self.DEFAULT_MAP_TYPE,
                 "AUTO_OPEN_MAP": self.AUTO_OPEN_MAP,
-                "OPERATOR_GRIDSQUARE": self.OPERATOR_GRIDSQUARE
+                "OPERATOR_GRIDSQUARE": self.OPERATOR_GRIDSQUARE,
+                "CACHE_DIRECTORY": self.CACHE_DIRECTORY,
+                "CACHE_MAX_BYTES": self.CACHE_MAX_BYTES,
+                "STATIC_MAP_WIDTH": self.STATIC_MAP_WIDTH,
+                "STATIC_MAP_HEIGHT": self.STATIC_MAP_HEIGHT,
+                "DEDUP_WINDOW_MINUTES": self.DEDUP_WINDOW_MINUTES,
+                "LOG_DATABASE": self.LOG_DATABASE,
+                "SERVE_POLL_SECONDS": self.SERVE_POLL_SECONDS
             }
             
             # Write to file
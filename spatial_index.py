@@ -0,0 +1,153 @@
+# spatial_index.py
+"""
+Module for finding the aggregated groups inside a map viewport
+
+The groups of each aggregation level are kept in Maidenhead tiles one step
+coarser than the groups: subsquare groups by square, square groups by
+field, and field groups in a single tile covering the world.  Each tile
+keeps the sum of its groups' contacts, so the contacts in a viewport are
+counted from the tiles it covers, and only the groups of the tiles on its
+edges are checked one by one.  The map page computes the same tile keys
+to fetch only the tiles it has not loaded yet.
+"""
+
+import math
+
+from aggregation import LEVELS
+
+# Width and height in degrees of the tiles holding the groups of each level
+TILE_SIZES = {2: (360, 180), 4: (20, 10), 6: (2, 1)}
+
+def tile_index(value, offset, size, count):
+    """Return the column or row of a longitude or latitude, kept on the map"""
+    return min(max(math.floor((value + offset) / size), 0), count - 1)
+
+def tile_name(level, column, row):
+    """Return the key of a tile: '' for the world, a field or a square"""
+    if level == 2:
+        return ""
+    if level == 4:
+        return chr(ord('A') + column) + chr(ord('A') + row)
+    return chr(ord('A') + column // 10) + chr(ord('A') + row // 10) + str(column % 10) + str(row % 10)
+
+def tile_keys(level, south, west, north, east):
+    """
+    Return the keys of the tiles a viewport overlaps
+
+    A viewport whose west edge is east of its east edge crosses the
+    antimeridian and is taken as two ranges of longitude.
+
+    Returns:
+        list: (key, west, east) of each tile, with the range of longitude of
+        the viewport it is in
+    """
+    width, height = TILE_SIZES[level]
+    columns, rows = 360 // width, 180 // height
+    ranges = [(west, east)] if west <= east else [(west, 180), (-180, east)]
+    first_row, last_row = tile_index(south, 90, height, rows), tile_index(north, 90, height, rows)
+    keys = []
+    for range_west, range_east in ranges:
+        for column in range(tile_index(range_west, 180, width, columns), tile_index(range_east, 180, width, columns) + 1):
+            for row in range(first_row, last_row + 1):
+                keys.append((tile_name(level, column, row), range_west, range_east))
+    return keys
+
+class Tile:
+    """The groups of one level whose position falls in one tile"""
+
+    __slots__ = ('south', 'west', 'north', 'east', 'positions', 'contacts')
+
+    def __init__(self, south, west, north, east):
+        self.south = south
+        self.west = west
+        self.north = north
+        self.east = east
+        self.positions = []
+        self.contacts = 0
+
+class ViewportIndex:
+    """Tiles of the groups of every level, updated as groups are added and grow"""
+
+    def __init__(self):
+        self.tiles = {level: {} for level in LEVELS}
+        # Groups of each level by position, and the contacts each had when last seen
+        self.groups = {level: [] for level in LEVELS}
+        self.counts = {level: [] for level in LEVELS}
+        self.bounds = None
+
+    def update(self, level, position, group):
+        """
+        Add a new group, or take in the contacts a known group gained
+
+        Groups must be added in the order of their positions.
+        """
+        counts = self.counts[level]
+        if position < len(counts):
+            self.tile_of(level, group).contacts += group.count - counts[position]
+            counts[position] = group.count
+            return
+
+        tile = self.tile_of(level, group)
+        tile.positions.append(position)
+        tile.contacts += group.count
+        self.groups[level].append(group)
+        counts.append(group.count)
+
+        # The finest level holds every location, so its groups give the bounds of the map
+        if level == LEVELS[-1]:
+            if self.bounds is None:
+                self.bounds = [group.latitude, group.longitude, group.latitude, group.longitude]
+            else:
+                south, west, north, east = self.bounds
+                self.bounds = [min(south, group.latitude), min(west, group.longitude),
+                               max(north, group.latitude), max(east, group.longitude)]
+
+    def tile_of(self, level, group):
+        """Return the tile of a group, created when it is the first one there"""
+        width, height = TILE_SIZES[level]
+        column = tile_index(group.longitude, 180, width, 360 // width)
+        row = tile_index(group.latitude, 90, height, 180 // height)
+        key = tile_name(level, column, row)
+        tile = self.tiles[level].get(key)
+        if tile is None:
+            west, south = column * width - 180, row * height - 90
+            tile = self.tiles[level][key] = Tile(south, west, south + height, west + width)
+        return tile
+
+    def tile_groups(self, level, keys):
+        """
+        Return the groups of some tiles
+
+        Returns:
+            dict: key -> list of (position, GridGroup), for the tiles that hold any
+        """
+        tiles = self.tiles[level]
+        groups = self.groups[level]
+        return {key: [(position, groups[position]) for position in tiles[key].positions]
+                for key in keys if key in tiles}
+
+    def count(self, level, south, west, north, east):
+        """
+        Count the groups and contacts whose position is inside a viewport
+
+        Returns:
+            tuple: (groups, contacts)
+        """
+        tiles = self.tiles[level]
+        groups = self.groups[level]
+        locations = contacts = 0
+        for key, range_west, range_east in tile_keys(level, south, west, north, east):
+            tile = tiles.get(key)
+            if tile is None:
+                continue
+            if south <= tile.south and tile.north <= north and range_west <= tile.west and tile.east <= range_east:
+                locations += len(tile.positions)
+                contacts += tile.contacts
+                continue
+            # A tile on the edge of the viewport is counted group by group
+            for position in tile.positions:
+                group = groups[position]
+                if south <= group.latitude <= north and range_west <= group.longitude <= range_east:
+                    locations += 1
+                    contacts += group.count
+        return locations, contacts
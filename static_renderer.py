@@ -0,0 +1,408 @@
+# static_renderer.py
+"""
+Offline renderer that draws contacts on a static world map
+
+Contacts are projected onto an equirectangular image over the bundled
+coastline and written as a PNG or an SVG, without a browser or network
+access.  Spots are reduced to one per pixel and paths to one per
+PATH_CELL_PIXELS cell before drawing, so the time spent drawing and the
+memory used depend on the image size rather than on the number of spots.
+"""
+
+import math
+import os
+import webbrowser
+from datetime import datetime
+from coastline import COASTLINE
+from heatmap import ALL_BANDS, bin_spots, data_uri, heat_color, heatmap_png
+from maps_interface import operator_location
+from png_writer import png_bytes
+from utils import band_color
+from wspr_columnar import WsprColumns
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+OCEAN_COLOR = "#1b2a3a"
+LAND_COLOR = "#3b4a3b"
+COAST_COLOR = "#5d705d"
+OPERATOR_COLOR = "#0000ff"
+
+# Paths are drawn to one spot in each square of this many pixels
+PATH_CELL_PIXELS = 8
+
+# Length in degrees of the straight segments approximating a great circle
+PATH_STEP_DEGREES = 2
+
+# Half the side of the square drawn for each spot in the PNG
+POINT_RADIUS = 1
+
+def rgb(color):
+    """Convert a #rrggbb color to 3 bytes"""
+    return bytes.fromhex(color.lstrip('#'))
+
+def to_pixel(latitude, longitude, width, height):
+    """Project a coordinate onto the image, returning float pixel coordinates"""
+    return (longitude + 180.0) * width / 360.0, (90.0 - latitude) * height / 180.0
+
+def pixel_index(latitude, longitude, width, height):
+    """Return the index (y * width + x) of the pixel holding a coordinate"""
+    x, y = to_pixel(latitude, longitude, width, height)
+    x = min(max(int(x), 0), width - 1)
+    y = min(max(int(y), 0), height - 1)
+    return y * width + x
+
+def collect_points(contacts, width, height):
+    """
+    Reduce the contacts to the band of the last one drawn on each pixel
+
+    Args:
+        contacts (list): Contacts with LATITUDE and LONGITUDE, or WsprColumns
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+
+    Returns:
+        dict: pixel index -> band, holding at most width * height entries
+    """
+    if isinstance(contacts, WsprColumns):
+        valid = ~np.isnan(contacts.tx_lat)
+        lat = contacts.tx_lat[valid]
+        lon = contacts.tx_lon[valid]
+        bands = contacts.band[valid]
+        x = np.clip(((lon + 180.0) * width / 360.0).astype(np.int64), 0, width - 1)
+        y = np.clip(((90.0 - lat) * height / 180.0).astype(np.int64), 0, height - 1)
+        pixels = y * width + x
+        # First occurrence in the reversed order is the last spot on each pixel
+        unique, first = np.unique(pixels[::-1], return_index=True)
+        last = len(pixels) - 1 - first
+        return {int(pixel): contacts.bands[bands[index]] for pixel, index in zip(unique, last)}
+
+    points = {}
+    for contact in contacts:
+        latitude = contact.get('LATITUDE')
+        longitude = contact.get('LONGITUDE')
+        if latitude is None or longitude is None or latitude == '' or longitude == '':
+            continue
+        points[pixel_index(float(latitude), float(longitude), width, height)] = contact.get('BAND') or ''
+    return points
+
+def path_destinations(points, width, height):
+    """
+    Pick one spot in each PATH_CELL_PIXELS square to draw a path to
+
+    Returns:
+        list: (latitude, longitude, band) of the center of each chosen pixel
+    """
+    cells = {}
+    for pixel, band in points.items():
+        x, y = pixel % width, pixel // width
+        cells.setdefault((x // PATH_CELL_PIXELS, y // PATH_CELL_PIXELS), (x, y, band))
+
+    destinations = []
+    for x, y, band in cells.values():
+        latitude = 90.0 - (y + 0.5) * 180.0 / height
+        longitude = (x + 0.5) * 360.0 / width - 180.0
+        destinations.append((latitude, longitude, band))
+    return destinations
+
+def great_circle(lat1, lon1, lat2, lon2):
+    """
+    Interpolate the great circle between two coordinates
+
+    Returns:
+        list: (latitude, longitude) every PATH_STEP_DEGREES along the path
+    """
+    phi1, lambda1, phi2, lambda2 = (math.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = (math.cos(phi1) * math.cos(lambda1), math.cos(phi1) * math.sin(lambda1), math.sin(phi1))
+    b = (math.cos(phi2) * math.cos(lambda2), math.cos(phi2) * math.sin(lambda2), math.sin(phi2))
+    angle = math.acos(max(-1.0, min(1.0, sum(p * q for p, q in zip(a, b)))))
+    sin_angle = math.sin(angle)
+    if sin_angle < 1e-9:
+        # Same or antipodal points, there is no single great circle to follow
+        return [(lat1, lon1), (lat2, lon2)]
+
+    steps = max(1, int(math.degrees(angle) / PATH_STEP_DEGREES))
+    path = []
+    for step in range(steps + 1):
+        fraction = step / steps
+        f1 = math.sin((1 - fraction) * angle) / sin_angle
+        f2 = math.sin(fraction * angle) / sin_angle
+        x, y, z = (f1 * p + f2 * q for p, q in zip(a, b))
+        path.append((math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))))
+    return path
+
+def projected_path(path, width, height):
+    """
+    Project a path onto the image, splitting it where it crosses the date line
+
+    Returns:
+        list: Lists of (x, y) float pixel coordinates
+    """
+    pieces = []
+    piece = []
+    previous_x = None
+    for latitude, longitude in path:
+        x, y = to_pixel(latitude, longitude, width, height)
+        if previous_x is not None and abs(x - previous_x) > width / 2:
+            pieces.append(piece)
+            piece = []
+        piece.append((x, y))
+        previous_x = x
+    pieces.append(piece)
+    return [piece for piece in pieces if len(piece) > 1]
+
+class Raster:
+    """RGB image held as a bytearray of width * height * 3 bytes"""
+
+    def __init__(self, width, height, color):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(rgb(color) * (width * height))
+
+    def set_pixel(self, x, y, color):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            offset = (y * self.width + x) * 3
+            self.pixels[offset:offset + 3] = color
+
+    def draw_line(self, x0, y0, x1, y1, color):
+        """Draw a one pixel line with Bresenham's algorithm"""
+        x0, y0, x1, y1 = int(x0), int(y0), int(x1), int(y1)
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        error = dx + dy
+        while True:
+            self.set_pixel(x0, y0, color)
+            if x0 == x1 and y0 == y1:
+                break
+            doubled = 2 * error
+            if doubled >= dy:
+                error += dy
+                x0 += sx
+            if doubled <= dx:
+                error += dx
+                y0 += sy
+
+    def draw_polyline(self, points, color):
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            self.draw_line(x0, y0, x1, y1, color)
+
+    def draw_segments(self, segments, color):
+        """
+        Draw many one pixel lines of the same color
+
+        With NumPy the pixels of every segment are interpolated in one
+        vectorized pass, otherwise each segment is drawn with draw_line.
+
+        Args:
+            segments (list): (x0, y0, x1, y1) float pixel coordinates
+            color (bytes): RGB color
+        """
+        if np is None:
+            for x0, y0, x1, y1 in segments:
+                self.draw_line(x0, y0, x1, y1, color)
+            return
+        if not segments:
+            return
+
+        x0, y0, x1, y1 = np.array(segments, dtype=np.float64).T
+        dx = x1 - x0
+        dy = y1 - y0
+        lengths = np.maximum(np.abs(dx), np.abs(dy)).astype(np.int64) + 1
+        segment = np.repeat(np.arange(len(lengths)), lengths)
+        step = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        fraction = step / np.maximum(lengths - 1, 1)[segment]
+        x = (x0[segment] + dx[segment] * fraction).astype(np.int64)
+        y = (y0[segment] + dy[segment] * fraction).astype(np.int64)
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        image = np.frombuffer(self.pixels, dtype=np.uint8).reshape(self.height, self.width, 3)
+        image[y[inside], x[inside]] = np.frombuffer(color, dtype=np.uint8)
+
+    def fill_polygon(self, points, color):
+        """Fill a polygon given in float pixel coordinates with a scanline pass"""
+        edges = list(zip(points, points[1:] + points[:1]))
+        ys = [y for _, y in points]
+        top = max(0, int(min(ys)))
+        bottom = min(self.height - 1, int(max(ys)))
+        for row in range(top, bottom + 1):
+            center = row + 0.5
+            crossings = sorted(x0 + (center - y0) * (x1 - x0) / (y1 - y0)
+                               for (x0, y0), (x1, y1) in edges if (y0 <= center) != (y1 <= center))
+            for left, right in zip(crossings[::2], crossings[1::2]):
+                start = max(0, int(round(left)))
+                end = min(self.width, int(round(right)))
+                if end > start:
+                    offset = row * self.width
+                    self.pixels[(offset + start) * 3:(offset + end) * 3] = color * (end - start)
+
+    def draw_point(self, x, y, radius, color):
+        """Draw a filled square of side 2 * radius + 1 centered on a pixel"""
+        for row in range(max(0, y - radius), min(self.height, y + radius + 1)):
+            start = max(0, x - radius)
+            end = min(self.width, x + radius + 1)
+            offset = row * self.width
+            self.pixels[(offset + start) * 3:(offset + end) * 3] = color * (end - start)
+
+    def write_png(self, path):
+        """Write the image as an 8-bit RGB PNG"""
+        with open(path, 'wb') as f:
+            f.write(png_bytes(self.width, self.height, self.pixels))
+
+def draw_heatmap(raster, heatmap, weight):
+    """Blend the heatmap cells that hold spots over the image"""
+    width = raster.width
+    height = raster.height
+    for cell, value in heatmap.values(weight).items():
+        red, green, blue, alpha = heat_color(value)
+        row, column = divmod(cell, heatmap.columns)
+        x0 = column * width // heatmap.columns
+        x1 = max(x0 + 1, (column + 1) * width // heatmap.columns)
+        y0 = row * height // heatmap.rows
+        y1 = max(y0 + 1, (row + 1) * height // heatmap.rows)
+        for y in range(y0, min(y1, height)):
+            for x in range(x0, min(x1, width)):
+                offset = (y * width + x) * 3
+                old_red, old_green, old_blue = raster.pixels[offset:offset + 3]
+                raster.pixels[offset:offset + 3] = bytes((
+                    (red * alpha + old_red * (255 - alpha)) // 255,
+                    (green * alpha + old_green * (255 - alpha)) // 255,
+                    (blue * alpha + old_blue * (255 - alpha)) // 255))
+
+def render_png(path, points, destinations, operator, width, height, heatmap=None, weight='count'):
+    """Draw the coastline, paths and the spots or their heatmap into a PNG file"""
+    raster = Raster(width, height, OCEAN_COLOR)
+    land = rgb(LAND_COLOR)
+    coast = rgb(COAST_COLOR)
+    for outline in COASTLINE:
+        projected = [to_pixel(lat, lon, width, height) for lon, lat in outline]
+        raster.fill_polygon(projected, land)
+        raster.draw_polyline(projected, coast)
+
+    colors = {}
+    if operator is not None:
+        segments = {}
+        for latitude, longitude, band in destinations:
+            band_segments = segments.setdefault(band, [])
+            for piece in projected_path(great_circle(operator[0], operator[1], latitude, longitude), width, height):
+                band_segments.extend((x0, y0, x1, y1) for (x0, y0), (x1, y1) in zip(piece, piece[1:]))
+        for band, band_segments in segments.items():
+            raster.draw_segments(band_segments, colors.setdefault(band, rgb(band_color(band))))
+
+    # The heatmap takes the place of the individual spots
+    if heatmap is not None:
+        draw_heatmap(raster, heatmap, weight)
+    else:
+        for pixel, band in points.items():
+            color = colors.setdefault(band, rgb(band_color(band)))
+            raster.draw_point(pixel % width, pixel // width, POINT_RADIUS, color)
+
+    if operator is not None:
+        x, y = to_pixel(operator[0], operator[1], width, height)
+        raster.draw_point(int(x), int(y), POINT_RADIUS + 2, rgb("#ffffff"))
+        raster.draw_point(int(x), int(y), POINT_RADIUS + 1, rgb(OPERATOR_COLOR))
+
+    raster.write_png(path)
+
+def svg_points(points):
+    """Format float pixel coordinates for an SVG points attribute"""
+    return ' '.join(f"{x:.1f},{y:.1f}" for x, y in points)
+
+def render_svg(path, points, destinations, operator, width, height, heatmap=None, weight='count'):
+    """Write the coastline, paths, the spots or their heatmap and a band legend as an SVG file"""
+    by_band = {}
+    for pixel, band in points.items():
+        by_band.setdefault(band, []).append(pixel)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                f'viewBox="0 0 {width} {height}">\n')
+        f.write(f'<rect width="{width}" height="{height}" fill="{OCEAN_COLOR}"/>\n')
+
+        f.write(f'<g fill="{LAND_COLOR}" stroke="{COAST_COLOR}" stroke-width="0.5">\n')
+        for outline in COASTLINE:
+            projected = [to_pixel(lat, lon, width, height) for lon, lat in outline]
+            f.write(f'<polygon points="{svg_points(projected)}"/>\n')
+        f.write('</g>\n')
+
+        if operator is not None:
+            paths = {}
+            for latitude, longitude, band in destinations:
+                paths.setdefault(band, []).extend(
+                    projected_path(great_circle(operator[0], operator[1], latitude, longitude), width, height))
+            for band, pieces in paths.items():
+                f.write(f'<g fill="none" stroke="{band_color(band)}" stroke-width="0.6" stroke-opacity="0.5">\n')
+                for piece in pieces:
+                    f.write(f'<polyline points="{svg_points(piece)}"/>\n')
+                f.write('</g>\n')
+
+        # The heatmap takes the place of the individual spots
+        if heatmap is not None:
+            f.write(f'<image href="{data_uri(heatmap_png(heatmap, weight))}" x="0" y="0" '
+                    f'width="{width}" height="{height}" preserveAspectRatio="none" '
+                    f'style="image-rendering:pixelated"/>\n')
+        else:
+            for band, pixels in by_band.items():
+                f.write(f'<g fill="{band_color(band)}">\n')
+                for pixel in pixels:
+                    f.write(f'<circle cx="{pixel % width + 0.5}" cy="{pixel // width + 0.5}" r="1.5"/>\n')
+                f.write('</g>\n')
+
+        if operator is not None:
+            x, y = to_pixel(operator[0], operator[1], width, height)
+            f.write(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="4" fill="{OPERATOR_COLOR}" stroke="#ffffff"/>\n')
+
+        # Legend of the bands on the map
+        bands = sorted(band for band in by_band if band)
+        f.write(f'<g font-family="sans-serif" font-size="12" fill="#ffffff">\n')
+        for i, band in enumerate(bands):
+            y = height - 16 * (len(bands) - i) - 4
+            f.write(f'<rect x="8" y="{y}" width="10" height="10" fill="{band_color(band)}"/>'
+                    f'<text x="24" y="{y + 10}">{band}</text>\n')
+        f.write('</g>\n')
+        f.write('</svg>\n')
+
+def render_static_map(contacts, settings, image_format='png'):
+    """
+    Render the contacts and their paths to a static PNG or SVG world map
+
+    Args:
+        contacts (list): List of contacts with lat/long coordinates, or WsprColumns
+        settings (Settings): Settings object with the output directory and image size
+        image_format (str): 'png' or 'svg'
+
+    Returns:
+        str: Path to the generated image file
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = settings.OUTPUT_DIRECTORY
+    os.makedirs(output_dir, exist_ok=True)
+    image_file = os.path.join(output_dir, f"ham_contacts_map_{timestamp}.{image_format}")
+
+    width = int(settings.STATIC_MAP_WIDTH)
+    height = int(settings.STATIC_MAP_HEIGHT)
+
+    _, operator_lat, operator_lon = operator_location(contacts, settings)
+    operator = None
+    if operator_lat is not None and operator_lon is not None:
+        operator = (operator_lat, operator_lon)
+
+    points = collect_points(contacts, width, height)
+    destinations = path_destinations(points, width, height)
+
+    heatmap = None
+    if settings.heatmap:
+        heatmap = bin_spots(contacts, settings.heatmap_hours, by_band=False)[ALL_BANDS]
+
+    if image_format == 'svg':
+        render_svg(image_file, points, destinations, operator, width, height, heatmap, settings.heatmap)
+    else:
+        render_png(image_file, points, destinations, operator, width, height, heatmap, settings.heatmap)
+
+    # Open the file in the default browser if auto-open is enabled
+    if settings.AUTO_OPEN_MAP:
+        webbrowser.open('file://' + os.path.abspath(image_file))
+
+    return image_file
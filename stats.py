@@ -0,0 +1,329 @@
+# stats.py
+"""
+Module for single pass statistics over WSPR spots and ADIF contacts
+
+Records are streamed once through constant memory accumulators: running
+(Welford) mean and variance for SNR and drift, a fixed bin histogram for
+distance percentiles and a HyperLogLog sketch for the number of distinct
+stations.  Totals are kept for the whole log and per band, UTC hour, grid
+square and callsign, and written as JSON or CSV.
+"""
+
+import csv
+import hashlib
+import json
+import math
+from wspr_columnar import WsprColumns
+
+# Groupings reported besides the totals
+DIMENSIONS = ('band', 'hour', 'grid', 'call')
+
+# Width in km of the distance histogram bins used for percentiles
+DISTANCE_BIN_KM = 50
+
+PERCENTILES = (10, 50, 90, 99)
+
+# HyperLogLog uses 2 ** HLL_PRECISION registers, about 3% error at 10
+HLL_PRECISION = 10
+
+# Distinct hashes kept exactly before a sketch switches to registers
+HLL_SPARSE_LIMIT = 64
+
+# Rows converted at a time when reading WsprColumns
+COLUMN_CHUNK = 1 << 16
+
+class RunningStats:
+    """Count, minimum, maximum, mean and variance updated one value at a time (Welford)"""
+
+    __slots__ = ('count', 'mean', 'm2', 'minimum', 'maximum')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def stddev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        if not self.count:
+            return None
+        return {'min': round(self.minimum, 2), 'mean': round(self.mean, 2),
+                'max': round(self.maximum, 2), 'stddev': round(self.stddev(), 2)}
+
+class Histogram:
+    """
+    Approximate quantiles from counts in fixed width bins
+
+    Only bins holding values are stored, so the memory is bounded by the
+    value range divided by the bin width.
+    """
+
+    __slots__ = ('bin_width', 'bins', 'count')
+
+    def __init__(self, bin_width):
+        self.bin_width = bin_width
+        self.bins = {}
+        self.count = 0
+
+    def add(self, value):
+        index = int(value // self.bin_width)
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+
+    def quantile(self, fraction):
+        """Return the middle of the bin holding the given fraction of the values"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen >= target:
+                return (index + 0.5) * self.bin_width
+        return (max(self.bins) + 0.5) * self.bin_width
+
+class HyperLogLog:
+    """
+    Approximate count of distinct values
+
+    Small sets are counted exactly from their hashes; past HLL_SPARSE_LIMIT
+    the hashes are folded into 2 ** HLL_PRECISION one byte registers.
+    """
+
+    __slots__ = ('hashes', 'registers')
+
+    def __init__(self):
+        self.hashes = set()
+        self.registers = None
+
+    def add(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        if self.registers is None:
+            self.hashes.add(hashed)
+            if len(self.hashes) > HLL_SPARSE_LIMIT:
+                self.registers = bytearray(1 << HLL_PRECISION)
+                for hashed in self.hashes:
+                    self._add_hash(hashed)
+                self.hashes = None
+        else:
+            self._add_hash(hashed)
+
+    def _add_hash(self, hashed):
+        remaining_bits = 64 - HLL_PRECISION
+        index = hashed >> remaining_bits
+        rest = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        if self.registers is None:
+            return len(self.hashes)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class GroupStats:
+    """Accumulators for one group of records"""
+
+    __slots__ = ('count', 'snr', 'drift', 'distance', 'distances', 'stations')
+
+    def __init__(self):
+        self.count = 0
+        self.snr = RunningStats()
+        self.drift = RunningStats()
+        self.distance = RunningStats()
+        self.distances = Histogram(DISTANCE_BIN_KM)
+        self.stations = HyperLogLog()
+
+    def add(self, snr, drift, distance, station):
+        self.count += 1
+        if snr is not None:
+            self.snr.add(snr)
+        if drift is not None:
+            self.drift.add(drift)
+        if distance is not None:
+            self.distance.add(distance)
+            self.distances.add(distance)
+        if station:
+            self.stations.add(station)
+
+    def to_dict(self):
+        distance = self.distance.to_dict()
+        if distance is not None:
+            for percentile in PERCENTILES:
+                distance[f'p{percentile}'] = self.distances.quantile(percentile / 100)
+        return {
+            'count': self.count,
+            'snr': self.snr.to_dict(),
+            'drift': self.drift.to_dict(),
+            'distance': distance,
+            'unique_stations': self.stations.estimate(),
+        }
+
+class LogStats:
+    """Totals and per band, hour, grid and callsign groups of a log"""
+
+    def __init__(self):
+        self.total = GroupStats()
+        self.groups = {dimension: {} for dimension in DIMENSIONS}
+
+    def add(self, band, hour, grid, call, snr, drift, distance, station):
+        """Add one record, given as the values returned by observations"""
+        self.total.add(snr, drift, distance, station)
+        for dimension, key in zip(DIMENSIONS, (band, hour, grid, call)):
+            groups = self.groups[dimension]
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = GroupStats()
+            group.add(snr, drift, distance, station)
+
+    def to_dict(self):
+        result = {'total': self.total.to_dict()}
+        for dimension, groups in self.groups.items():
+            result[dimension] = {key: groups[key].to_dict() for key in sorted(groups)}
+        return result
+
+def report_snr(record):
+    """
+    Return the SNR of a record in dB, or None
+
+    Spots carry their SNR; for ADIF contacts the sent report is used when it
+    is a signed dB report such as -08 or +11, as written for digital modes.
+    """
+    snr = record.get('snr')
+    if snr is not None:
+        return snr
+    report = (record.get('RST_SENT') or '').strip()
+    if report[:1] in ('+', '-') and report[1:].isdigit():
+        return int(report)
+    return None
+
+def to_number(value):
+    """Convert a field to float, None when it is missing or not a number"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def record_distance(record):
+    """Return the distance of a record in km, from geodesy.add_paths or else the ADIF DISTANCE field"""
+    path_km = record.get('path_km')
+    if path_km is not None:
+        return path_km
+    return to_number(record.get('DISTANCE'))
+
+def observations(records):
+    """
+    Yield the values used by the statistics for each record
+
+    Args:
+        records: Iterable of Spot or Contact records, or WsprColumns
+
+    Yields:
+        tuple: (band, hour, grid, call, snr, drift, distance, station) where
+        grid is the 4 character square and station is the reporter of a
+        spot or the call of a contact
+    """
+    if isinstance(records, WsprColumns):
+        for first in range(0, len(records), COLUMN_CHUNK):
+            part = slice(first, first + COLUMN_CHUNK)
+            bands = [records.bands[code] for code in records.band[part].tolist()]
+            hours = [f"{time // 100:02d}" for time in records.time[part].tolist()]
+            # Grids without coordinates are invalid, as parse_wspr_line leaves them blank
+            grids = [records.grids[code][:4].upper() if not math.isnan(latitude) else ''
+                     for code, latitude in zip(records.tx_grid[part].tolist(), records.tx_lat[part].tolist())]
+            calls = [records.calls[code] for code in records.tx_call[part].tolist()]
+            stations = [records.calls[code] for code in records.rx_call[part].tolist()]
+            # Distances come from geodesy.add_paths, None where a grid is invalid
+            path_km = getattr(records, 'path_km', None)
+            if path_km is not None:
+                distances = [None if math.isnan(km) else round(km, 1) for km in path_km[part].tolist()]
+            else:
+                distances = [None] * len(bands)
+            yield from zip(bands, hours, grids, calls, records.snr[part].tolist(),
+                           records.drift[part].tolist(), distances, stations)
+        return
+
+    for record in records:
+        time_on = record.get('TIME_ON') or ''
+        hour = time_on[:2] if time_on[:2].isdigit() else ''
+        station = record.get('rx_call') if 'rx_call' in record else record.get('CALL')
+        yield ((record.get('BAND') or '').lower(), hour, (record.get('GRIDSQUARE') or '')[:4].upper(),
+               record.get('CALL') or '', report_snr(record), to_number(record.get('drift')),
+               record_distance(record), station)
+
+def compute_stats(records):
+    """
+    Compute the statistics of a log in one pass
+
+    Args:
+        records: Iterable of Spot or Contact records, such as the generators
+            from iter_wspr_file or iter_adif_file, or WsprColumns
+
+    Returns:
+        LogStats: The accumulated statistics
+    """
+    stats = LogStats()
+    for observation in observations(records):
+        stats.add(*observation)
+    return stats
+
+# Columns of the CSV output, one row per group
+CSV_COLUMNS = (['dimension', 'key', 'count']
+               + [f'snr_{name}' for name in ('min', 'mean', 'max', 'stddev')]
+               + [f'drift_{name}' for name in ('min', 'mean', 'max', 'stddev')]
+               + [f'distance_{name}' for name in ('min', 'mean', 'max', 'stddev')]
+               + [f'distance_p{percentile}' for percentile in PERCENTILES]
+               + ['unique_stations'])
+
+def csv_row(dimension, key, group):
+    """Flatten the dictionary of one group into a CSV row"""
+    row = {'dimension': dimension, 'key': key, 'count': group['count'],
+           'unique_stations': group['unique_stations']}
+    for name in ('snr', 'drift', 'distance'):
+        for field, value in (group[name] or {}).items():
+            row[f'{name}_{field}'] = value
+    return row
+
+def write_stats(stats, path):
+    """
+    Write the statistics as CSV if path ends in .csv, otherwise as JSON
+
+    Args:
+        stats (LogStats): The statistics to write
+        path (str): Output file path
+    """
+    result = stats.to_dict()
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            writer.writerow(csv_row('total', '', result['total']))
+            for dimension in DIMENSIONS:
+                for key, group in result[dimension].items():
+                    writer.writerow(csv_row(dimension, key, group))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,48 @@
+# test_worker_counts.py
+"""
+Check that the problems counted while parsing several files in worker
+processes reach the totals of the run, as when the files are parsed in turn
+"""
+
+import os
+import sys
+from argparse import Namespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grid_converter import clear_grid_cache, invalid_grid_count
+from settings import Settings
+from main import do_files_processing
+import instrumentation
+
+SPOT = "250414 1844 -12  0.11  14.0970656  K5SWA EM10 37          0  0.53  1  1    0  0   1     1   599\n"
+BAD_GRID = "250414 1846 -10  0.10  14.0970700  K1ABC ZZ99 37          0  0.53  1  1    0  0   1     1   599\n"
+MALFORMED = "250414 1848 garbage\n"
+
+def write_logs(directory):
+    """Write three small WSPR logs, each with malformed lines and invalid grids"""
+    paths = []
+    for number in range(3):
+        path = os.path.join(directory, f"ALL_WSPR_{number}.TXT")
+        with open(path, 'w') as f:
+            f.write(SPOT * 5 + BAD_GRID * (number + 1) + MALFORMED * (number + 2))
+        paths.append(path)
+    return paths
+
+def counts(paths, workers):
+    """Parse the logs and return the malformed line and invalid grid counts"""
+    args = Namespace(columnar=False, incremental=False, no_cache=True, rebuild_cache=False, workers=workers)
+    clear_grid_cache()
+    instrumentation.start()
+    try:
+        records = do_files_processing(paths, 'wspr', args, Settings())
+        counters = instrumentation.counters()
+        return len(records), counters.get('malformed_lines'), invalid_grid_count()
+    finally:
+        instrumentation.finish(os.devnull)
+
+def test_worker_counts_match_serial(tmp_path):
+    paths = write_logs(str(tmp_path))
+    serial = counts(paths, 1)
+    assert serial == (21, 9, 6)
+    assert counts(paths, 2) == serial
@@ -0,0 +1,253 @@
+# time_index.py
+"""
+Sparse time index for time-ordered WSPR and ADIF files
+
+The index holds the byte offset of the first record of every date and is
+saved next to the log file as <file>.idx.  It is built during a full pass
+over the file.  Date-bounded runs use it to read only the byte range that
+can hold the requested dates; files without an index are searched by
+bisecting over raw file offsets instead.
+"""
+
+import hashlib
+import json
+import os
+import re
+from bisect import bisect_left, bisect_right
+from file_ranges import next_line_start, next_record_start
+from compression import is_compressed
+
+# Bumped whenever the index layout changes
+INDEX_VERSION = 1
+
+# Number of bytes at the start of the file used to recognise it
+HEAD_BYTES = 4096
+
+# Bisection stops once the remaining byte range is this small
+BISECT_MIN_BYTES = 64 * 1024
+
+# Bytes read at a time while looking for a dated record
+READ_SIZE = 16 * 1024
+
+QSO_DATE_PATTERN = re.compile(rb'<qso_date:\d+(?::[a-z])?>\s*(\d{8})', re.IGNORECASE)
+
+def index_path(file_path):
+    """Return the path of the index stored alongside the file"""
+    return file_path + ".idx"
+
+def head_hash(file):
+    """Return a hash of the first bytes of an open binary file"""
+    file.seek(0)
+    return hashlib.sha1(file.read(HEAD_BYTES)).hexdigest()
+
+class TimeIndexBuilder:
+    """Collect the offset of the first record of each date during a full pass"""
+
+    def __init__(self):
+        self.dates = []
+        self.offsets = []
+        self.ordered = True
+        self._last_prefix = None
+
+    def add(self, date, offset):
+        """
+        Record the date of the record starting at offset
+
+        Args:
+            date (str): YYYYMMDD date of the record
+            offset (int): Byte offset where the record starts
+        """
+        if self.dates:
+            if date == self.dates[-1]:
+                return
+            if date < self.dates[-1]:
+                # The file is not in time order, so the index cannot be used
+                self.ordered = False
+                return
+        self.dates.append(date)
+        self.offsets.append(offset)
+
+    def add_wspr_line(self, line, offset):
+        """Record the date of an ALL_WSPR.TXT line given as bytes"""
+        prefix = line[:7]
+        if prefix == self._last_prefix:
+            return
+        if prefix[6:7] == b' ' and prefix[:6].isdigit():
+            self._last_prefix = prefix
+            self.add('20' + prefix[:6].decode('ascii'), offset)
+
+    def save(self, file_path, kind, size):
+        """
+        Write the index next to the file
+
+        Args:
+            file_path (str): Path to the indexed file
+            kind (str): 'wspr' or 'adif'
+            size (int): Number of bytes of the file the index covers
+        """
+        try:
+            with open(file_path, 'rb') as file:
+                file_head_hash = head_hash(file)
+            with open(index_path(file_path), 'w') as f:
+                json.dump({
+                    'version': INDEX_VERSION,
+                    'kind': kind,
+                    'size': size,
+                    'head_hash': file_head_hash,
+                    'ordered': self.ordered,
+                    'dates': self.dates,
+                    'offsets': self.offsets,
+                }, f)
+        except OSError as e:
+            print(f"Could not save time index for {file_path}: {e}")
+
+def load_index(file_path, kind):
+    """
+    Load the index of a file if it is still valid
+
+    An index stays valid while the file keeps its head and only grows, so
+    an appended log can still use the index built before.
+
+    Returns:
+        dict: The index, or None if there is no usable index
+    """
+    try:
+        with open(index_path(file_path), 'r') as f:
+            index = json.load(f)
+        with open(file_path, 'rb') as file:
+            file_head_hash = head_hash(file)
+    except (OSError, ValueError):
+        return None
+
+    if (index.get('version') != INDEX_VERSION or index.get('kind') != kind
+            or not index.get('ordered') or not index.get('dates')
+            or index.get('head_hash') != file_head_hash
+            or os.path.getsize(file_path) < index.get('size', 0)):
+        return None
+    return index
+
+def first_dated_record(file, offset, kind, size):
+    """
+    Find the first record starting at or after a record boundary near offset
+
+    Returns:
+        tuple: (byte offset of the record, YYYYMMDD date) or (size, None)
+    """
+    if kind == 'wspr':
+        position = next_line_start(file, offset)
+        file.seek(position)
+        for line in file:
+            if line[6:7] == b' ' and line[:6].isdigit():
+                return position, '20' + line[:6].decode('ascii')
+            position += len(line)
+        return size, None
+
+    position = next_record_start(file, offset)
+    file.seek(position)
+    data = b''
+    while True:
+        block = file.read(READ_SIZE)
+        data += block
+        end_of_record = data.lower().find(b'<eor>')
+        if end_of_record < 0 and block:
+            continue
+        record = data if end_of_record < 0 else data[:end_of_record]
+        match = QSO_DATE_PATTERN.search(record)
+        if match:
+            return position, match.group(1).decode('ascii')
+        if end_of_record < 0:
+            return size, None
+        # Record without a date, move on to the next one
+        position += end_of_record + 5
+        data = data[end_of_record + 5:]
+
+def looks_time_ordered(file_path, kind, samples=16):
+    """
+    Check that records sampled at evenly spaced offsets are in date order
+
+    Bisecting a file that is not in time order would silently skip records,
+    so files that fail this check are read in full.
+    """
+    size = os.path.getsize(file_path)
+    dates = []
+    with open(file_path, 'rb') as file:
+        for sample in range(samples + 1):
+            _, date = first_dated_record(file, size * sample // (samples + 1), kind, size)
+            if date is not None:
+                dates.append(date)
+    return dates == sorted(dates)
+
+def bisect_file(file_path, kind, is_after):
+    """
+    Bisect a time-ordered file over raw byte offsets
+
+    Args:
+        file_path (str): Path to the file
+        kind (str): 'wspr' or 'adif'
+        is_after (callable): Returns True for dates at or past the wanted boundary
+
+    Returns:
+        tuple: (low, high) where every record starting before low is not
+        after the boundary and every record starting at high or later is
+    """
+    size = os.path.getsize(file_path)
+    low = 0
+    high = size
+    high_offset = size
+    with open(file_path, 'rb') as file:
+        while high - low > BISECT_MIN_BYTES:
+            middle = (low + high) // 2
+            offset, date = first_dated_record(file, middle, kind, size)
+            if date is None or is_after(date):
+                high = middle
+                high_offset = offset
+            else:
+                low = offset
+    return low, high_offset
+
+def date_window(file_path, kind, record_filter):
+    """
+    Return the byte range of a file that can hold the filter's dates
+
+    Args:
+        file_path (str): Path to the time-ordered WSPR or ADIF file
+        kind (str): 'wspr' or 'adif'
+        record_filter (RecordFilter): Filter holding the start and end dates
+
+    Returns:
+        tuple: (start, end) byte offsets, end is None for the end of the file
+    """
+    if not record_filter.start and not record_filter.end:
+        return 0, None
+
+    # Seeking in a compressed file decompresses everything before the offset
+    if is_compressed(file_path):
+        return 0, None
+
+    index = load_index(file_path, kind)
+    if index is not None:
+        dates = index['dates']
+        offsets = index['offsets']
+        start = 0
+        end = None
+        if record_filter.start:
+            position = bisect_left(dates, record_filter.start)
+            # Dates appended after the index was built start after its last entry
+            start = offsets[min(position, len(offsets) - 1)]
+        if record_filter.end:
+            position = bisect_right(dates, record_filter.end)
+            if position < len(offsets):
+                end = max(start, offsets[position])
+        return start, end
+
+    if not looks_time_ordered(file_path, kind):
+        return 0, None
+
+    start = 0
+    end = None
+    if record_filter.start:
+        start, _ = bisect_file(file_path, kind, lambda date: date >= record_filter.start)
+    if record_filter.end:
+        _, end = bisect_file(file_path, kind, lambda date: date > record_filter.end)
+        end = max(start, end)
+    return start, end
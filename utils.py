@@ -1,3 +1,5 @@
+from band_plan import frequency_to_band
+
 BAND_COLORS = { "17m" : "#f2f261",
                "160m" : "#7cfc00",
                "15m" : "#cca166", 
@@ -17,34 +19,37 @@ BAND_COLORS = { "17m" : "#f2f261",
                "2200m" : "#ff4500",
                "2.4Ghz" : "#FF7F50",
                "5m" : "#e0e0e0",
-               "8m" : "#7f00f1"
+               "8m" : "#7f00f1",
+               "2190m" : "#ff4500",
+               "630m" : "#1e90ff",
+               "560m" : "#00bfff",
+               "4m" : "#cc0044",
+               "1.25m" : "#ccff00",
+               "70cm" : "#999900",
+               "33cm" : "#5ad7d7",
+               "23cm" : "#5ad75a",
+               "13cm" : "#FF7F50",
+               "9cm" : "#808000",
+               "6cm" : "#a0522d",
+               "3cm" : "#696969",
+               "1.25cm" : "#b0c4de",
+               "6mm" : "#8fbc8f",
+               "4mm" : "#bc8f8f",
+               "2.5mm" : "#9370db",
+               "2mm" : "#cd853f",
+               "1mm" : "#708090",
+               "submm" : "#2f4f4f"
                  }
 
-def wspr_frequency_to_band(frequency) :
-  band = ''
-  if frequency > 0 and frequency < 3:
-    band = '160m'
-  elif frequency < 5:
-    band = '80m'
-  elif frequency < 7:
-    band = '60m'
-  elif frequency < 10:
-    band = '40m'
-  elif frequency < 14:
-    band = '30m'
-  elif frequency < 18:
-    band = '20m'
-  elif frequency < 21:
-    band = '17m'
-  elif frequency < 24:
-    band = '15m'
-  elif frequency < 28:
-    band = '12m'
-  elif frequency < 30:
-    band = '10m'
-  elif frequency < 52:
-    band = '6m'
-  elif frequency < 145:
-    band = '2m'
+# Color of an empty or unknown band
+DEFAULT_BAND_COLOR = "#ff0000"
+
+_BAND_COLORS_LOWER = {band.lower(): color for band, color in BAND_COLORS.items()}
 
-  return band
\ No newline at end of file
+def band_color(band) :
+  """Return the map color of a band name in any case, DEFAULT_BAND_COLOR if it has none"""
+  return _BAND_COLORS_LOWER.get((band or '').strip().lower(), DEFAULT_BAND_COLOR)
+
+def wspr_frequency_to_band(frequency) :
+  """Return the ADIF band of a frequency in MHz, '' if it is outside every band"""
+  return frequency_to_band(frequency)
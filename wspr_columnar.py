@@ -0,0 +1,336 @@
+# wspr_columnar.py
+"""
+Columnar loader for ALL_WSPR.TXT that keeps spots in typed NumPy arrays
+instead of one dictionary per line
+"""
+
+import io
+from array import array
+from grid_converter import grids_to_coordinates
+from settings import Settings
+from filters import record_filter_for
+from band_plan import BAND_CODE_NAMES, band_codes
+from compression import open_log
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Number of lines collected in Python arrays before they are appended to the columns
+CHUNK_LINES = 1 << 18
+
+class WsprColumns:
+    """
+    WSPR spots held column by column
+
+    Calls and grids are stored as integer codes into the calls and grids
+    tables, with code 0 meaning empty.  Coordinates and bands are derived
+    from the codes with vectorized lookups.
+    """
+
+    def __init__(self, date, time, snr, drift, frequency, tx_power, distance, azimuth,
+                 tx_call, tx_grid, rx_call, rx_grid, calls, grids):
+        self.date = date            # int32 YYMMDD
+        self.time = time            # int16 HHMM
+        self.snr = snr              # float32 dB
+        self.drift = drift          # float32 Hz
+        self.frequency = frequency  # float32 MHz
+        self.tx_power = tx_power    # int16 dBm
+        self.distance = distance    # int32
+        self.azimuth = azimuth      # int16
+        self.tx_call = tx_call      # int32 code into calls
+        self.tx_grid = tx_grid      # int32 code into grids
+        self.rx_call = rx_call      # int32 code into calls
+        self.rx_grid = rx_grid      # int32 code into grids
+        self.calls = calls
+        self.grids = grids
+        self._derive()
+
+    def _derive(self):
+        """Compute coordinates and bands for every spot in a vectorized pass"""
+        grid_lat, grid_lon = grids_to_coordinates(self.grids)
+        grid_lat = np.asarray(grid_lat)
+        grid_lon = np.asarray(grid_lon)
+        self.tx_lat = grid_lat[self.tx_grid]
+        self.tx_lon = grid_lon[self.tx_grid]
+
+        self.bands = list(BAND_CODE_NAMES)
+        self.band = band_codes(self.frequency)
+
+    def __len__(self):
+        return len(self.date)
+
+    def __getitem__(self, index):
+        return WsprRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield WsprRow(self, index)
+
+    def select(self, mask):
+        """
+        Return the spots selected by a boolean mask or index array
+
+        The call and grid tables are shared with the new columns.
+        """
+        selected = WsprColumns.__new__(WsprColumns)
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray):
+                value = value[mask]
+            setattr(selected, name, value)
+        return selected
+
+    def with_coordinates(self):
+        """Return the spots whose transmitter grid converted to coordinates"""
+        return self.select(~np.isnan(self.tx_lat))
+
+    def group_by_location(self):
+        """
+        Group spots that share transmitter coordinates
+
+        The spots are grouped by grid code with one sort, and grid codes at
+        the same coordinates, such as a grid written in two cases, share a group.
+
+        Returns:
+            dict: "lat,lon" -> WsprGroup, in order of first appearance
+        """
+        _, first, inverse = np.unique(self.tx_grid, return_index=True, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        indexes_by_code = np.split(order, np.cumsum(np.bincount(inverse))[:-1])
+
+        grouped = {}
+        for code in np.argsort(first):
+            start = first[code]
+            key = f"{self.tx_lat[start]},{self.tx_lon[start]}"
+            indexes = indexes_by_code[code]
+            if key in grouped:
+                indexes = np.sort(np.concatenate((grouped[key].indexes, indexes)))
+            grouped[key] = WsprGroup(self, indexes)
+        return grouped
+
+class WsprGroup:
+    """
+    The spots of WsprColumns at one map location, kept as their indexes
+
+    A WsprRow is only made for a spot that is looked at, such as one shown
+    in an info window, and the bands and best SNR of the group are counted
+    on the columns.
+    """
+
+    __slots__ = ('columns', 'indexes')
+
+    def __init__(self, columns, indexes):
+        self.columns = columns
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, position):
+        return WsprRow(self.columns, self.indexes[position])
+
+    def __iter__(self):
+        for index in self.indexes:
+            yield WsprRow(self.columns, index)
+
+    def head(self, count):
+        """Return the rows of the first count spots"""
+        return [WsprRow(self.columns, index) for index in self.indexes[:count]]
+
+    def band_counts(self):
+        """Return band name -> number of spots, in order of the bands' first spot"""
+        codes, first, counts = np.unique(self.columns.band[self.indexes], return_index=True, return_counts=True)
+        bands = self.columns.bands
+        return {bands[codes[i]]: int(counts[i]) for i in np.argsort(first)}
+
+    def best_snr(self):
+        """Return the best SNR of the spots, or None without spots"""
+        return float(self.columns.snr[self.indexes].max()) if len(self.indexes) else None
+
+class WsprRow:
+    """
+    Read-only view of one spot in WsprColumns
+
+    Supports the same key access as the dictionaries from parse_wspr_file.
+    """
+
+    __slots__ = ('columns', 'index')
+
+    FIELDS = {
+        'date': lambda c, i: f"{c.date[i]:06d}",
+        'qso_date': lambda c, i: f"20{c.date[i]:06d}",
+        'time': lambda c, i: f"{c.time[i]:04d}",
+        'snr': lambda c, i: float(c.snr[i]),
+        'drift': lambda c, i: float(c.drift[i]),
+        'frequency': lambda c, i: float(c.frequency[i]),
+        'tx_call': lambda c, i: c.calls[c.tx_call[i]],
+        'tx_grid': lambda c, i: '' if np.isnan(c.tx_lat[i]) else c.grids[c.tx_grid[i]],
+        'tx_lat': lambda c, i: float(c.tx_lat[i]),
+        'tx_long': lambda c, i: float(c.tx_lon[i]),
+        'tx_power': lambda c, i: str(c.tx_power[i]),
+        'rx_call': lambda c, i: c.calls[c.rx_call[i]],
+        'rx_grid': lambda c, i: c.grids[c.rx_grid[i]],
+        'distance': lambda c, i: int(c.distance[i]),
+        'azimuth': lambda c, i: int(c.azimuth[i]),
+        'BAND': lambda c, i: c.bands[c.band[i]],
+        'path_km': lambda c, i: _path_value(c, 'path_km', i),
+        'path_bearing': lambda c, i: _path_value(c, 'path_bearing', i),
+        'source': lambda c, i: c.sources[c.source[i]] if getattr(c, 'source', None) is not None else None,
+    }
+    ALIASES = {
+        'CALL': 'tx_call',
+        'GRIDSQUARE': 'tx_grid',
+        'QSO_DATE': 'qso_date',
+        'TIME_ON': 'time',
+        'LATITUDE': 'tx_lat',
+        'LONGITUDE': 'tx_long',
+        'PATH_KM': 'path_km',
+        'PATH_BEARING': 'path_bearing',
+        'SOURCE': 'source',
+    }
+
+    def __init__(self, columns, index):
+        self.columns = columns
+        self.index = index
+
+    def __getitem__(self, key):
+        key = self.ALIASES.get(key, key)
+        return self.FIELDS[key](self.columns, self.index)
+
+    def __contains__(self, key):
+        return self.ALIASES.get(key, key) in self.FIELDS
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+def _path_value(columns, name, index):
+    """Return a path column value of a spot, None before geodesy.add_paths or for an invalid grid"""
+    values = getattr(columns, name, None)
+    if values is None or np.isnan(values[index]):
+        return None
+    return round(float(values[index]), 1)
+
+def _intern(table, codes, value):
+    """Return the category code for value, adding it to the table if new"""
+    code = codes.get(value)
+    if code is None:
+        code = len(table)
+        codes[value] = code
+        table.append(value)
+    return code
+
+def load_wspr_columns(file_path, settings : Settings):
+    """
+    Parse an ALL_WSPR.TXT file into typed NumPy columns
+
+    Uses the same field positions and filters as parse_wspr_file.
+
+    Args:
+        file_path (str): Path to the ALL_WSPR.TXT file
+        settings (Settings): Settings holding the date, band, mode and call filters
+
+    Returns:
+        WsprColumns: The spots in the file
+    """
+    if np is None:
+        raise ImportError("The columnar WSPR loader requires NumPy (pip install numpy)")
+
+    record_filter = record_filter_for(settings)
+    calls = ['']
+    call_codes = {'': 0}
+    grids = ['']
+    grid_codes = {'': 0}
+
+    names = ('date', 'time', 'snr', 'drift', 'frequency', 'tx_power', 'distance', 'azimuth',
+             'tx_call', 'tx_grid', 'rx_call', 'rx_grid')
+    typecodes = ('l', 'l', 'f', 'f', 'd', 'l', 'l', 'l', 'l', 'l', 'l', 'l')
+    dtypes = (np.int32, np.int16, np.float32, np.float32, np.float32, np.int16, np.int32, np.int16,
+              np.int32, np.int32, np.int32, np.int32)
+    chunks = {name: [] for name in names}
+    buffers = [array(typecode) for typecode in typecodes]
+
+    def flush():
+        for name, buffer, dtype in zip(names, buffers, dtypes):
+            chunks[name].append(np.frombuffer(buffer, dtype=buffer.typecode).astype(dtype))
+            del buffer[:]
+
+    if record_filter.mode_ok('WSPR'):
+        with io.TextIOWrapper(open_log(file_path), encoding='utf-8', errors='replace') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) < 12:
+                    continue
+                if not record_filter.wspr_date_ok(parts[0]):
+                    continue
+                if not record_filter.call_ok(parts[5]):
+                    continue
+                try:
+                    frequency = float(parts[4])
+                    if not record_filter.frequency_ok(frequency):
+                        continue
+                    values = (int(parts[0]), int(parts[1]), float(parts[2]), float(parts[3]), frequency,
+                              int(parts[7]) if parts[7].lstrip('-').isdigit() else 0,
+                              int(parts[10]) if parts[10].isdigit() else 0,
+                              int(parts[11]) if parts[11].isdigit() else 0,
+                              _intern(calls, call_codes, parts[5]),
+                              _intern(grids, grid_codes, parts[6]),
+                              _intern(calls, call_codes, parts[8]),
+                              _intern(grids, grid_codes, parts[9]))
+                except ValueError:
+                    continue
+
+                for buffer, value in zip(buffers, values):
+                    buffer.append(value)
+                if len(buffers[0]) >= CHUNK_LINES:
+                    flush()
+    flush()
+
+    columns = {name: np.concatenate(chunks[name]) for name in names}
+    return WsprColumns(calls=calls, grids=grids, **columns)
+
+def concat_columns(parts, sources=None):
+    """
+    Join the spots of several files, each in time order, into one time ordered WsprColumns
+
+    The call and grid codes of each part are mapped onto shared tables.  The
+    sort is stable and finds the runs already in order, so it merges the
+    parts instead of sorting every spot again.
+
+    Args:
+        parts (list): WsprColumns of each file
+        sources (list): Source tag of each part, or None for no source column
+
+    Returns:
+        WsprColumns: All spots, with a source column of codes into sources
+        when sources are given
+    """
+    calls = ['']
+    call_codes = {'': 0}
+    grids = ['']
+    grid_codes = {'': 0}
+    names = ('date', 'time', 'snr', 'drift', 'frequency', 'tx_power', 'distance', 'azimuth')
+    chunks = {name: [] for name in names + ('tx_call', 'tx_grid', 'rx_call', 'rx_grid')}
+    source = []
+
+    for number, part in enumerate(parts):
+        call_map = np.array([_intern(calls, call_codes, call) for call in part.calls], dtype=np.int32)
+        grid_map = np.array([_intern(grids, grid_codes, grid) for grid in part.grids], dtype=np.int32)
+        for name in names:
+            chunks[name].append(getattr(part, name))
+        chunks['tx_call'].append(call_map[part.tx_call])
+        chunks['rx_call'].append(call_map[part.rx_call])
+        chunks['tx_grid'].append(grid_map[part.tx_grid])
+        chunks['rx_grid'].append(grid_map[part.rx_grid])
+        source.append(np.full(len(part), number, dtype=np.int16))
+
+    columns = WsprColumns(calls=calls, grids=grids,
+                          **{name: np.concatenate(values) for name, values in chunks.items()})
+    if sources is not None:
+        columns.source = np.concatenate(source)
+        columns.sources = list(sources)
+
+    order = np.argsort(columns.date.astype(np.int64) * 10000 + columns.time, kind='stable')
+    return columns.select(order)
@@ -1,90 +1,155 @@
 import csv
-import re
-from datetime import datetime
+import os
 from grid_converter import grid_to_coordinates
 from settings import Settings
-from utils import wspr_frequency_to_band
+from filters import record_filter_for
+from time_index import TimeIndexBuilder, date_window, load_index
+from records import Spot
+from compression import is_compressed, open_log
+import instrumentation
+
+# Define column names for reference
+COLUMNS = [
+    'date', 'time', 'snr', 'frequency', 'drift', 
+    'tx_call', 'tx_grid', 'tx_power', 
+    'rx_call', 'rx_grid', 'distance', 'azimuth'
+]
 
 def parse_wspr_file(file_path, settings : Settings):
-    # Define the data structure to hold parsed records
-    wspr_data = []
-    maidenhead_pattern = r'^[A-R]{2}[0-9]{2}([a-x]{2})?$'
-    
-    # Define column names for reference
-    columns = [
-        'date', 'time', 'snr', 'frequency', 'drift', 
-        'tx_call', 'tx_grid', 'tx_power', 
-        'rx_call', 'rx_grid', 'distance', 'azimuth'
-    ]
-    
-    # Read and parse the file
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Split the line by whitespace
-            parts = line.strip().split()
-            
-            # Only process valid lines (must have correct number of fields)
-            if len(parts) >= len(columns):
-                tx_lat = ''
-                tx_long = ''
-                rx_lat = ''
-                rx_long = ''
-                if parts[6] :
-                    tx_grid = parts[6].strip()
-                    if bool(re.match(maidenhead_pattern, tx_grid, re.IGNORECASE)):
-                        tx_lat, tx_long = grid_to_coordinates(tx_grid)
-                    else :
-                        tx_grid = ''
-                if parts[9] :
-                    rx_grid = parts[9].strip()
-                    rx_lat, rx_long = grid_to_coordinates(rx_grid)
-                record = {
-                    'date': parts[0],
-                    'time': parts[1],
-                    'snr': float(parts[2]),
-                    'drift': float(parts[3]),
-                    'frequency': float(parts[4]),
-                    'tx_call': parts[5],
-                    'tx_grid': tx_grid,
-                    'tx_lat' : tx_lat,
-                    'tx_long' : tx_long,
-                    'tx_power': parts[7],
-                    'rx_call': parts[8],
-                    'rx_grid': rx_grid,
-                    'distance': int(parts[10]) if parts[10].isdigit() else 0,
-                    'azimuth': int(parts[11]) if len(parts) > 11 and parts[11].isdigit() else 0
-                }
-                
-                # Create a datetime object
-                try:
-                    date_str = '20' + record['date']
-                    # time_str = record['time']
-                    # date_obj = datetime.strptime(f"{date_str} {time_str}", "%y%m%d %H%M")
-                    date_obj = datetime.strptime(f"{date_str}", "%y%m%d")
-                    if settings.start_date and date_obj.date < settings.start_date:
-                        break
-                    if settings.end_date and date_obj.date > settings.end_date:
-                        break
-                    record['datetime'] = date_obj
-                except ValueError:
-                    record['datetime'] = None
-                
-                record = add_partial_adif_values(record)
-                wspr_data.append(record)
-    
+    with instrumentation.stage('parse_wspr') as timed:
+        wspr_data = _parse_wspr_file(file_path, settings)
+        timed.add_records(len(wspr_data))
     return wspr_data
 
+def _parse_wspr_file(file_path, settings : Settings):
+    # Only read the part of the file that can hold the requested dates
+    start, end = date_window(file_path, 'wspr', record_filter_for(settings))
+    if start or end is not None:
+        return parse_wspr_range(file_path, settings, start, end)
+
+    # Offsets in a compressed file cannot be seeked to cheaply, so it gets no index
+    if is_compressed(file_path):
+        return parse_wspr_range(file_path, settings)
+
+    # A full pass, so build the time index on the way if it is missing or stale
+    size = os.path.getsize(file_path)
+    index = load_index(file_path, 'wspr')
+    if index is not None and index['size'] == size:
+        return parse_wspr_range(file_path, settings)
+
+    index_builder = TimeIndexBuilder()
+    wspr_data = list(iter_wspr_records(file_path, settings, index_builder=index_builder))
+    index_builder.save(file_path, 'wspr', size)
+    return wspr_data
+
+def parse_wspr_range(file_path, settings : Settings, start=0, end=None):
+    """
+    Parse the lines of an ALL_WSPR.TXT file that start between two byte offsets
+
+    Args:
+        file_path (str): Path to the ALL_WSPR.TXT file
+        settings (Settings): Settings holding the date, band, mode and call filters
+        start (int): Byte offset of the first line to parse, must be a line start
+        end (int): Byte offset to stop at, or None for the end of the file
+
+    Returns:
+        list: List of Spot records
+    """
+    return list(iter_wspr_records(file_path, settings, start, end))
+
+def iter_wspr_file(file_path, settings : Settings):
+    """
+    Stream the spots of an ALL_WSPR.TXT file that pass the filters, one at a time
+
+    Like parse_wspr_file, only the part of the file that can hold the
+    requested dates is read, but no list of spots is built.
+    """
+    start, end = date_window(file_path, 'wspr', record_filter_for(settings))
+    return iter_wspr_records(file_path, settings, start, end)
+
+def iter_wspr_records(file_path, settings : Settings, start=0, end=None, index_builder=None):
+    """
+    Yield the Spot records of the lines starting between two byte offsets
+
+    If an index_builder is given it sees the date and offset of every line.
+    """
+    record_filter = record_filter_for(settings)
+    # Every spot in the file is WSPR, so a mode filter decides for the whole file
+    if not record_filter.mode_ok('WSPR'):
+        return
+
+    # Read and parse the file, decompressing it on the way if it is compressed
+    with open_log(file_path) as file:
+        if start:
+            file.seek(start)
+        offset = start
+        for line in file:
+            if end is not None and offset >= end:
+                break
+            if index_builder is not None:
+                index_builder.add_wspr_line(line, offset)
+            offset += len(line)
+
+            record = parse_wspr_line(line.decode('utf-8', errors='replace'), record_filter)
+            if record is not None:
+                yield record
+
+def parse_wspr_line(line, record_filter):
+    """
+    Parse one ALL_WSPR.TXT line
+
+    Args:
+        line (str): The line of text
+        record_filter (RecordFilter): Filter checked against the raw fields
+
+    Returns:
+        Spot: The spot, or None if the line is not a spot or is filtered out
+    """
+    # Split the line by whitespace
+    parts = line.strip().split()
+
+    # Only process valid lines (must have correct number of fields)
+    if len(parts) < len(COLUMNS):
+        if parts:
+            instrumentation.count('malformed_lines')
+        return None
+
+    # Check the filters against the raw text before converting anything
+    if not record_filter.wspr_date_ok(parts[0]):
+        return None
+    if not record_filter.call_ok(parts[5]):
+        return None
+    frequency = float(parts[4])
+    if not record_filter.frequency_ok(frequency):
+        return None
 
-def add_partial_adif_values(data) :
-    data['GRIDSQUARE'] = data['tx_grid']
-    data['CALL'] = data['tx_call']
-    data['QSO_DATE'] = data['date']
-    data['TIME_ON'] = data['time']
-    data['LATITUDE'] = data['tx_lat']
-    data['LONGITUDE'] = data['tx_long']
-    data['BAND'] = wspr_frequency_to_band(data['frequency'])
+    tx_grid = ''
+    tx_lat = ''
+    tx_long = ''
+    if parts[6] :
+        tx_grid = parts[6].strip()
+        tx_lat, tx_long = grid_to_coordinates(tx_grid)
+        if tx_lat is None :
+            tx_grid = ''
+            tx_lat = ''
+            tx_long = ''
 
-    return data
+    return Spot(
+        date=parts[0],
+        time=parts[1],
+        snr=float(parts[2]),
+        drift=float(parts[3]),
+        frequency=frequency,
+        tx_call=parts[5],
+        tx_grid=tx_grid,
+        tx_lat=tx_lat,
+        tx_long=tx_long,
+        tx_power=parts[7],
+        rx_call=parts[8],
+        rx_grid=parts[9].strip(),
+        distance=int(parts[10]) if parts[10].isdigit() else 0,
+        azimuth=int(parts[11]) if len(parts) > 11 and parts[11].isdigit() else 0
+    )
 
 def display_wspr_data(data, num_records=5):
     """Display a few records nicely formatted"""
@@ -0,0 +1,207 @@
+# wsprnet_csv.py
+"""
+Module for importing the wsprspots-YYYY-MM.csv archives from wsprnet.org
+
+The monthly archives hold the same fields as ALL_WSPR.TXT, in another
+column order and with the time as a Unix timestamp, for every spot
+uploaded worldwide.  They are read in large chunks of lines; each line is
+only split as far as the last column used, and the date, band and
+callsign filters are checked on the raw text before anything else is
+converted.  The result is the same Spot records parse_wspr_file returns.
+"""
+
+import calendar
+import datetime
+from grid_converter import grid_to_coordinates
+from settings import Settings
+from filters import record_filter_for
+from records import Spot
+from compression import open_log
+import instrumentation
+
+# Column positions in the archive, which has no header line
+SPOT_ID = 0
+TIMESTAMP = 1
+REPORTER = 2
+REPORTER_GRID = 3
+SNR = 4
+FREQUENCY = 5
+CALL_SIGN = 6
+GRID = 7
+POWER = 8
+DRIFT = 9
+DISTANCE = 10
+AZIMUTH = 11
+BAND = 12
+VERSION = 13
+CODE = 14
+
+# Splitting stops after the last column a Spot needs, the rest of the line is never split
+LAST_COLUMN = AZIMUTH
+
+# Bytes read from the file at a time
+CHUNK_BYTES = 16 * 1024 * 1024
+
+def timestamp_window(record_filter):
+    """
+    Return the Unix timestamps bounding the filter's dates
+
+    Returns:
+        tuple: (first second, first second after the window), None where open
+    """
+    start = end = None
+    if record_filter.start_date:
+        start = calendar.timegm(record_filter.start_date.timetuple())
+    if record_filter.end_date:
+        end = calendar.timegm((record_filter.end_date + datetime.timedelta(days=1)).timetuple())
+    return start, end
+
+def iter_chunk_lines(file_path, start=0, end=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield the lines starting between two byte offsets, read in large chunks
+
+    Args:
+        file_path (str): Path to the plain or compressed CSV file
+        start (int): Byte offset of the first line, must be a line start
+        end (int): Byte offset to stop at, or None for the end of the file
+        chunk_bytes (int): Number of bytes read at a time
+
+    Yields:
+        list: The decoded lines of each chunk
+    """
+    with open_log(file_path) as file:
+        if start:
+            file.seek(start)
+        remaining = None if end is None else max(0, end - start)
+        tail = b''
+        while True:
+            size = chunk_bytes if remaining is None else min(chunk_bytes, remaining)
+            chunk = file.read(size) if size else b''
+            if remaining is not None:
+                remaining -= len(chunk)
+            if not chunk:
+                break
+            chunk = tail + chunk
+            last_newline = chunk.rfind(b'\n')
+            if last_newline < 0:
+                tail = chunk
+                continue
+            tail = chunk[last_newline + 1:]
+            yield chunk[:last_newline].decode('utf-8', errors='replace').split('\n')
+
+        # A range ends on a line start, so a tail is only left at the end of the file
+        if remaining is not None and tail:
+            # Finish the line that started inside the range
+            tail += file.readline()
+        if tail:
+            yield [tail.decode('utf-8', errors='replace')]
+
+def iter_wsprnet_records(file_path, settings : Settings, start=0, end=None):
+    """
+    Yield the Spot records of a wsprspots CSV file that pass the filters
+
+    Args:
+        file_path (str): Path to the wsprspots-YYYY-MM.csv file, plain or compressed
+        settings (Settings): Settings holding the date, band, mode and call filters
+        start (int): Byte offset of the first line to parse, must be a line start
+        end (int): Byte offset to stop at, or None for the end of the file
+
+    Yields:
+        Spot: Each spot, as parse_wspr_line returns them
+    """
+    record_filter = record_filter_for(settings)
+    # Every spot in the archive is WSPR, so a mode filter decides for the whole file
+    if not record_filter.mode_ok('WSPR'):
+        return
+
+    first_second, end_second = timestamp_window(record_filter)
+    check_band = bool(record_filter.bands)
+    check_call = record_filter.call_pattern is not None
+    last_timestamp = None
+    in_window = False
+    formatted_timestamp = None
+    date = time = ''
+
+    for lines in iter_chunk_lines(file_path, start, end):
+        for line in lines:
+            parts = line.split(',', LAST_COLUMN + 1)
+            if len(parts) <= LAST_COLUMN:
+                if line.strip():
+                    instrumentation.count('malformed_lines')
+                continue
+
+            # Check the filters against the raw text before converting anything
+            timestamp = parts[TIMESTAMP]
+            if timestamp != last_timestamp:
+                try:
+                    seconds = int(timestamp)
+                except ValueError:
+                    continue
+                last_timestamp = timestamp
+                in_window = ((first_second is None or seconds >= first_second)
+                             and (end_second is None or seconds < end_second))
+            if not in_window:
+                continue
+            if check_call and not record_filter.call_ok(parts[CALL_SIGN]):
+                continue
+            try:
+                frequency = float(parts[FREQUENCY])
+                snr = float(parts[SNR])
+                drift = float(parts[DRIFT])
+            except ValueError:
+                continue
+            if check_band and not record_filter.frequency_ok(frequency):
+                continue
+
+            # Spots of one upload share a timestamp, so it is formatted once for all of them
+            if timestamp != formatted_timestamp:
+                moment = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+                date = moment.strftime("%y%m%d")
+                time = moment.strftime("%H%M")
+                formatted_timestamp = timestamp
+
+            tx_grid = parts[GRID].strip()
+            tx_lat = tx_long = ''
+            if tx_grid:
+                tx_lat, tx_long = grid_to_coordinates(tx_grid)
+                if tx_lat is None:
+                    tx_grid = tx_lat = tx_long = ''
+
+            distance = parts[DISTANCE]
+            azimuth = parts[AZIMUTH].strip()
+            yield Spot(
+                date=date,
+                time=time,
+                snr=snr,
+                drift=drift,
+                frequency=frequency,
+                tx_call=parts[CALL_SIGN],
+                tx_grid=tx_grid,
+                tx_lat=tx_lat,
+                tx_long=tx_long,
+                tx_power=parts[POWER],
+                rx_call=parts[REPORTER],
+                rx_grid=parts[REPORTER_GRID].strip(),
+                distance=int(distance) if distance.isdigit() else 0,
+                azimuth=int(azimuth) if azimuth.isdigit() else 0
+            )
+
+def parse_wsprnet_range(file_path, settings : Settings, start=0, end=None):
+    """Parse the lines of a wsprspots CSV file that start between two byte offsets"""
+    return list(iter_wsprnet_records(file_path, settings, start, end))
+
+def parse_wsprnet_file(file_path, settings : Settings):
+    """
+    Parse a wsprspots CSV file
+
+    Args:
+        file_path (str): Path to the wsprspots-YYYY-MM.csv file, plain or compressed
+        settings (Settings): Settings holding the date, band, mode and call filters
+
+    Returns:
+        list: List of Spot records, the same as parse_wspr_file
+    """
+    with instrumentation.stage('parse_wsprnet') as timed:
+        spots = parse_wsprnet_range(file_path, settings)
+        timed.add_records(len(spots))
+    return spots